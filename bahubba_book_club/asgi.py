@@ -3,6 +3,10 @@ ASGI config for bahubba_book_club project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the site with an ASGI server (e.g. ``uvicorn bahubba_book_club.asgi:application``) and set
+NOTIFICATIONS_STREAM=True to push live notifications to open pages; the streams are then held by the event loop
+instead of tying up a worker thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -29,7 +29,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = env('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = env('DEBUG')
+DEBUG = env.bool('DEBUG')
 
 ALLOWED_HOSTS = []
 
@@ -42,18 +42,22 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'book_club.staticfiles.BookClubStaticFilesConfig',
+    'django.contrib.postgres',
     'django_sass',
     'book_club',
     'notifications',
 ]
 
 MIDDLEWARE = [
+    'book_club.middleware.PrecompressedStaticMiddleware',
+    'book_club.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'book_club.middleware.CachedAuthenticationMiddleware',
+    'book_club.middleware.ClubMembershipMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -62,7 +66,8 @@ ROOT_URLCONF = 'bahubba_book_club.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, with render times recorded for sampled requests
+        'BACKEND': 'book_club.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -71,6 +76,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'notifications.context_processors.unread_notifications',
             ],
         },
     },
@@ -94,6 +100,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+
+# Sessions live in the cache, backed by the database, and are only written when they change
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_SAVE_EVERY_REQUEST = False
+
+
 # Custom User Model (Reader)
 AUTH_USER_MODEL = 'book_club.Reader'
 
@@ -116,6 +135,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. The first hasher hashes new passwords and the rest only verify older hashes, which are rehashed
+# with the first on the reader's next login. Set PASSWORD_ARGON2 to hash with Argon2 (needs argon2-cffi).
+PASSWORD_HASHERS = [
+    'book_club.hashers.PBKDF2PasswordHasher',
+    'book_club.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if env.bool('PASSWORD_ARGON2', default=False):
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+
+PASSWORD_ARGON2_TIME_COST = env.int('PASSWORD_ARGON2_TIME_COST', default=2)
+PASSWORD_ARGON2_MEMORY_COST = env.int('PASSWORD_ARGON2_MEMORY_COST', default=19 * 1024)
+PASSWORD_ARGON2_PARALLELISM = env.int('PASSWORD_ARGON2_PARALLELISM', default=1)
+# At most this many passwords are hashed at once, capping the cores logins can take
+PASSWORD_HASHING_CONCURRENCY = env.int('PASSWORD_HASHING_CONCURRENCY', default=2)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -133,6 +169,24 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Outside DEBUG, collectstatic (see the build_static command) writes content-hashed files plus precompressed copies,
+# which book_club.middleware.PrecompressedStaticMiddleware serves
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'book_club.staticfiles.PrecompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Tests use the plain static files storage, since they don't run collectstatic
+TEST_RUNNER = 'bahubba_book_club.test_runner.TestRunner'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -141,5 +195,49 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/login'
 
+# Request instrumentation (see book_club.middleware.InstrumentationMiddleware). Each process publishes its samples
+# to the cache, so the instrumentation_report command needs CACHE_URL to be a shared cache (redis, memcached)
+INSTRUMENTATION_SAMPLE_RATE = env.float('INSTRUMENTATION_SAMPLE_RATE', default=0.05)
+INSTRUMENTATION_BUFFER_SIZE = 2000
+INSTRUMENTATION_PUBLISH_INTERVAL = 30
+
+# Serve the read-heavy pages from async views (only worth it under ASGI)
+ASYNC_READ_VIEWS = env.bool('ASYNC_READ_VIEWS', default=False)
+
+# Book Clubs
+BOOK_CLUB_SEARCH_PAGE_SIZE = 24
+BOOK_CLUB_MEMBERS_PAGE_SIZE = 50
+BOOK_CLUB_REQUESTS_PAGE_SIZE = 50
+# Rows fetched from the database, and written to the response, at a time by the CSV/JSON exports
+BOOK_CLUB_EXPORT_CHUNK_SIZE = env.int('BOOK_CLUB_EXPORT_CHUNK_SIZE', default=2000)
+BOOK_CLUB_READER_CLUBS_TIMEOUT = 60 * 60
+BOOK_CLUB_SLUG_CACHE_TIMEOUT = 60 * 60
+BOOK_CLUB_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Readers listed on a club's home page (the heading shows the full count)
+BOOK_CLUB_HOME_MEMBERS = 100
+# Serve request.user from a cached, slim principal (see book_club.middleware.CachedAuthenticationMiddleware)
+BOOK_CLUB_CACHED_PRINCIPAL = env.bool('BOOK_CLUB_CACHED_PRINCIPAL', default=True)
+# Kept short: it bounds how long a deactivated reader stays logged in should an invalidation ever be missed
+BOOK_CLUB_PRINCIPAL_TIMEOUT = 60
+BOOK_CLUB_IMAGE_WORKERS = env.int('BOOK_CLUB_IMAGE_WORKERS', default=2)
+
+# Notifications
+NOTIFICATIONS_PAGE_SIZE = env.int('NOTIFICATIONS_PAGE_SIZE', default=25)
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+NOTIFICATIONS_OUTBOX_BATCH_SIZE = env.int('NOTIFICATIONS_OUTBOX_BATCH_SIZE', default=500)
+NOTIFICATIONS_OUTBOX_MAX_ATTEMPTS = 5
+NOTIFICATIONS_OUTBOX_POLL_INTERVAL = 1.0
+# Processed (and given up on) events are kept this long for troubleshooting, then deleted by the dispatcher
+NOTIFICATIONS_OUTBOX_RETENTION_DAYS = 7
+NOTIFICATIONS_OUTBOX_PURGE_INTERVAL = 60 * 60
+# Push new notifications to open pages over server-sent events. Only turn this on when serving the ASGI application
+# (bahubba_book_club.asgi): under WSGI every open page would hold a worker thread without receiving anything.
+NOTIFICATIONS_STREAM = env.bool('NOTIFICATIONS_STREAM', default=False)
+# Use notifications.broker.PostgresBroker when running more than one ASGI worker
+NOTIFICATIONS_BROKER = env('NOTIFICATIONS_BROKER', default='notifications.broker.LocalBroker')
+NOTIFICATIONS_STREAM_TIMEOUT = 300
+NOTIFICATIONS_STREAM_HEARTBEAT = 15
+NOTIFICATIONS_STREAM_RETRY = 5
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
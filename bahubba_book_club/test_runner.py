@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests against the plain static files storage whatever DEBUG is: tests don't run collectstatic, so the
+    manifest storage used outside DEBUG would have no entries for the templates' {% static %} tags
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.storages = override_settings(STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        self.storages.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.storages.disable()
+        super().teardown_test_environment(**kwargs)
@@ -6,11 +6,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from book_club import views
+from book_club import async_views, views
+
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 urlpatterns = [
     # Django Administration
     path("admin/", admin.site.urls),
+    path('instrumentation/', views.instrumentation_report, name='instrumentation_report'),
 
     # Book Club Administration
 
@@ -20,7 +23,7 @@ urlpatterns = [
     path('logout/', views.logout_reader, name='logout'),
 
     # Book Clubs
-    path('', views.home, name='home'),
+    path('', read_views.home, name='home'),
     path('book-clubs/', include('book_club.urls')),
 
     # Readers
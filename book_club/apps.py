@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BookClubConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'book_club'
+
+    def ready(self):
+        # Register signal receivers
+        from . import instrumentation, signals  # noqa: F401
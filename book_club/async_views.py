@@ -0,0 +1,108 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import redirect, render
+
+from .cache import aget_reader_clubs
+from .decorators import async_login_required
+from .forms import BookClubSearchForm
+from .models import BookClub, BookClubReaders
+from .search import asearch_book_clubs
+
+# Async versions of the read-heavy views, used in place of the ones in views.py when ASYNC_READ_VIEWS is on.
+# Queries use the async ORM; rendering stays in a thread since context processors and template tags query the DB.
+
+
+@async_login_required
+async def home(req):
+
+    # Pull the groups the reader is a member of
+    reader_clubs = await aget_reader_clubs(req.user.id)
+    return_dict = {'book_clubs': reader_clubs, 'in_clubs': len(reader_clubs) > 0}
+
+    return await sync_to_async(render)(req, 'book_club/home.html', return_dict)
+
+
+@async_login_required
+async def book_clubs(req):
+    """
+    View with readers' book clubs
+    """
+
+    # Pull the groups the reader is a member of
+    reader_clubs = await aget_reader_clubs(req.user.id)
+    return_dict = {'book_clubs': reader_clubs, 'in_clubs': len(reader_clubs) > 0}
+
+    return await sync_to_async(render)(req, 'book_club/book_clubs.html', return_dict)
+
+
+@async_login_required
+async def book_club_home(req, book_club_slug):
+    """
+    Home page for a given book club
+    """
+
+    # Get the book club, the reader's role in it, whether they've asked to join and the counts in one query
+    membership = await req.aclub_membership(
+        book_club_slug, lambda book_clubs: book_clubs.with_membership_requested(req.user.id).with_counts()
+    )
+    book_club = membership.book_club
+
+    # If the book club doesn't exist, redirect
+    if book_club is None:
+        return redirect('home')
+
+    # Ensure that the reader has a role in the club or the club is public
+    if not membership.is_member and book_club.publicity != BookClub.Publicity.PUBLIC:
+        return redirect('home')
+
+    # Get the first of the club's current members, with only the reader fields the page shows
+    members = [
+        member async for member in BookClubReaders.objects.filter(
+            book_club=book_club, left__isnull=True
+        ).select_related(
+            'reader'
+        ).only(
+            'reader__username', 'reader__given_name', 'reader__surname'
+        ).order_by('reader__username')[:getattr(settings, 'BOOK_CLUB_HOME_MEMBERS', 100)]
+    ]
+
+    return_dict = {
+        'book_club': book_club,
+        'reader_role': membership.role,
+        'membership_requested': book_club.membership_requested,
+        'open_request_count': book_club.open_request_count,
+        'member_count': book_club.member_count,
+        'members': members,
+    }
+
+    return await sync_to_async(render)(req, 'book_club/book_club_home.html', return_dict)
+
+
+@async_login_required
+async def book_club_search(req):
+    """
+    Search page for finding book clubs, with ranked and paginated results
+    """
+
+    return_dict = {'form': BookClubSearchForm, 'search_submitted': False, 'results': []}
+
+    # Search for book clubs when search text is submitted (GET for paging through results, POST for older forms)
+    params = req.POST if req.method == 'POST' else req.GET
+    search_text = params.get('search_text', '').strip()
+    if len(search_text) > 0:
+        return_dict['form'] = BookClubSearchForm(params)
+
+        try:
+            page = max(int(params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        results, has_next = await asearch_book_clubs(search_text, page)
+
+        return_dict['search_submitted'] = True
+        return_dict['results'] = results
+        return_dict['search_text'] = search_text
+        return_dict['page'] = page
+        return_dict['has_next'] = has_next
+
+    return await sync_to_async(render)(req, 'book_club/book_club_search.html', return_dict)
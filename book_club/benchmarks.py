@@ -0,0 +1,121 @@
+import asyncio
+import statistics
+import time
+
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+
+def login_cookie(reader):
+    """
+    Create a session logged in as the reader and get the Cookie header value for it
+    """
+
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = reader._meta.pk.value_to_string(reader)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = reader.get_session_auth_hash()
+    session.save()
+
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+async def asgi_get(application, url, headers):
+    """
+    Send one GET request straight to an ASGI application, returning the response status
+    """
+
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path,
+        'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        # The client never disconnects
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+
+    return status
+
+
+async def run_load(application, urls, headers, concurrency, total):
+    """
+    Send `total` GET requests, cycling through the URLs, from `concurrency` concurrent clients.
+    Returns the latencies in seconds, the statuses seen and the elapsed wall time.
+    """
+
+    latencies = []
+    statuses = {}
+    next_request = 0
+
+    async def client():
+        nonlocal next_request
+        while next_request < total:
+            url = urls[next_request % len(urls)]
+            next_request += 1
+
+            started = time.perf_counter()
+            status = await asgi_get(application, url, headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    return latencies, statuses, time.perf_counter() - started
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of the values
+    """
+
+    ordered = sorted(values)
+    if not ordered:
+        return None
+
+    return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))]
+
+
+def summarize(latencies, statuses, elapsed):
+    """
+    Requests per second and latency percentiles (in milliseconds) for a load run
+    """
+
+    return {
+        'requests': len(latencies),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
@@ -0,0 +1,257 @@
+import copy
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import get_template, render_to_string
+
+from .models import BookClub, BookClubReaders, CachedReader
+
+
+def reader_clubs_key(reader_id):
+    return f'book_club:reader_clubs:{reader_id}'
+
+
+def reader_clubs_query(reader_id):
+    return BookClub.objects.filter(
+        bookclubreaders__reader_id=reader_id,
+        bookclubreaders__left__isnull=True,
+        disbanded__isnull=True,
+    ).order_by('name')
+
+
+def get_reader_clubs(reader_id):
+    """
+    Get the active book clubs the reader is an active member of, from the cache when possible
+    """
+
+    key = reader_clubs_key(reader_id)
+    book_clubs = cache.get(key)
+    if book_clubs is None:
+        book_clubs = list(reader_clubs_query(reader_id))
+        cache.set(key, book_clubs, getattr(settings, 'BOOK_CLUB_READER_CLUBS_TIMEOUT', 60 * 60))
+
+    return book_clubs
+
+
+async def aget_reader_clubs(reader_id):
+    """
+    Async version of get_reader_clubs()
+    """
+
+    key = reader_clubs_key(reader_id)
+    book_clubs = await cache.aget(key)
+    if book_clubs is None:
+        book_clubs = [book_club async for book_club in reader_clubs_query(reader_id)]
+        await cache.aset(key, book_clubs, getattr(settings, 'BOOK_CLUB_READER_CLUBS_TIMEOUT', 60 * 60))
+
+    return book_clubs
+
+
+def invalidate_reader_clubs(reader_ids):
+    """
+    Drop the cached club lists for the given readers, now and again once the current transaction commits, since
+    until then other requests still read (and may cache) the old memberships
+    """
+
+    keys = [reader_clubs_key(reader_id) for reader_id in reader_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_club_readers(book_club_id):
+    """
+    Drop the cached club lists for everyone who has been in the given club
+    """
+
+    invalidate_reader_clubs(
+        BookClubReaders.objects.filter(book_club_id=book_club_id).values_list('reader_id', flat=True)
+    )
+
+
+# Slug -> club lookups are cached in-process and in the shared cache under a version number, which is bumped
+# whenever a club's slug, name, publicity or disbanding changes so every process drops its stale entries
+CLUB_SLUG_VERSION_KEY = 'book_club:club_slug_version'
+
+_local_clubs = {}
+_local_clubs_version = None
+_local_clubs_lock = threading.Lock()
+
+
+def club_slug_key(version, book_club_slug):
+    return f'book_club:club_slug:{version}:{book_club_slug}'
+
+
+def club_slug_version():
+    version = cache.get(CLUB_SLUG_VERSION_KEY)
+    if version is None:
+        # Start from the time rather than 1, so a version lost from the cache is never handed out again while a
+        # process still holds clubs cached under it
+        initial = time.time_ns()
+        cache.add(CLUB_SLUG_VERSION_KEY, initial, None)
+        version = cache.get(CLUB_SLUG_VERSION_KEY, initial)
+
+    return version
+
+
+def get_cached_club(book_club_slug, version):
+    """
+    Get the active club with the given slug from the in-process or shared cache, or None on a miss.
+    Get the version with club_slug_version() before looking the club up, and pass it on to cache_club() on a miss.
+    """
+
+    global _local_clubs, _local_clubs_version
+
+    with _local_clubs_lock:
+        if _local_clubs_version != version:
+            _local_clubs = {}
+            _local_clubs_version = version
+        book_club = _local_clubs.get(book_club_slug)
+
+    if book_club is None:
+        book_club = cache.get(club_slug_key(version, book_club_slug))
+        if book_club is None:
+            return None
+
+        with _local_clubs_lock:
+            if _local_clubs_version == version:
+                _local_clubs[book_club_slug] = book_club
+
+    # Hand out copies so callers can't change the shared instance
+    return copy.copy(book_club)
+
+
+def cache_club(book_club, version):
+    """
+    Store an active club for slug lookups, under the slug version from before it was read from the DB: a club read
+    before an invalidation then can't be stored under the new version
+    """
+
+    cache.set(
+        club_slug_key(version, book_club.slug),
+        book_club,
+        getattr(settings, 'BOOK_CLUB_SLUG_CACHE_TIMEOUT', 60 * 60),
+    )
+
+
+def get_club_by_slug(book_club_slug):
+    """
+    Get the active club with the given slug, or None if there isn't one
+    """
+
+    version = club_slug_version()
+    book_club = get_cached_club(book_club_slug, version)
+    if book_club is None:
+        book_club = BookClub.objects.filter(slug=book_club_slug, disbanded__isnull=True).first()
+        if book_club is not None:
+            cache_club(book_club, version)
+
+    return book_club
+
+
+def invalidate_club_slugs():
+    """
+    Invalidate every cached slug lookup (e.g. after a club is renamed or disbanded), now and again once the current
+    transaction commits, since until then other requests still read the old row
+    """
+
+    __bump_club_slug_version()
+    transaction.on_commit(__bump_club_slug_version)
+
+
+def __bump_club_slug_version():
+    try:
+        cache.incr(CLUB_SLUG_VERSION_KEY)
+    except ValueError:
+        cache.add(CLUB_SLUG_VERSION_KEY, time.time_ns(), None)
+
+
+CLUB_CARD_TEMPLATE = 'book_club/fragments/book_club_card.html'
+# Every template a card is rendered from
+CLUB_CARD_TEMPLATES = [CLUB_CARD_TEMPLATE, 'book_club/fragments/book_club_image.html']
+
+
+@functools.cache
+def club_card_version():
+    """
+    Hash of the card templates and the static files manifest, so a deploy changing either (e.g. collectstatic
+    clearing the old content-hashed files the cards link to) never serves cards rendered before it
+    """
+
+    digest = hashlib.sha256()
+    for template_name in CLUB_CARD_TEMPLATES:
+        digest.update(get_template(template_name).template.source.encode())
+    digest.update(getattr(staticfiles_storage, 'manifest_hash', '').encode())
+
+    return digest.hexdigest()[:12]
+
+
+def club_card_key(book_club):
+    # Keyed on when the club last changed, so edits (including new image renditions and disbanding) never serve a
+    # stale card
+    return f'book_club:card:{club_card_version()}:{book_club.id}:{book_club.updated.timestamp()}'
+
+
+def get_club_cards(book_clubs):
+    """
+    Get the rendered cards of the given clubs, in order, fetching them all from the cache in one go and rendering
+    only the ones missing
+    """
+
+    keys = [club_card_key(book_club) for book_club in book_clubs]
+    cards = cache.get_many(keys)
+
+    missing = {
+        key: render_to_string(CLUB_CARD_TEMPLATE, {'book_club': book_club})
+        for key, book_club in zip(keys, book_clubs)
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, getattr(settings, 'BOOK_CLUB_CARD_CACHE_TIMEOUT', 60 * 60 * 24))
+        cards.update(missing)
+
+    return [cards[key] for key in keys]
+
+
+def principal_key(reader_id):
+    return f'book_club:principal:{reader_id}'
+
+
+def get_principal(reader_id):
+    """
+    Get the cached principal (the CachedReader fields plus the session auth hash) of the given reader, or None if
+    there's no such reader
+    """
+
+    key = principal_key(reader_id)
+    principal = cache.get(key)
+    if principal is None:
+        reader = CachedReader.objects.filter(pk=reader_id).only(*CachedReader.PRINCIPAL_FIELDS, 'password').first()
+        if reader is None:
+            return None
+
+        principal = {field: getattr(reader, field) for field in CachedReader.PRINCIPAL_FIELDS}
+        principal['session_auth_hash'] = reader.get_session_auth_hash()
+        cache.set(key, principal, getattr(settings, 'BOOK_CLUB_PRINCIPAL_TIMEOUT', 60))
+
+    return principal
+
+
+def invalidate_principals(reader_ids):
+    """
+    Drop the readers' cached principals, and drop them again once the current transaction commits: until then a
+    concurrent request can still read the old row and cache it again
+    """
+
+    keys = [principal_key(reader_id) for reader_id in reader_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_principal(reader_id):
+    invalidate_principals([reader_id])
@@ -0,0 +1,20 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+def async_login_required(view):
+    """
+    login_required for async views (Django's doesn't support them before 5.0). Loads the user in a thread, so the
+    view can use req.user afterwards without touching the DB.
+    """
+
+    @wraps(view)
+    async def wrapper(req, *args, **kwargs):
+        if not await sync_to_async(lambda: req.user.is_authenticated)():
+            return redirect_to_login(req.get_full_path())
+
+        return await view(req, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,113 @@
+import functools
+import io
+import re
+
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.utils import get_app_template_dirs
+
+try:
+    from fontTools.subset import Options, Subsetter
+    from fontTools.ttLib import TTFont
+except ImportError:
+    TTFont = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FONTS_CSS = 'book_club/css/fonts.css'
+TEXT_FONT = 'book_club/fonts/roboto-slab-latin.woff2'
+ICON_FONT = 'book_club/fonts/material-icons.woff2'
+
+# The contents of every element with the material-icons class
+ICON_ELEMENT = re.compile(r'<(\w+)[^>]*\bclass="[^"]*\bmaterial-icons\b[^"]*"[^>]*>(.*?)</\1>', re.S)
+TEMPLATE_TAG = re.compile(r'{%.*?%}|{{.*?}}|{#.*?#}', re.S)
+
+
+def can_subset():
+    """
+    Subsetting needs fontTools, and writing WOFF2 needs brotli
+    """
+
+    return TTFont is not None and brotli is not None
+
+
+@functools.cache
+def vendored():
+    """
+    Whether the vendor_fonts command has been run, so the fonts can be served locally
+    """
+
+    return finders.find(FONTS_CSS) is not None
+
+
+def template_dirs():
+    dirs = [Path(directory) for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+
+    return dirs + [Path(directory) for directory in get_app_template_dirs('templates')]
+
+
+def find_icons(dirs=None):
+    """
+    Names of the Material Icons the templates use, including ones picked between by template tags
+    (e.g. {% if viewed %}drafts{% else %}mail{% endif %})
+    """
+
+    icons = set()
+    for directory in dirs or template_dirs():
+        for path in directory.rglob('*.html'):
+            for _, content in ICON_ELEMENT.findall(path.read_text()):
+                icons.update(re.findall(r'[a-z0-9_]+', TEMPLATE_TAG.sub(' ', content)))
+
+    return icons
+
+
+def subset_icons(font_data, icons):
+    """
+    Cut the Material Icons font down to the ligatures spelling the given icon names, as WOFF2.
+    Returns the font and the names it has no icon for.
+    """
+
+    font = TTFont(io.BytesIO(font_data))
+    glyph_chars = {glyph: chr(code) for code, glyph in font.getBestCmap().items()}
+
+    # Drop every other ligature first, or the subsetter would keep any icon spelled with the letters in use
+    kept = set()
+    found = set()
+    for lookup in font['GSUB'].table.LookupList.Lookup:
+        for subtable in lookup.SubTable:
+            if subtable.LookupType == 7:
+                subtable = subtable.ExtSubTable
+            if subtable.LookupType != 4:
+                continue
+
+            for first in list(subtable.ligatures):
+                ligatures = []
+                for ligature in subtable.ligatures[first]:
+                    name = ''.join(glyph_chars.get(glyph, '') for glyph in [first, *ligature.Component])
+                    if name in icons:
+                        ligatures.append(ligature)
+                        kept.add(ligature.LigGlyph)
+                        found.add(name)
+
+                if ligatures:
+                    subtable.ligatures[first] = ligatures
+                else:
+                    del subtable.ligatures[first]
+
+    options = Options()
+    options.layout_features = ['liga']
+    options.flavor = 'woff2'
+    subsetter = Subsetter(options)
+    subsetter.populate(glyphs=kept, text=''.join(icons))
+    subsetter.subset(font)
+
+    output = io.BytesIO()
+    font.flavor = 'woff2'
+    font.save(output)
+
+    return output.getvalue(), icons - found
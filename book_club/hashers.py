@@ -0,0 +1,79 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_slots = None
+_slots_lock = threading.Lock()
+_holding_slot = threading.local()
+
+
+def get_slots():
+    """
+    Semaphore shared by every hashing call, with PASSWORD_HASHING_CONCURRENCY slots
+    """
+
+    global _slots
+
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(getattr(settings, 'PASSWORD_HASHING_CONCURRENCY', 2))
+
+    return _slots
+
+
+def run_hashing(func, *args, **kwargs):
+    """
+    Run a hashing call once a slot is free. This only caps how many cores are hashing at once, so a burst of logins
+    can't take the CPU from other requests; the calling thread still waits for its hash (and for a slot) either way.
+    """
+
+    # Hashing while holding a slot (e.g. a hasher that wraps another) runs straight away rather than waiting on itself
+    if getattr(_holding_slot, 'active', False):
+        return func(*args, **kwargs)
+
+    with get_slots():
+        _holding_slot.active = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _holding_slot.active = False
+
+
+class BoundedHashingMixin:
+    """
+    Hasher mixin running the expensive steps (encoding, verifying and the dummy runs that even out timing) under the
+    shared hashing concurrency limit
+    """
+
+    def encode(self, password, salt, *args, **kwargs):
+        return run_hashing(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return run_hashing(super().verify, password, encoded)
+
+    def harden_runtime(self, password, encoded):
+        return run_hashing(super().harden_runtime, password, encoded)
+
+
+class PBKDF2PasswordHasher(BoundedHashingMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(BoundedHashingMixin, hashers.Argon2PasswordHasher):
+    """
+    Argon2 (needs the argon2-cffi package) with its cost tuned by the PASSWORD_ARGON2_* settings. Hashes made with
+    other costs still verify, and are rehashed with the current ones on the reader's next login.
+    """
+
+    @property
+    def time_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'PASSWORD_ARGON2_PARALLELISM', hashers.Argon2PasswordHasher.parallelism)
@@ -0,0 +1,125 @@
+import hashlib
+import io
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+from .models import BookClub
+
+logger = logging.getLogger(__name__)
+
+# Rendition label -> width in pixels
+RENDITIONS = {
+    'card': 320,
+    'card_2x': 640,
+    'header': 1200,
+}
+
+# Output formats, most preferred first; JPEG stays last as the fallback every browser understands
+FORMATS = {
+    'avif': {'format': 'AVIF', 'quality': 60},
+    'webp': {'format': 'WEBP', 'quality': 80},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+RENDITIONS_DIR = 'images/renditions'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Shared worker pool for image processing, bounded by BOOK_CLUB_IMAGE_WORKERS
+    """
+
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BOOK_CLUB_IMAGE_WORKERS', 2),
+                thread_name_prefix='book-club-images',
+            )
+
+    return _executor
+
+
+def available_formats():
+    return [image_format for image_format in FORMATS if image_format != 'avif' or features.check('avif')]
+
+
+def schedule_renditions(book_club_id):
+    """
+    Generate the club's image renditions in the background once the current transaction commits
+    """
+
+    transaction.on_commit(lambda: get_executor().submit(_generate_renditions_in_worker, book_club_id))
+
+
+def _generate_renditions_in_worker(book_club_id):
+    try:
+        generate_renditions(book_club_id)
+    except Exception:
+        logger.exception('Failed to generate image renditions for book club %s', book_club_id)
+    finally:
+        # Worker threads don't get Django's request cleanup, so release their connections here
+        close_old_connections()
+
+
+def generate_renditions(book_club_id):
+    """
+    Resize the club's image to every rendition width and format, storing each under a content hash name,
+    and record them on the club
+    """
+
+    book_club = BookClub.objects.filter(id=book_club_id).first()
+    if book_club is None or not book_club.image:
+        return
+
+    image_name = book_club.image.name
+    with book_club.image.open('rb') as image_file:
+        original = ImageOps.exif_transpose(Image.open(image_file))
+        original.load()
+
+    renditions = {}
+    for image_format in available_formats():
+        renditions[image_format] = []
+        for label, width in RENDITIONS.items():
+            # Never upscale; small originals just produce smaller renditions
+            resized = original.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+
+            # An original narrower than several renditions comes out the same width for each; srcset needs each
+            # width once
+            if any(rendition['width'] == resized.width for rendition in renditions[image_format]):
+                continue
+
+            if image_format == 'jpeg' and resized.mode not in ('RGB', 'L'):
+                resized = resized.convert('RGB')
+
+            buffer = io.BytesIO()
+            resized.save(buffer, **FORMATS[image_format])
+            content = buffer.getvalue()
+
+            name = f'{RENDITIONS_DIR}/{hashlib.sha256(content).hexdigest()[:20]}.{image_format}'
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+
+            renditions[image_format].append({'label': label, 'name': name, 'width': resized.width})
+
+    # Only record the renditions if the club's image wasn't replaced while they were being made
+    with transaction.atomic():
+        book_club = BookClub.objects.select_for_update().filter(id=book_club_id).first()
+        if book_club is not None and book_club.image.name == image_name:
+            book_club.image_renditions = renditions
+            book_club.save(update_fields=['image_renditions', 'updated'])
+
+    return renditions
@@ -0,0 +1,248 @@
+import os
+import random
+import socket
+import threading
+import time
+
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+from .benchmarks import percentile
+
+# Recorder for the request being sampled in the current context (None when it isn't sampled). Context variables
+# follow the request into sync_to_async threads, so queries from async views are recorded too.
+current_recorder = ContextVar('current_recorder', default=None)
+
+PROCESSES_KEY = 'instrumentation:processes'
+
+
+class Sample(NamedTuple):
+    """
+    What one sampled request cost
+    """
+
+    view: str
+    status: int
+    timestamp: float
+    total_ms: float
+    queries: int
+    db_ms: float
+    duplicate_queries: int
+    similar_queries: int
+    template_ms: float
+
+
+class Recorder:
+    """
+    Collects the queries and template rendering of one request. An async view's request can run code in more than
+    one sync_to_async thread, so the counts are only changed under a lock.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.template_time = 0.0
+        self.template_depth = 0
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, params, elapsed):
+        with self._lock:
+            self.db_time += elapsed
+            self.queries += 1
+            self.statements[(sql, repr(params))] += 1
+
+    def start_template(self):
+        with self._lock:
+            self.template_depth += 1
+
+    def end_template(self, elapsed):
+        # Only time the outermost render, so templates rendered inside others aren't counted twice
+        with self._lock:
+            self.template_depth -= 1
+            if self.template_depth == 0:
+                self.template_time += elapsed
+
+    def sample(self, view, status):
+        # Identical statements with identical parameters are pure duplicates; the same statement with different
+        # parameters over and over is the usual N+1 signature
+        with self._lock:
+            statements = Counter(self.statements)
+        sql_counts = Counter()
+        for (sql, _), count in statements.items():
+            sql_counts[sql] += count
+
+        return Sample(
+            view=view,
+            status=status,
+            timestamp=time.time(),
+            total_ms=(time.perf_counter() - self.started) * 1000,
+            queries=self.queries,
+            db_ms=self.db_time * 1000,
+            duplicate_queries=sum(count - 1 for count in statements.values()),
+            similar_queries=sum(count - 1 for count in sql_counts.values()),
+            template_ms=self.template_time * 1000,
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper timing every query made while a request is being sampled
+    """
+
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add_query(sql, params, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Add the execute wrapper to every database connection as it's opened, whichever thread opens it
+    """
+
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        recorder = current_recorder.get()
+        if recorder is None:
+            return super().render(context, request)
+
+        recorder.start_template()
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recorder.end_template(time.perf_counter() - started)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing template rendering for sampled requests
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+class SampleBuffer:
+    """
+    Fixed size, thread safe ring buffer of the most recent samples in this process, periodically published to the
+    cache so the samples of every process can be reported together
+    """
+
+    def __init__(self, size=None):
+        self.size = size
+        self._samples = None
+        self._lock = threading.Lock()
+        self._published = 0.0
+        self.process_key = f'instrumentation:samples:{socket.gethostname()}:{os.getpid()}'
+
+    def add(self, sample):
+        with self._lock:
+            if self._samples is None:
+                self._samples = deque(maxlen=self.size or getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 2000))
+            self._samples.append(sample)
+
+            interval = getattr(settings, 'INSTRUMENTATION_PUBLISH_INTERVAL', 30)
+            publish = time.monotonic() - self._published >= interval
+            if publish:
+                self._published = time.monotonic()
+                samples = list(self._samples)
+
+        if publish:
+            self.publish(samples, interval)
+
+    def samples(self):
+        with self._lock:
+            return list(self._samples or ())
+
+    def clear(self):
+        with self._lock:
+            self._samples = None
+            self._published = 0.0
+
+    def publish(self, samples, interval):
+        # Samples go under a key per process, listed under a shared key; processes that stop publishing expire
+        timeout = interval * 10
+        cache.set(self.process_key, [tuple(sample) for sample in samples], timeout)
+        processes = cache.get(PROCESSES_KEY) or {}
+        processes = {key: seen for key, seen in processes.items() if seen > time.time() - timeout}
+        processes[self.process_key] = time.time()
+        cache.set(PROCESSES_KEY, processes, None)
+
+
+sample_buffer = SampleBuffer()
+
+
+def should_sample():
+    rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0)
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def collected_samples():
+    """
+    This process's samples along with those published by every other process (which needs a shared cache)
+    """
+
+    samples = sample_buffer.samples()
+    for key in cache.get(PROCESSES_KEY) or {}:
+        if key != sample_buffer.process_key:
+            samples.extend(Sample(*sample) for sample in cache.get(key) or ())
+
+    return samples
+
+
+def summarize(samples):
+    """
+    Per-view summary of the samples: request count, latency percentiles, queries, DB time, duplicate queries and
+    template render time. Views are ordered costliest (by p95 latency) first.
+    """
+
+    by_view = defaultdict(list)
+    for sample in samples:
+        by_view[sample.view].append(sample)
+
+    report = []
+    for view, view_samples in by_view.items():
+        total = [sample.total_ms for sample in view_samples]
+        queries = [sample.queries for sample in view_samples]
+        db = [sample.db_ms for sample in view_samples]
+        template = [sample.template_ms for sample in view_samples]
+        report.append({
+            'view': view,
+            'requests': len(view_samples),
+            'errors': sum(1 for sample in view_samples if sample.status >= 500),
+            'p50_ms': round(percentile(total, 50), 2),
+            'p95_ms': round(percentile(total, 95), 2),
+            'p99_ms': round(percentile(total, 99), 2),
+            'queries_mean': round(sum(queries) / len(queries), 1),
+            'queries_max': max(queries),
+            'db_p95_ms': round(percentile(db, 95), 2),
+            'template_p95_ms': round(percentile(template, 95), 2),
+            'duplicate_queries_max': max(sample.duplicate_queries for sample in view_samples),
+            'similar_queries_max': max(sample.similar_queries for sample in view_samples),
+        })
+
+    return sorted(report, key=lambda row: row['p95_ms'], reverse=True)
@@ -0,0 +1,72 @@
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Time each configured password hasher, reporting logins/sec on one core and with many concurrent logins '
+        '(which share the PASSWORD_HASHING_CONCURRENCY limit)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Password checks per hasher')
+        parser.add_argument('--concurrency', type=int, default=8, help='Simultaneous logins for the concurrent run')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode('correct horse battery staple', hasher.salt())
+            except ValueError as error:
+                # e.g. Argon2 without argon2-cffi installed
+                self.stderr.write(f'Skipping {hasher.algorithm}: {error}')
+                continue
+
+            parameters = {
+                key: value for key, value in hasher.decode(encoded).items() if key not in ('algorithm', 'hash', 'salt')
+            }
+            results.append({
+                'algorithm': hasher.algorithm,
+                'parameters': parameters,
+                **self.benchmark(hasher, encoded, options['iterations'], options['concurrency']),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        self.stdout.write(f'Hashing concurrency: {settings.PASSWORD_HASHING_CONCURRENCY}')
+        for result in results:
+            self.stdout.write(
+                f'{result["algorithm"]:<16} {result["ms_per_check"]:>8} ms/check  '
+                f'{result["logins_per_s_per_core"]:>8} logins/s per core  '
+                f'{result["logins_per_s_concurrent"]:>8} logins/s with {options["concurrency"]} at once  '
+                f'{result["parameters"]}'
+            )
+
+    @staticmethod
+    def benchmark(hasher, encoded, iterations, concurrency):
+        # One login at a time: what a single core manages
+        started = time.perf_counter()
+        for _ in range(iterations):
+            hasher.verify('correct horse battery staple', encoded)
+        sequential = time.perf_counter() - started
+
+        # Many logins at once: bounded by the hashing concurrency rather than the number of callers
+        with ThreadPoolExecutor(max_workers=concurrency) as callers:
+            started = time.perf_counter()
+            list(callers.map(lambda _: hasher.verify('correct horse battery staple', encoded), range(iterations)))
+            concurrent = time.perf_counter() - started
+
+        return {
+            'ms_per_check': round(sequential / iterations * 1000, 2),
+            'logins_per_s_per_core': round(iterations / sequential, 1),
+            'logins_per_s_concurrent': round(iterations / concurrent, 1),
+        }
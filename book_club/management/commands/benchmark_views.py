@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from book_club.benchmarks import login_cookie, percentile, run_load, summarize
+from book_club.instrumentation import Recorder, current_recorder
+from book_club.models import BookClub, BookClubReaders, Reader
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test pages through the ASGI application in-process, reporting requests/sec and latency percentiles. '
+        'Use --compare to run the sync and async read views side by side. With --suite, instead drive each of the '
+        'main pages in turn through the test client, reporting throughput, latency percentiles and query counts per '
+        'page; save those results with --output and compare runs with --baseline.'
+    )
+
+    default_urls = ['/', '/book-clubs/', '/notifications/']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Reader to make the requests as')
+        parser.add_argument(
+            '--url', action='append', dest='urls', help='Page to request (repeatable); defaults to the home pages'
+        )
+        parser.add_argument('--concurrency', type=int, default=50, help='Number of concurrent clients')
+        parser.add_argument('--requests', type=int, default=1000, help='Total number of requests')
+        parser.add_argument(
+            '--warmup', type=int,
+            help='Requests to send before measuring (default 20; with --suite, per page and default 5)'
+        )
+        parser.add_argument(
+            '--compare', action='store_true', help='Benchmark with ASYNC_READ_VIEWS off and on, in separate processes'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+        suite = parser.add_argument_group('page suite')
+        suite.add_argument(
+            '--suite', action='store_true', help='Benchmark the main pages one at a time, with their query counts'
+        )
+        suite.add_argument('--club', help='Slug of the club to benchmark; defaults to one the reader administers')
+        suite.add_argument('--iterations', type=int, default=50, help='Measured requests per page')
+        suite.add_argument('--output', help='Write the results as JSON to this file')
+        suite.add_argument('--baseline', help='Earlier results (JSON) to compare against')
+        suite.add_argument(
+            '--fail-threshold', type=float,
+            help='Exit with an error if any page\'s p95 latency grows by more than this percentage over the baseline, '
+                 'or it makes more queries'
+        )
+
+    def handle(self, *args, **options):
+        if options['suite']:
+            if options['compare']:
+                raise CommandError('--compare is for the load test, not --suite')
+            return self.run_suite(options)
+
+        warmup = 20 if options['warmup'] is None else options['warmup']
+        if options['compare']:
+            return self.compare(options, warmup)
+
+        reader = Reader.objects.filter(username=options['username']).first()
+        if reader is None:
+            raise CommandError(f'No reader named {options["username"]}')
+
+        urls = options['urls'] or self.default_urls
+        headers = [(b'cookie', login_cookie(reader).encode()), (b'host', b'localhost')]
+        application = get_asgi_application()
+
+        async def benchmark():
+            await run_load(application, urls, headers, min(options['concurrency'], warmup), warmup)
+            return await run_load(application, urls, headers, options['concurrency'], options['requests'])
+
+        results = summarize(*asyncio.run(benchmark()))
+        results['async_views'] = settings.ASYNC_READ_VIEWS
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+        else:
+            self.write_results('async' if settings.ASYNC_READ_VIEWS else 'sync', results)
+
+    def compare(self, options, warmup):
+        """
+        Run the benchmark once per view mode; the URLconf picks the views at import, so each needs its own process
+        """
+
+        arguments = [
+            sys.executable, sys.argv[0], 'benchmark_views', '--json',
+            '--username', options['username'],
+            '--concurrency', str(options['concurrency']),
+            '--requests', str(options['requests']),
+            '--warmup', str(warmup),
+        ]
+        for url in options['urls'] or []:
+            arguments.extend(['--url', url])
+
+        all_results = {}
+        for mode, flag in [('sync', 'false'), ('async', 'true')]:
+            completed = subprocess.run(
+                arguments, env={**os.environ, 'ASYNC_READ_VIEWS': flag}, capture_output=True, text=True
+            )
+            if completed.returncode:
+                raise CommandError(f'{mode} benchmark failed:\n{completed.stderr}')
+
+            all_results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        if options['json']:
+            self.stdout.write(json.dumps(all_results))
+        else:
+            for mode, results in all_results.items():
+                self.write_results(mode, results)
+
+    def write_results(self, mode, results):
+        self.stdout.write(
+            f'{mode:>5}: {results["requests_per_s"]} req/s, '
+            f'p50 {results["p50_ms"]} ms, p95 {results["p95_ms"]} ms, p99 {results["p99_ms"]} ms '
+            f'({results["requests"]} requests, statuses {results["statuses"]})'
+        )
+
+    def run_suite(self, options):
+        """
+        Benchmark each page of the suite in turn through the test client, as a single reader
+        """
+
+        reader = Reader.objects.filter(username=options['username']).first()
+        if reader is None:
+            raise CommandError(f'No reader named {options["username"]}')
+
+        book_club = self.get_club(reader, options['club'])
+        warmup = 5 if options['warmup'] is None else options['warmup']
+        client = Client()
+        client.force_login(reader)
+
+        # Sampling would swap in its own recorder mid-request, so keep it off while measuring
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=0, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            pages = [
+                self.benchmark_page(client, name, url, options['iterations'], warmup)
+                for name, url in self.suite(book_club)
+            ]
+
+        results = {
+            'commit': self.git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'async_read_views': settings.ASYNC_READ_VIEWS,
+            },
+            'iterations': options['iterations'],
+            'pages': pages,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+        else:
+            for page in pages:
+                self.stdout.write(
+                    f'{page["name"]:<28} {page["requests_per_s"]:>8} req/s  p50 {page["p50_ms"]:>8} ms  '
+                    f'p95 {page["p95_ms"]:>8} ms  p99 {page["p99_ms"]:>8} ms  queries {page["queries_max"]:>4}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f'Saved results to {options["output"]}')
+
+        if options['baseline']:
+            self.compare_baseline(results, options['baseline'], options['fail_threshold'])
+
+    @staticmethod
+    def get_club(reader, book_club_slug):
+        book_clubs = BookClub.objects.active()
+        if book_club_slug:
+            book_club = book_clubs.filter(slug=book_club_slug).first()
+        else:
+            book_club = book_clubs.filter(
+                bookclubreaders__reader=reader,
+                bookclubreaders__club_role=BookClubReaders.RoleInClub.ADMIN,
+                bookclubreaders__left__isnull=True,
+            ).order_by('name').first()
+
+        if book_club is None:
+            raise CommandError('No club to benchmark; pass --club or pick a reader who administers one')
+
+        return book_club
+
+    @staticmethod
+    def suite(book_club):
+        """
+        The pages to benchmark, as (name, URL)
+        """
+
+        admin_url = 'book_club:book_club_admin:'
+
+        return [
+            ('home', reverse('home')),
+            ('book_clubs', reverse('book_club:book_clubs')),
+            ('book_club_home', reverse('book_club:book_club_home', args=[book_club.slug])),
+            ('book_club_search', reverse('book_club:book_club_search') + '?search_text=club'),
+            ('notifications', reverse('notifications:notifications')),
+            ('notifications_page', reverse('notifications:notifications_page') + '?format=json'),
+            ('admin_members', reverse(admin_url + 'book_club_admin_members', args=[book_club.slug])),
+            ('admin_requests', reverse(admin_url + 'book_club_admin_membership_requests', args=[book_club.slug])),
+        ]
+
+    @staticmethod
+    def benchmark_page(client, name, url, iterations, warmup):
+        for _ in range(warmup):
+            client.get(url)
+
+        samples = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            # Record the queries through the instrumentation hooks, which also see async views' worker threads
+            recorder = Recorder()
+            token = current_recorder.set(recorder)
+            try:
+                response = client.get(url)
+            finally:
+                current_recorder.reset(token)
+            samples.append(recorder.sample(name, response.status_code))
+        elapsed = time.perf_counter() - started
+
+        total = [sample.total_ms for sample in samples]
+        queries = [sample.queries for sample in samples]
+
+        return {
+            'name': name,
+            'url': url,
+            'statuses': sorted({sample.status for sample in samples}),
+            'requests_per_s': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(total, 50), 2),
+            'p95_ms': round(percentile(total, 95), 2),
+            'p99_ms': round(percentile(total, 99), 2),
+            'queries_median': statistics.median(queries),
+            'queries_max': max(queries),
+            'similar_queries_max': max(sample.similar_queries for sample in samples),
+            'db_p95_ms': round(percentile([sample.db_ms for sample in samples], 95), 2),
+            'template_p95_ms': round(percentile([sample.template_ms for sample in samples], 95), 2),
+        }
+
+    def compare_baseline(self, results, baseline_path, fail_threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        baseline_pages = {page['name']: page for page in baseline['pages']}
+        regressions = []
+        self.stdout.write(f'Compared with {baseline_path} (commit {baseline.get("commit")}):')
+        for page in results['pages']:
+            before = baseline_pages.get(page['name'])
+            if before is None:
+                continue
+
+            change = (page['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            self.stdout.write(
+                f'{page["name"]:<28} p95 {before["p95_ms"]:>8} -> {page["p95_ms"]:>8} ms ({change:+.1f}%)  '
+                f'queries {before["queries_max"]} -> {page["queries_max"]}'
+            )
+            if fail_threshold is not None and (change > fail_threshold or page['queries_max'] > before['queries_max']):
+                regressions.append(page['name'])
+
+        if regressions:
+            raise CommandError(f'Regressed against the baseline: {", ".join(regressions)}')
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True
+            ).stdout.strip() or None
+        except OSError:
+            return None
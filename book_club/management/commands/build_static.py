@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+STATIC_DIR = Path(__file__).resolve().parents[2] / 'static' / 'book_club'
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the static files for deployment: compile the SCSS minified, then collect everything the pages use '
+        'into STATIC_ROOT with content-hashed names and gzip/brotli copies'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-sass', action='store_true', help='Collect the CSS as it is, without recompiling')
+
+    def handle(self, *args, **options):
+        if not options['skip_sass']:
+            call_command(
+                'sass', str(STATIC_DIR / 'scss' / 'base.scss'), str(STATIC_DIR / 'css' / 'base.css'), t='compressed'
+            )
+            self.stdout.write('Compiled book_club/css/base.css')
+
+        call_command('collectstatic', interactive=False, clear=True, verbosity=options['verbosity'])
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from book_club.images import generate_renditions
+from book_club.models import BookClub
+
+
+class Command(BaseCommand):
+    help = 'Generate resized image renditions for book clubs that are missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', help='Regenerate renditions for every club with an image'
+        )
+
+    def handle(self, *args, **options):
+        book_clubs = BookClub.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            book_clubs = book_clubs.filter(image_renditions={})
+
+        for book_club_id in book_clubs.values_list('id', flat=True).iterator():
+            generate_renditions(book_club_id)
+            self.stdout.write(f'Generated renditions for {book_club_id}')
@@ -0,0 +1,56 @@
+import json
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from book_club.instrumentation import collected_samples, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Dump the per-view query, DB time and latency report from sampled requests. Reads the samples the server '
+        'processes publish to the cache, so CACHE_URL must point at a cache shared with them (e.g. redis:// or '
+        'pymemcache://). With the default local memory cache, use the /instrumentation/ page instead.'
+    )
+
+    columns = [
+        ('view', 'View', 45), ('requests', 'Requests', 9), ('p50_ms', 'p50 ms', 9), ('p95_ms', 'p95 ms', 9),
+        ('p99_ms', 'p99 ms', 9), ('queries_mean', 'Queries', 8), ('queries_max', 'Max', 5),
+        ('db_p95_ms', 'DB p95', 9), ('template_p95_ms', 'Tmpl p95', 9), ('similar_queries_max', 'Similar', 8),
+        ('duplicate_queries_max', 'Dupes', 6),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--view', help='Only report views whose name contains this')
+
+    def handle(self, *args, **options):
+        # A local memory cache is this command's own, so it can never hold the server processes' samples
+        if isinstance(caches['default'], (LocMemCache, DummyCache)):
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to this process, so the server\'s samples can\'t be read from here. Set '
+                'CACHE_URL to a cache shared with the server, or see the /instrumentation/ page.'
+            ))
+
+        report = summarize(collected_samples())
+        if options['view']:
+            report = [row for row in report if options['view'] in row['view']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        if not report:
+            self.stdout.write('No samples yet')
+            return
+
+        self.stdout.write(''.join(
+            f'{title:>{width}}' if key != 'view' else f'{title:<{width}}' for key, title, width in self.columns
+        ))
+        for row in report:
+            self.stdout.write(''.join(
+                f'{row[key]!s:>{width}}' if key != 'view' else f'{row[key][:width - 1]:<{width}}'
+                for key, _, width in self.columns
+            ))
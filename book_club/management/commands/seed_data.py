@@ -0,0 +1,215 @@
+import random
+import uuid
+
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import slugify
+
+from book_club.models import BookClub, BookClubReaders, MembershipRequest, Reader
+from notifications.models import Notification
+
+GIVEN_NAMES = ['Ada', 'Ben', 'Cleo', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivo', 'June', 'Kai', 'Lena', 'Milo', 'Nia']
+SURNAMES = ['Abbott', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jones', 'Khan', 'Lopez']
+ADJECTIVES = ['Mystery', 'Classic', 'Sci-Fi', 'Poetry', 'History', 'Fantasy', 'Horror', 'Romance', 'Graphic', 'Travel']
+NOUNS = ['Readers', 'Circle', 'Society', 'Club', 'Guild', 'Salon', 'Collective', 'Corner', 'League', 'Hour']
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset of readers, book clubs, memberships, membership requests and notifications with '
+        'bulk inserts. The same --seed and --prefix always produce the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=1000, help='Number of readers')
+        parser.add_argument('--clubs', type=int, default=100, help='Number of book clubs')
+        parser.add_argument('--members-per-club', type=int, default=20, help='Average members per club')
+        parser.add_argument('--requests-per-club', type=int, default=5, help='Average membership requests per club')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed')
+        parser.add_argument('--prefix', default='seed', help='Prefix for usernames and club names')
+        parser.add_argument('--password', default='password', help='Password for every seeded reader')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        # The prefix is part of the seed, so datasets with different prefixes can live side by side
+        self.rng = random.Random(f'{options["prefix"]}:{options["seed"]}')
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        now = datetime.now()
+
+        # Hashing is deliberately slow, so every reader shares one hash
+        password = make_password(options['password'])
+
+        reader_ids = self.seed_readers(prefix, options['readers'], password, now)
+        club_ids = self.seed_clubs(prefix, options['clubs'], now)
+        members = self.seed_memberships(club_ids, reader_ids, options['members_per_club'], now)
+        open_requests = self.seed_requests(club_ids, reader_ids, members, options['requests_per_club'], now)
+        self.seed_notifications(reader_ids, open_requests, now)
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def bulk_create(self, model, objs):
+        """
+        Insert rows in batches, each in its own transaction so huge datasets don't build one enormous one
+        """
+
+        batch = []
+        created = 0
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                created += self.insert(model, batch)
+                batch = []
+        if batch:
+            created += self.insert(model, batch)
+
+        self.stdout.write(f'Created {created} {model.__name__} rows')
+
+    @staticmethod
+    def insert(model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+
+        return len(batch)
+
+    def seed_readers(self, prefix, count, password, now):
+        reader_ids = [self.uuid() for _ in range(count)]
+        self.bulk_create(Reader, (
+            Reader(
+                id=reader_id,
+                username=f'{prefix}reader{i}',
+                email=f'{prefix}reader{i}@example.com',
+                given_name=self.rng.choice(GIVEN_NAMES),
+                surname=self.rng.choice(SURNAMES),
+                password=password,
+                joined=now - timedelta(days=self.rng.randint(0, 1000)),
+            )
+            for i, reader_id in enumerate(reader_ids)
+        ))
+
+        return reader_ids
+
+    def seed_clubs(self, prefix, count, now):
+        club_ids = [self.uuid() for _ in range(count)]
+        publicities = (
+            [BookClub.Publicity.PUBLIC] * 6 + [BookClub.Publicity.OBSERVABLE] * 3 + [BookClub.Publicity.PRIVATE]
+        )
+
+        def clubs():
+            for i, club_id in enumerate(club_ids):
+                name = f'{prefix} {self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)} {i}'
+                yield BookClub(
+                    id=club_id,
+                    name=name,
+                    slug=slugify(name),
+                    description=f'A {name.lower()} for readers who like {self.rng.choice(ADJECTIVES).lower()} books',
+                    publicity=self.rng.choice(publicities),
+                    created=now - timedelta(days=self.rng.randint(0, 1000)),
+                )
+
+        self.bulk_create(BookClub, clubs())
+
+        return club_ids
+
+    def seed_memberships(self, club_ids, reader_ids, per_club, now):
+        """
+        Give every club a random set of members, the first of them its creating admin. The admins are dealt out
+        from the first readers in turn, so the first reader always administers a club.
+        """
+
+        members = {}
+        roles = [BookClubReaders.RoleInClub.READER] * 6 + [
+            BookClubReaders.RoleInClub.PARTICIPANT, BookClubReaders.RoleInClub.PARTICIPANT,
+            BookClubReaders.RoleInClub.OBSERVER, BookClubReaders.RoleInClub.ADMIN,
+        ]
+
+        def memberships():
+            for i, club_id in enumerate(club_ids):
+                admin_id = reader_ids[i % len(reader_ids)]
+                count = min(len(reader_ids), self.rng.randint(1, max(1, per_club * 2 - 1)))
+                others = [reader_id for reader_id in self.rng.sample(reader_ids, count) if reader_id != admin_id]
+                members[club_id] = [admin_id] + others[:count - 1]
+                for position, reader_id in enumerate(members[club_id]):
+                    creator = position == 0
+                    yield BookClubReaders(
+                        reader_id=reader_id,
+                        book_club_id=club_id,
+                        club_role=BookClubReaders.RoleInClub.ADMIN if creator else self.rng.choice(roles),
+                        is_creator=creator,
+                        joined=now - timedelta(days=self.rng.randint(0, 500)),
+                        # Some readers have since left
+                        left=(
+                            now - timedelta(days=self.rng.randint(0, 30))
+                            if not creator and self.rng.random() < 0.1 else None
+                        ),
+                    )
+
+        self.bulk_create(BookClubReaders, memberships())
+
+        return members
+
+    def seed_requests(self, club_ids, reader_ids, members, per_club, now):
+        statuses = [MembershipRequest.RequestStatus.OPEN] * 4 + [
+            MembershipRequest.RequestStatus.VIEWED,
+            MembershipRequest.RequestStatus.ACCEPTED,
+            MembershipRequest.RequestStatus.REJECTED,
+        ]
+
+        open_requests = []
+
+        def requests():
+            for club_id in club_ids:
+                count = min(len(reader_ids), self.rng.randint(0, max(0, per_club * 2)))
+                club_members = set(members[club_id])
+                for reader_id in self.rng.sample(reader_ids, count):
+                    if reader_id in club_members:
+                        continue
+
+                    status = self.rng.choice(statuses)
+                    requested = now - timedelta(days=self.rng.randint(1, 60))
+                    pending = status in (MembershipRequest.RequestStatus.OPEN, MembershipRequest.RequestStatus.VIEWED)
+                    if pending:
+                        open_requests.append((reader_id, club_id, requested))
+
+                    yield MembershipRequest(
+                        reader_id=reader_id,
+                        book_club_id=club_id,
+                        message='I would love to join!',
+                        status=status,
+                        requested=requested,
+                        # The club's creating admin evaluated everything that isn't pending
+                        evaluator_id=None if pending else members[club_id][0],
+                        evaluated=None if pending else now,
+                    )
+
+        self.bulk_create(MembershipRequest, requests())
+
+        return open_requests
+
+    def seed_notifications(self, reader_ids, open_requests, now):
+        """
+        Welcome notifications for everyone, plus notifications for the open requests (fanned out to club admins)
+        """
+
+        def notifications():
+            for reader_id in reader_ids:
+                yield Notification(
+                    source_reader_id=reader_id,
+                    target_reader_id=reader_id,
+                    type=Notification.NotificationType.REGISTERED,
+                    generated=now - timedelta(days=self.rng.randint(0, 1000)),
+                )
+
+            for reader_id, book_club_id, requested in open_requests:
+                yield Notification(
+                    source_reader_id=reader_id,
+                    book_club_id=book_club_id,
+                    type=Notification.NotificationType.MEMBERSHIP_REQUESTED,
+                    generated=requested,
+                )
+
+        self.bulk_create(Notification, notifications())
@@ -0,0 +1,121 @@
+import re
+import urllib.error
+import urllib.request
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book_club.fonts import FONTS_CSS, ICON_FONT, TEXT_FONT, can_subset, find_icons, subset_icons
+
+STATIC_DIR = Path(__file__).resolve().parents[2] / 'static'
+
+TEXT_FONT_CSS = 'https://fonts.googleapis.com/css2?family=Roboto+Slab&display=swap'
+ICON_FONT_CSS = 'https://fonts.googleapis.com/icon?family=Material+Icons'
+
+# Google Fonts picks the font format by user agent: WOFF2 for current browsers, TrueType for unknown clients
+WOFF2_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+TRUETYPE_USER_AGENT = 'Mozilla/5.0'
+
+FONTS_CSS_TEMPLATE = """/* Written by `manage.py vendor_fonts`; run it again rather than editing by hand */
+@font-face {{
+  font-family: 'Roboto Slab';
+  font-style: normal;
+  font-weight: 400;
+  font-display: swap;
+  src: url('../fonts/{text_font}') format('woff2');
+  unicode-range: {unicode_range};
+}}
+
+/* Icons: {icons} */
+@font-face {{
+  font-family: 'Material Icons';
+  font-style: normal;
+  font-weight: 400;
+  font-display: block;
+  src: url('../fonts/{icon_font}') format('woff2');
+}}
+
+.material-icons {{
+  font-family: 'Material Icons';
+  font-weight: normal;
+  font-style: normal;
+  font-size: 24px;
+  line-height: 1;
+  letter-spacing: normal;
+  text-transform: none;
+  display: inline-block;
+  white-space: nowrap;
+  word-wrap: normal;
+  direction: ltr;
+  -webkit-font-feature-settings: 'liga';
+  -webkit-font-smoothing: antialiased;
+}}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Download Roboto Slab and Material Icons from Google Fonts into the static files, cut down to the Latin '
+        'characters and the icons the templates use, and write the @font-face rules to book_club/css/fonts.css'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--icon', action='append', dest='icons', default=[],
+            help='Keep an icon the templates don\'t name literally (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        icons = find_icons() | set(options['icons'])
+        if not icons:
+            raise CommandError('No Material Icons found in the templates')
+
+        # Google already splits Roboto Slab by script, and the pages are in English, so the Latin part is enough
+        text_css = self.fetch(TEXT_FONT_CSS, WOFF2_USER_AGENT).decode()
+        latin = re.search(r'/\* latin \*/\s*@font-face\s*{([^}]*)}', text_css)
+        if latin is None:
+            raise CommandError('Google Fonts returned no Latin subset of Roboto Slab')
+        self.write(TEXT_FONT, self.fetch(self.font_url(latin.group(1)), WOFF2_USER_AGENT))
+        unicode_range = re.search(r'unicode-range:\s*([^;]+);', latin.group(1)).group(1)
+
+        if can_subset():
+            icon_css = self.fetch(ICON_FONT_CSS, TRUETYPE_USER_AGENT).decode()
+            icon_font, missing = subset_icons(self.fetch(self.font_url(icon_css), TRUETYPE_USER_AGENT), icons)
+            if missing:
+                self.stderr.write(f'No icons named: {", ".join(sorted(missing))}')
+        else:
+            self.stderr.write('Install fontTools and brotli to subset the icons; keeping the whole icon font')
+            icon_css = self.fetch(ICON_FONT_CSS, WOFF2_USER_AGENT).decode()
+            icon_font = self.fetch(self.font_url(icon_css), WOFF2_USER_AGENT)
+        self.write(ICON_FONT, icon_font)
+
+        self.write(FONTS_CSS, FONTS_CSS_TEMPLATE.format(
+            text_font=Path(TEXT_FONT).name,
+            icon_font=Path(ICON_FONT).name,
+            unicode_range=unicode_range,
+            icons=', '.join(sorted(icons)),
+        ).encode())
+
+    @staticmethod
+    def fetch(url, user_agent):
+        request = urllib.request.Request(url, headers={'User-Agent': user_agent})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.read()
+        except urllib.error.URLError as error:
+            raise CommandError(f'Failed to download {url}: {error.reason}')
+
+    @staticmethod
+    def font_url(css):
+        match = re.search(r'src:\s*url\(([^)]+)\)', css)
+        if match is None:
+            raise CommandError('No font URL in the Google Fonts stylesheet')
+
+        return match.group(1).strip('\'"')
+
+    def write(self, name, content):
+        path = STATIC_DIR / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        self.stdout.write(f'Wrote {name} ({len(content) // 1024} KiB)')
@@ -1,8 +1,33 @@
+from django.apps import apps
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models
+from django.db.models import Exists, F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
 
-class ReaderManager(BaseUserManager):
+class ReaderQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Update the readers, dropping their cached principals (see book_club.cache.get_principal) if any of the
+        fields in them change. update() sends no signals, so the signal receivers can't do it.
+        """
+
+        # NOTE - Imported here since the cache module imports the models, which import this module
+        from .cache import invalidate_principals
+
+        cached_reader = apps.get_model('book_club', 'CachedReader')
+        if not set(kwargs) & {*cached_reader.PRINCIPAL_FIELDS, 'password'}:
+            return super().update(**kwargs)
+
+        reader_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        invalidate_principals(reader_ids)
+
+        return updated
+
+
+class ReaderManager(BaseUserManager.from_queryset(ReaderQuerySet)):
     """
     Custom user model manager where email is the unique identifiers
     for authentication instead of usernames.
@@ -33,3 +58,80 @@ class ReaderManager(BaseUserManager):
         if extra_fields.get("is_superuser") is not True:
             raise ValueError(_("Superuser must have is_superuser=True."))
         return self.create_user(username, email, password, **extra_fields)
+
+
+def count_subquery(queryset):
+    """
+    Scalar subquery counting the rows of a queryset (correlated with OuterRef), for annotations that mustn't
+    multiply rows the way a join and Count() would
+    """
+
+    return Coalesce(
+        Subquery(
+            queryset.order_by().annotate(count=Func(F('pk'), function='COUNT')).values('count')[:1],
+            output_field=models.IntegerField(),
+        ),
+        0,
+    )
+
+
+class BookClubQuerySet(models.QuerySet):
+    """
+    Annotations for loading a club and everything a page needs to know about it in one query
+    """
+
+    def active(self):
+        return self.filter(disbanded__isnull=True)
+
+    def with_reader_role(self, reader_id):
+        """
+        Annotate the reader's active role in each club as reader_role (None if they aren't a member)
+        """
+
+        # NOTE - Models are looked up lazily since models.py imports this module
+        club_readers = apps.get_model('book_club', 'BookClubReaders')
+
+        return self.annotate(
+            reader_role=Subquery(
+                club_readers.objects.filter(
+                    book_club=OuterRef('pk'), reader_id=reader_id, left__isnull=True
+                ).values('club_role')[:1]
+            )
+        )
+
+    def with_membership_requested(self, reader_id):
+        """
+        Annotate whether the reader has a pending (open or viewed) request to join each club as membership_requested
+        """
+
+        membership_request = apps.get_model('book_club', 'MembershipRequest')
+
+        return self.annotate(
+            membership_requested=Exists(
+                membership_request.objects.filter(
+                    book_club=OuterRef('pk'),
+                    reader_id=reader_id,
+                    status__in=[membership_request.RequestStatus.OPEN, membership_request.RequestStatus.VIEWED],
+                )
+            )
+        )
+
+    def with_counts(self):
+        """
+        Annotate each club's number of active members (member_count) and pending requests (open_request_count)
+        """
+
+        club_readers = apps.get_model('book_club', 'BookClubReaders')
+        membership_request = apps.get_model('book_club', 'MembershipRequest')
+
+        return self.annotate(
+            member_count=count_subquery(
+                club_readers.objects.filter(book_club=OuterRef('pk'), left__isnull=True)
+            ),
+            open_request_count=count_subquery(
+                membership_request.objects.filter(
+                    book_club=OuterRef('pk'),
+                    status__in=[membership_request.RequestStatus.OPEN, membership_request.RequestStatus.VIEWED],
+                )
+            ),
+        )
@@ -0,0 +1,121 @@
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+
+from .cache import cache_club, club_slug_version, get_cached_club
+from .models import BookClub, BookClubReaders
+
+
+class ClubMembership(NamedTuple):
+    """
+    An active book club along with the reader's active role in it (None if they aren't a member)
+    """
+
+    book_club: Optional[BookClub]
+    role: Optional[str]
+
+    @property
+    def is_member(self):
+        return self.role is not None
+
+    @property
+    def is_admin(self):
+        return self.role == BookClubReaders.RoleInClub.ADMIN
+
+
+class MembershipResolver:
+    """
+    Resolves and memoizes the current reader's membership in book clubs for the length of a request
+    """
+
+    def __init__(self, req):
+        self.req = req
+        self.memberships = {}
+
+    def membership(self, book_club_slug, annotate=None):
+        """
+        Get the club with the given slug and the reader's role in it, in a single query per slug.
+        Pass annotate, a function adding annotations to the club queryset, to load whatever else a page needs about
+        the club in that same query. The cached club can't have them, so that always queries the club.
+        """
+
+        if annotate is not None or book_club_slug not in self.memberships:
+            self.memberships[book_club_slug] = self._load(book_club_slug, annotate)
+
+        return self.memberships[book_club_slug]
+
+    def club_role(self, book_club_slug):
+        return self.membership(book_club_slug).role
+
+    async def amembership(self, book_club_slug, annotate=None):
+        """
+        Async version of membership(), for async views
+        """
+
+        if annotate is not None or book_club_slug not in self.memberships:
+            self.memberships[book_club_slug] = await self._aload(book_club_slug, annotate)
+
+        return self.memberships[book_club_slug]
+
+    async def aclub_role(self, book_club_slug):
+        return (await self.amembership(book_club_slug)).role
+
+    def _reader_id(self):
+        return self.req.user.id if self.req.user.is_authenticated else None
+
+    @staticmethod
+    def _role_query(book_club, reader_id):
+        return BookClubReaders.objects.filter(
+            book_club=book_club, reader_id=reader_id, left__isnull=True
+        ).values_list('club_role', flat=True)
+
+    @staticmethod
+    def _club_query(book_club_slug, reader_id):
+        return BookClub.objects.active().filter(slug=book_club_slug).with_reader_role(reader_id)
+
+    def _load(self, book_club_slug, annotate):
+        reader_id = self._reader_id()
+
+        # An annotated club is the page's own, so it's neither read from nor stored in the cache
+        if annotate is not None:
+            book_club = annotate(self._club_query(book_club_slug, reader_id)).first()
+            return ClubMembership(book_club, book_club.reader_role if book_club else None)
+
+        # On a cache hit only the role needs looking up
+        version = club_slug_version()
+        book_club = get_cached_club(book_club_slug, version)
+        if book_club is not None:
+            return ClubMembership(book_club, self._role_query(book_club, reader_id).first())
+
+        # Otherwise get the club and role together and cache the club
+        book_club = self._club_query(book_club_slug, reader_id).first()
+        if book_club is None:
+            return ClubMembership(None, None)
+
+        role = book_club.reader_role
+        del book_club.reader_role
+        cache_club(book_club, version)
+
+        return ClubMembership(book_club, role)
+
+    async def _aload(self, book_club_slug, annotate):
+        reader_id = self._reader_id()
+
+        if annotate is not None:
+            book_club = await annotate(self._club_query(book_club_slug, reader_id)).afirst()
+            return ClubMembership(book_club, book_club.reader_role if book_club else None)
+
+        version = await sync_to_async(club_slug_version)()
+        book_club = await sync_to_async(get_cached_club)(book_club_slug, version)
+        if book_club is not None:
+            return ClubMembership(book_club, await self._role_query(book_club, reader_id).afirst())
+
+        book_club = await self._club_query(book_club_slug, reader_id).afirst()
+        if book_club is None:
+            return ClubMembership(None, None)
+
+        role = book_club.reader_role
+        del book_club.reader_role
+        await sync_to_async(cache_club)(book_club, version)
+
+        return ClubMembership(book_club, role)
@@ -0,0 +1,235 @@
+import mimetypes
+
+from pathlib import Path
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_principal
+from .instrumentation import Recorder, current_recorder, sample_buffer, should_sample
+from .membership import MembershipResolver
+from .models import CachedReader
+from .staticfiles import ENCODINGS
+
+
+class ClubMembershipMiddleware:
+    """
+    Gives each request a memoized club membership resolver, so views can ask for
+    req.club_membership(slug) or req.club_role(slug) without repeating queries
+    (or await req.aclub_membership(slug) / req.aclub_role(slug) in async views)
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, req):
+        if iscoroutinefunction(self):
+            return self.__acall__(req)
+
+        self.add_resolver(req)
+        return self.get_response(req)
+
+    async def __acall__(self, req):
+        self.add_resolver(req)
+        return await self.get_response(req)
+
+    @staticmethod
+    def add_resolver(req):
+        resolver = MembershipResolver(req)
+        req.club_membership = resolver.membership
+        req.club_role = resolver.club_role
+        req.aclub_membership = resolver.amembership
+        req.aclub_role = resolver.aclub_role
+
+
+class InstrumentationMiddleware:
+    """
+    Records the query count, DB time, duplicate queries and template render time of a sample of requests
+    (INSTRUMENTATION_SAMPLE_RATE) per URL name, for the instrumentation report. Requests that aren't sampled only
+    pay for a random number.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, req):
+        if iscoroutinefunction(self):
+            return self.__acall__(req)
+
+        if not should_sample():
+            return self.get_response(req)
+
+        token = current_recorder.set(Recorder())
+        try:
+            response = self.get_response(req)
+            self.record(req, response)
+        finally:
+            current_recorder.reset(token)
+
+        return response
+
+    async def __acall__(self, req):
+        if not should_sample():
+            return await self.get_response(req)
+
+        token = current_recorder.set(Recorder())
+        try:
+            response = await self.get_response(req)
+            self.record(req, response)
+        finally:
+            current_recorder.reset(token)
+
+        return response
+
+    @staticmethod
+    def record(req, response):
+        # Streaming responses (e.g. notification streams) are still running, so there's nothing meaningful to record
+        if response.streaming:
+            return
+
+        resolver_match = getattr(req, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match is not None else '<unresolved>'
+        sample_buffer.add(current_recorder.get().sample(view, response.status_code))
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that gives logged in readers a CachedReader built from their cached principal, so
+    most requests don't load the Reader row at all. Anything unusual (no cached principal, an inactive reader, a
+    session hash that doesn't match) falls back to Django's own user loading. Turned off by
+    BOOK_CLUB_CACHED_PRINCIPAL.
+    """
+
+    def process_request(self, req):
+        if not getattr(settings, 'BOOK_CLUB_CACHED_PRINCIPAL', True):
+            return super().process_request(req)
+
+        req.user = SimpleLazyObject(lambda: self.get_user(req))
+
+    def get_user(self, req):
+        if not hasattr(req, '_cached_user'):
+            req._cached_user = self.load_user(req)
+
+        return req._cached_user
+
+    @staticmethod
+    def load_user(req):
+        reader_id = req.session.get(auth.SESSION_KEY)
+        backend_path = req.session.get(auth.BACKEND_SESSION_KEY)
+        if reader_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+            return auth.get_user(req)
+
+        principal = get_principal(reader_id)
+        if principal is None or not principal['is_active']:
+            return auth.get_user(req)
+
+        reader = CachedReader.from_principal(principal)
+        session_hash = req.session.get(auth.HASH_SESSION_KEY)
+        if not session_hash or not constant_time_compare(session_hash, reader.get_session_auth_hash()):
+            return auth.get_user(req)
+
+        return reader
+
+
+class PrecompressedStaticMiddleware:
+    """
+    Serves collected static files from STATIC_ROOT, picking the brotli or gzip copy written by
+    PrecompressedManifestStaticFilesStorage when the client accepts it. Content-hashed names never change, so they
+    are cached for a year as immutable. Not used with DEBUG (runserver serves static files itself) or without a
+    STATIC_ROOT.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    CACHE_CONTROL = 'public, max-age=3600'
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        self.root = Path(settings.STATIC_ROOT).resolve()
+        self.prefix = urlparse(settings.STATIC_URL).path
+        self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, req):
+        if iscoroutinefunction(self):
+            return self.__acall__(req)
+
+        return self.serve(req) or self.get_response(req)
+
+    async def __acall__(self, req):
+        return self.serve(req) or await self.get_response(req)
+
+    def serve(self, req):
+        """
+        The response for a static file request, or None to pass the request on
+        """
+
+        if req.method not in ('GET', 'HEAD') or not req.path.startswith(self.prefix):
+            return None
+
+        name = req.path[len(self.prefix):]
+        path = (self.root / name).resolve()
+        if not path.is_relative_to(self.root) or not path.is_file():
+            return None
+
+        # Serve the most preferred precompressed copy the client accepts, if there is one
+        accepted = self.accepted_encodings(req.headers.get('Accept-Encoding', ''))
+        encoding, served_path = None, path
+        for candidate, extension in ENCODINGS.items():
+            variant = path.with_name(path.name + extension)
+            if candidate in accepted and variant.is_file():
+                encoding, served_path = candidate, variant
+                break
+
+        content_type, _ = mimetypes.guess_type(path.name)
+        response = FileResponse(
+            served_path.open('rb'), content_type=content_type or 'application/octet-stream', filename=path.name
+        )
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = (
+            self.IMMUTABLE_CACHE_CONTROL if name in self.hashed_names else self.CACHE_CONTROL
+        )
+
+        return response
+
+    @staticmethod
+    def accepted_encodings(accept_encoding):
+        accepted = set()
+        for part in accept_encoding.split(','):
+            coding, _, params = part.partition(';')
+            quality = params.strip().removeprefix('q=')
+            try:
+                if params and float(quality) == 0:
+                    continue
+            except ValueError:
+                pass
+            accepted.add(coding.strip().lower())
+
+        return accepted
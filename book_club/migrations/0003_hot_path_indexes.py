@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0002_bookclub_slug'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookclub',
+            index=models.Index(condition=models.Q(('disbanded__isnull', True)), fields=['publicity'], name='book_club_active_publicity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookclubreaders',
+            index=models.Index(condition=models.Q(('left__isnull', True)), fields=['reader', 'club_role'], name='club_reader_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookclubreaders',
+            index=models.Index(condition=models.Q(('left__isnull', True)), fields=['book_club', 'club_role'], name='club_reader_active_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='membershiprequest',
+            index=models.Index(fields=['book_club', 'status'], name='membership_request_status_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 12:02
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Trigram similarity (%) matches on the raw name; icontains compiles to UPPER(...) LIKE, so index those expressions too
+SEARCH_INDEXES = {
+    'book_club_name_trgm_idx': 'name',
+    'book_club_name_upper_trgm_idx': '(UPPER(name::text))',
+    'book_club_description_upper_trgm_idx': '(UPPER(description::text))',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    Trigram GIN indexes for club search (PostgreSQL only; other databases use the in-process index)
+    """
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for index_name, expression in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON book_club_bookclub USING gin ({expression} gin_trgm_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for index_name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0004_book_club_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookclub',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
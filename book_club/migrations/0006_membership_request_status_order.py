@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0005_bookclub_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='membershiprequest',
+            name='membership_request_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='membershiprequest',
+            index=models.Index(fields=['book_club', 'status', '-requested'], name='membership_request_status_idx'),
+        ),
+    ]
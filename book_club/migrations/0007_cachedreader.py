@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0006_membership_request_status_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedReader',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('book_club.reader',),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0007_cachedreader'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookclub',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
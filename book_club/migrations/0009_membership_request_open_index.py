@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0008_bookclub_updated'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='membershiprequest',
+            index=models.Index(
+                condition=models.Q(('status__in', ['OP', 'VW'])),
+                fields=['book_club', '-requested', '-id'],
+                name='membership_request_open_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0009_membership_request_open_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='membershiprequest',
+            name='membership_request_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='membershiprequest',
+            index=models.Index(fields=['book_club', '-requested', '-id'], name='membership_request_club_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='membershiprequest',
+            index=models.Index(
+                fields=['book_club', 'status', '-requested', '-id'], name='membership_request_status_idx'
+            ),
+        ),
+    ]
@@ -1,12 +1,12 @@
 import uuid
 from datetime import datetime
 
-from django.db import models
+from django.db import models, router
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 
-from book_club.managers import ReaderManager
+from book_club.managers import BookClubQuerySet, ReaderManager
 
 
 # TODO - Create custom user manager
@@ -44,6 +44,43 @@ class Reader(AbstractBaseUser, PermissionsMixin):
         return self.username
 
 
+class CachedReader(Reader):
+    """
+    Slim stand-in for the logged in Reader, built from the cached principal (see book_club.cache.get_principal)
+    with only the fields most requests need. Touching any other field loads the rest of the row in one query.
+    """
+
+    # given_name is here because every page's navbar greets the reader by it
+    PRINCIPAL_FIELDS = ['id', 'username', 'given_name', 'is_staff', 'is_superuser', 'is_active']
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_principal(cls, principal):
+        # from_db() wants the values in the model's field order
+        fields = [field.attname for field in cls._meta.concrete_fields if field.attname in cls.PRINCIPAL_FIELDS]
+        reader = cls.from_db(router.db_for_read(cls), fields, [principal[field] for field in fields])
+        reader._session_auth_hash = principal['session_auth_hash']
+
+        return reader
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Load every deferred field together rather than a query per field
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            fields = deferred
+
+        super().refresh_from_db(using, fields)
+
+    def get_session_auth_hash(self):
+        # The password hash isn't cached, only the session hash made from it
+        if 'password' in self.get_deferred_fields():
+            return self._session_auth_hash
+
+        return super().get_session_auth_hash()
+
+
 # Book Clubs
 class BookClub(models.Model):
     class Publicity(models.TextChoices):
@@ -57,12 +94,53 @@ class BookClub(models.Model):
     name = models.CharField(max_length=100, null=False, unique=True)
     slug = models.CharField(max_length=100, null=False, unique=True)
     image = models.ImageField(upload_to='images/', null=True, blank=True)
+    image_renditions = models.JSONField(default=dict, blank=True)
     description = models.CharField(max_length=255, null=True, blank=True)
     created = models.DateTimeField(default=datetime.now)
+    # Bumped by every save, so anything cached per club (e.g. its rendered card) can be keyed on it
+    updated = models.DateTimeField(auto_now=True)
     disbanded = models.DateTimeField(null=True, blank=True)
     readers = models.ManyToManyField(Reader, through='BookClubReaders')
     publicity = models.CharField(max_length=2, choices=Publicity.choices, default=Publicity.PUBLIC)
 
+    objects = BookClubQuerySet.as_manager()
+
+    # Changing any of these invalidates the cached slug lookups (see book_club.signals)
+    SLUG_CACHE_FIELDS = ['slug', 'name', 'disbanded', 'publicity']
+
+    class Meta:
+        indexes = [
+            # Active (not disbanded) clubs by publicity, for search and browsing
+            models.Index(
+                fields=['publicity'],
+                condition=models.Q(disbanded__isnull=True),
+                name='book_club_active_publicity_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        book_club = super().from_db(db, field_names, values)
+        book_club.snapshot_slug_cache_fields()
+
+        return book_club
+
+    def snapshot_slug_cache_fields(self):
+        # Read from __dict__ so deferred fields aren't loaded
+        self._slug_cache_fields = {field: self.__dict__.get(field) for field in self.SLUG_CACHE_FIELDS}
+
+    def slug_cache_fields_changed(self):
+        """
+        Whether a field the slug lookups depend on changed since the club was loaded (or last saved).
+        Clubs that weren't loaded from the DB count as changed.
+        """
+
+        loaded = getattr(self, '_slug_cache_fields', None)
+
+        return loaded is None or any(
+            self.__dict__.get(field) != value for field, value in loaded.items()
+        )
+
 
 # Reader <-> Book Club Join Table with Roles
 class BookClubReaders(models.Model):
@@ -85,6 +163,20 @@ class BookClubReaders(models.Model):
 
     class Meta:
         unique_together = ('reader', 'book_club')
+        indexes = [
+            # A reader's active memberships
+            models.Index(
+                fields=['reader', 'club_role'],
+                condition=models.Q(left__isnull=True),
+                name='club_reader_active_idx',
+            ),
+            # A club's active members by role (e.g. its admins)
+            models.Index(
+                fields=['book_club', 'club_role'],
+                condition=models.Q(left__isnull=True),
+                name='club_reader_active_role_idx',
+            ),
+        ]
 
 
 # Membership Requests
@@ -109,6 +201,17 @@ class MembershipRequest(models.Model):
 
     class Meta:
         unique_together = ('reader', 'book_club')
+        indexes = [
+            # A club's requests, newest first: all of them, or those of one status
+            models.Index(fields=['book_club', '-requested', '-id'], name='membership_request_club_idx'),
+            models.Index(fields=['book_club', 'status', '-requested', '-id'], name='membership_request_status_idx'),
+            # A club's open requests (what admins see by default and the open request counts), newest first
+            models.Index(
+                fields=['book_club', '-requested', '-id'],
+                condition=models.Q(status__in=['OP', 'VW']),
+                name='membership_request_open_idx',
+            ),
+        ]
 
 
 # Authors
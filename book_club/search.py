@@ -0,0 +1,198 @@
+import re
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import BookClub
+
+
+def searchable_book_clubs():
+    """
+    Book clubs that can show up in search results (active and not private)
+    """
+
+    return BookClub.objects.filter(
+        disbanded__isnull=True,
+        publicity__in=[BookClub.Publicity.PUBLIC, BookClub.Publicity.OBSERVABLE],
+    )
+
+
+class PostgresSearchBackend:
+    """
+    Ranked search using pg_trgm similarity and full-text ranking, backed by trigram GIN indexes on
+    the club name and description
+    """
+
+    config = 'english'
+
+    def queryset(self, search_text):
+        # Imported here so that other databases don't need the PostgreSQL driver
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+        vector = (
+            SearchVector('name', weight='A', config=self.config)
+            + SearchVector('description', weight='B', config=self.config)
+        )
+        query = SearchQuery(search_text, config=self.config, search_type='websearch')
+
+        # Every candidate condition can be answered from the trigram indexes; ranking only runs on the matches
+        return searchable_book_clubs().filter(
+            Q(name__trigram_similar=search_text)
+            | Q(name__icontains=search_text)
+            | Q(description__icontains=search_text)
+        ).annotate(
+            rank=TrigramSimilarity('name', search_text) + SearchRank(vector, query)
+        ).order_by(F('rank').desc(), 'name')
+
+    def search(self, search_text, limit, offset=0):
+        return list(self.queryset(search_text)[offset:offset + limit])
+
+    async def asearch(self, search_text, limit, offset=0):
+        return [book_club async for book_club in self.queryset(search_text)[offset:offset + limit]]
+
+
+class TrigramIndex:
+    """
+    In-process trigram index over club names and descriptions, used in place of pg_trgm on other
+    databases (e.g. SQLite test runs). Scores roughly follow pg_trgm similarity.
+    """
+
+    similarity_threshold = 0.3
+
+    def __init__(self, book_clubs):
+        self.documents = {}
+        self.postings = {}
+        for book_club_id, name, description in book_clubs:
+            name_trigrams = trigrams(name)
+            self.documents[book_club_id] = (name, (name or '').lower(), (description or '').lower(), name_trigrams)
+            for trigram in name_trigrams:
+                self.postings.setdefault(trigram, set()).add(book_club_id)
+
+    def search(self, search_text, limit, offset=0):
+        """
+        Get the IDs of the best matching clubs, best first
+        """
+
+        text = search_text.lower()
+        query_trigrams = trigrams(search_text)
+
+        # Clubs sharing a trigram with the query, plus substring matches the trigrams can't catch
+        candidates = set()
+        for trigram in query_trigrams:
+            candidates.update(self.postings.get(trigram, ()))
+        candidates.update(
+            book_club_id for book_club_id, (_, name, description, _) in self.documents.items()
+            if text in name or text in description
+        )
+
+        scored = []
+        for book_club_id in candidates:
+            name, lower_name, description, name_trigrams = self.documents[book_club_id]
+            similarity = (
+                len(query_trigrams & name_trigrams) / len(query_trigrams | name_trigrams)
+                if query_trigrams or name_trigrams else 0
+            )
+            if similarity < self.similarity_threshold and text not in lower_name and text not in description:
+                continue
+
+            score = similarity + (0.5 if text in lower_name else 0) + (0.25 if text in description else 0)
+            scored.append((-score, name, book_club_id))
+
+        scored.sort()
+
+        return [book_club_id for _, _, book_club_id in scored[offset:offset + limit]]
+
+
+def trigrams(text):
+    """
+    pg_trgm style trigrams: lower-cased alphanumeric words padded with two leading spaces and one trailing
+    """
+
+    result = set()
+    for word in re.findall(r'\w+', (text or '').lower()):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return result
+
+
+class InMemorySearchBackend:
+    """
+    Search backend built on a process-local TrigramIndex, rebuilt lazily after clubs change
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._index = None
+
+    def get_index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = TrigramIndex(searchable_book_clubs().values_list('id', 'name', 'description'))
+
+            return self._index
+
+    def search(self, search_text, limit, offset=0):
+        index = self._index or self.get_index()
+
+        book_club_ids = index.search(search_text, limit, offset)
+        book_clubs = BookClub.objects.in_bulk(book_club_ids)
+
+        return [book_clubs[book_club_id] for book_club_id in book_club_ids if book_club_id in book_clubs]
+
+    async def asearch(self, search_text, limit, offset=0):
+        # Building the index is a one-off, blocking job, so leave that to a thread
+        index = self._index or await sync_to_async(self.get_index)()
+
+        book_club_ids = index.search(search_text, limit, offset)
+        book_clubs = await BookClub.objects.ain_bulk(book_club_ids)
+
+        return [book_clubs[book_club_id] for book_club_id in book_club_ids if book_club_id in book_clubs]
+
+
+in_memory_backend = InMemorySearchBackend()
+postgres_backend = PostgresSearchBackend()
+
+
+def get_search_backend():
+    """
+    Use PostgreSQL search where available, otherwise the in-process index
+    """
+
+    if connection.vendor == 'postgresql':
+        return postgres_backend
+
+    return in_memory_backend
+
+
+def search_book_clubs(search_text, page=1, page_size=None):
+    """
+    Get a page of ranked search results and whether there's a next page
+    """
+
+    page_size = page_size or getattr(settings, 'BOOK_CLUB_SEARCH_PAGE_SIZE', 24)
+    offset = (max(page, 1) - 1) * page_size
+
+    # Grab one extra result to tell whether there's a next page
+    results = get_search_backend().search(search_text, page_size + 1, offset)
+
+    return results[:page_size], len(results) > page_size
+
+
+async def asearch_book_clubs(search_text, page=1, page_size=None):
+    """
+    Async version of search_book_clubs()
+    """
+
+    page_size = page_size or getattr(settings, 'BOOK_CLUB_SEARCH_PAGE_SIZE', 24)
+    offset = (max(page, 1) - 1) * page_size
+
+    results = await get_search_backend().asearch(search_text, page_size + 1, offset)
+
+    return results[:page_size], len(results) > page_size
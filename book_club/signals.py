@@ -0,0 +1,93 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import (
+    get_principal, invalidate_club_readers, invalidate_club_slugs, invalidate_principal, invalidate_reader_clubs
+)
+from .models import BookClub, BookClubReaders, CachedReader, Reader
+from .search import in_memory_backend
+
+
+@receiver([post_save, post_delete], sender=Reader)
+@receiver([post_save, post_delete], sender=CachedReader)
+def invalidate_reader_principal(sender, instance, **kwargs):
+    """
+    Changes to a reader (e.g. a new password, or being deactivated) must reach their cached principal.
+    QuerySet.update() sends no signal; ReaderQuerySet.update() invalidates instead.
+    """
+
+    invalidate_principal(instance.pk)
+
+
+@receiver(user_logged_in)
+def cache_reader_principal(sender, user, **kwargs):
+    """
+    Cache the principal as the reader logs in, so their first page doesn't have to
+    """
+
+    get_principal(user.pk)
+
+
+@receiver([post_save, post_delete], sender=BookClub)
+def invalidate_search_index(sender, **kwargs):
+    """
+    Rebuild the in-process search index after any club changes
+    """
+
+    in_memory_backend.invalidate()
+
+
+@receiver(post_save, sender=BookClub)
+def invalidate_club_slug_cache(sender, instance, created, **kwargs):
+    """
+    Renamed, disbanded or newly private clubs must stop resolving from their cached slugs. Other saves (e.g. new
+    image renditions) and new clubs, which have nothing cached yet, keep every club's cached lookups.
+    """
+
+    if not created and instance.slug_cache_fields_changed():
+        invalidate_club_slugs()
+    instance.snapshot_slug_cache_fields()
+
+
+@receiver(post_delete, sender=BookClub)
+def invalidate_deleted_club_slug_cache(sender, **kwargs):
+    invalidate_club_slugs()
+
+
+@receiver(post_save, sender=BookClub)
+def invalidate_club_members_clubs(sender, instance, **kwargs):
+    """
+    Club changes (e.g. disbanding or renaming) show up in every member's cached club list
+    """
+
+    invalidate_club_readers(instance.id)
+
+
+@receiver(pre_delete, sender=BookClub)
+def invalidate_deleted_club_members_clubs(sender, instance, **kwargs):
+    invalidate_club_readers(instance.id)
+
+
+@receiver([post_save, post_delete], sender=BookClubReaders)
+def invalidate_member_clubs(sender, instance, **kwargs):
+    """
+    Joining, leaving or changing roles in a club changes the reader's cached club list
+    """
+
+    invalidate_reader_clubs([instance.reader_id])
+
+
+@receiver(m2m_changed, sender=BookClub.readers.through)
+def invalidate_readers_clubs(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Same as above, for memberships changed through BookClub.readers (e.g. readers.add())
+    """
+
+    if action in ('post_add', 'post_remove'):
+        invalidate_reader_clubs([instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear':
+        if reverse:
+            invalidate_reader_clubs([instance.pk])
+        else:
+            invalidate_club_readers(instance.pk)
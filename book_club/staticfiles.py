@@ -0,0 +1,68 @@
+import gzip
+
+from django.contrib.staticfiles.apps import StaticFilesConfig
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions worth compressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.ico')
+
+# Content-Encoding -> extension of the precompressed variant, most preferred first
+ENCODINGS = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+
+class BookClubStaticFilesConfig(StaticFilesConfig):
+    """
+    Static files, leaving out of collectstatic the sources and the Bootstrap builds the pages never load
+    """
+
+    ignore_patterns = StaticFilesConfig.ignore_patterns + [
+        'scss',
+        'bootstrap.js*',
+        'bootstrap.min.js*',
+        'bootstrap.esm*',
+        'bootstrap.bundle.js*',
+    ]
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files, with a gzip (and, if the brotli package is installed, a brotli) copy of every
+    compressible one written alongside it, for PrecompressedStaticMiddleware to serve
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        # Only the hashed names are ever linked to, so only they need compressed copies
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            content = original.read()
+
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content, quality=11)
+
+        for extension, compressed in variants.items():
+            # Not worth it when compressing barely helps
+            if len(compressed) >= len(content) * 0.95:
+                continue
+
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(compressed))
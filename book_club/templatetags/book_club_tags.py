@@ -0,0 +1,71 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from book_club.fonts import vendored
+from book_club.cache import get_club_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def club_url(view_name, book_club, **kwargs):
+    """
+    Reverse a book club URL using the club's stored slug, e.g. {% club_url 'book_club:book_club_home' book_club %}
+    """
+
+    return reverse(view_name, kwargs={'book_club_slug': book_club.slug, **kwargs})
+
+
+@register.simple_tag
+def club_cards(book_clubs):
+    """
+    The clubs' rendered cards from the cache, e.g. {% club_cards book_clubs as cards %}
+    """
+
+    return [mark_safe(card) for card in get_club_cards(list(book_clubs))]
+
+
+@register.inclusion_tag('book_club/fragments/fonts.html')
+def fonts():
+    """
+    The font stylesheets: self-hosted once the vendor_fonts command has been run, Google Fonts until then
+    """
+
+    return {'vendored': vendored()}
+
+
+@register.inclusion_tag('book_club/fragments/book_club_image.html')
+def club_image(book_club, css_class='', sizes='100vw'):
+    """
+    Responsive <picture> for a club's image, letting the browser pick the smallest suitable rendition.
+    Falls back to the original upload until the renditions have been generated.
+    """
+
+    renditions = book_club.image_renditions or {}
+    sources = [
+        {
+            'type': f'image/{image_format}',
+            'srcset': ', '.join(
+                f"{default_storage.url(rendition['name'])} {rendition['width']}w" for rendition in format_renditions
+            ),
+        }
+        for image_format, format_renditions in renditions.items()
+        if format_renditions
+    ]
+
+    # The last format is the most widely supported one, so it also backs the <img> itself
+    if sources:
+        fallback = renditions[list(renditions)[-1]]
+        src = default_storage.url(min(fallback, key=lambda rendition: rendition['width'])['name'])
+    else:
+        src = book_club.image.url
+
+    return {
+        'sources': sources[:-1],
+        'fallback_srcset': sources[-1]['srcset'] if sources else None,
+        'src': src,
+        'css_class': css_class,
+        'sizes': sizes,
+    }
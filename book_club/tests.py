@@ -1,3 +1,1068 @@
-from django.test import TestCase
+import json
+import re
+import threading
+import time
 
-# Create your tests here.
+from datetime import datetime
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import OperationalError, connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from notifications.models import Notification, NotificationInbox
+from . import async_views, views
+from .cache import (
+    cache_club, club_card_version, club_slug_version, get_cached_club, get_principal, get_reader_clubs,
+    invalidate_club_slugs, principal_key, reader_clubs_key,
+)
+from .fonts import can_subset, find_icons, subset_icons, vendored
+from .hashers import run_hashing
+from .images import generate_renditions, schedule_renditions
+from .instrumentation import Recorder, current_recorder, sample_buffer
+from .management.commands import vendor_fonts
+from .middleware import ClubMembershipMiddleware, PrecompressedStaticMiddleware
+from .models import BookClub, BookClubReaders, CachedReader, MembershipRequest, Reader
+from .search import in_memory_backend, search_book_clubs
+from .templatetags.book_club_tags import club_image
+
+
+class HotPathIndexTests(TestCase):
+    """
+    Check that the queries behind the busiest views can be answered from an index on a seeded dataset
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        readers = Reader.objects.bulk_create([
+            Reader(username=f'reader{i}', email=f'reader{i}@example.com') for i in range(200)
+        ])
+        book_clubs = BookClub.objects.bulk_create([
+            BookClub(
+                name=f'Club {i}',
+                slug=f'club-{i}',
+                publicity=BookClub.Publicity.choices[i % 3][0],
+                disbanded=datetime.now() if i % 10 == 0 else None,
+            )
+            for i in range(100)
+        ])
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(
+                reader=reader,
+                book_club=book_clubs[(i + offset) % len(book_clubs)],
+                club_role=BookClubReaders.RoleInClub.choices[offset % 4][0],
+                left=datetime.now() if offset == 3 else None,
+            )
+            for i, reader in enumerate(readers)
+            for offset in range(4)
+        ])
+        MembershipRequest.objects.bulk_create([
+            MembershipRequest(
+                reader=reader,
+                book_club=book_clubs[(i + 5) % len(book_clubs)],
+                message='Let me in',
+                status=MembershipRequest.RequestStatus.choices[i % 4][0],
+            )
+            for i, reader in enumerate(readers)
+        ])
+        Notification.objects.bulk_create([
+            Notification(
+                source_reader=reader,
+                target_reader=readers[(i + 1) % len(readers)] if i % 2 else None,
+                book_club=book_clubs[i % len(book_clubs)],
+                type=Notification.NotificationType.MEMBERSHIP_REQUESTED,
+            )
+            for i, reader in enumerate(readers)
+        ])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        cls.reader = readers[0]
+        cls.book_club = book_clubs[1]
+
+    def assertUsesIndex(self, queryset, index_name, ordered=False):
+        """
+        Assert the query plan for the queryset reads from the given index, and with ordered, that the rows come back
+        in the index's order rather than being sorted afterwards
+        """
+
+        # NOTE - Tables this small would often be scanned anyway, so only ask whether the index is usable
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                plan = queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET enable_seqscan = on')
+        else:
+            # Explain the query with its parameters filled in, as psycopg2 sends them to Postgres; SQLite can't
+            # match a partial index's condition against bound parameters. INDEXED BY makes SQLite use the index,
+            # failing if it can't, since it would pick between several usable ones by its own rough costs.
+            sql, params = queryset.query.sql_with_params()
+            table = connection.ops.quote_name(queryset.model._meta.db_table)
+            sql = sql.replace(f'FROM {table}', f'FROM {table} INDEXED BY {index_name}', 1)
+            quote = connection.schema_editor().quote_value
+            with connection.cursor() as cursor:
+                try:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql % tuple(quote(param) for param in params))
+                except OperationalError as error:
+                    self.fail(f'{index_name} is not usable: {error}')
+                plan = '\n'.join(str(row) for row in cursor.fetchall())
+
+        self.assertIn(index_name, plan)
+        if ordered:
+            self.assertNotRegex(plan, r'TEMP B-TREE|Sort ')
+
+    def test_active_clubs_by_publicity(self):
+        self.assertUsesIndex(
+            BookClub.objects.filter(disbanded__isnull=True, publicity=BookClub.Publicity.PUBLIC),
+            'book_club_active_publicity_idx',
+        )
+
+    def test_reader_active_memberships(self):
+        self.assertUsesIndex(
+            BookClubReaders.objects.filter(
+                reader=self.reader, club_role=BookClubReaders.RoleInClub.ADMIN, left__isnull=True
+            ),
+            'club_reader_active_idx',
+        )
+
+    def test_club_admins(self):
+        self.assertUsesIndex(
+            BookClubReaders.objects.filter(
+                book_club=self.book_club, club_role=BookClubReaders.RoleInClub.ADMIN, left__isnull=True
+            ),
+            'club_reader_active_role_idx',
+        )
+
+    def test_open_membership_requests(self):
+        """
+        Counting a club's open requests (open_request_count) only reads the open ones
+        """
+
+        self.assertUsesIndex(
+            MembershipRequest.objects.filter(
+                book_club=self.book_club,
+                status__in=[MembershipRequest.RequestStatus.OPEN, MembershipRequest.RequestStatus.VIEWED],
+            ).values('id'),
+            'membership_request_open_idx',
+        )
+
+    def test_pending_membership_requests_page(self):
+        self.assertUsesIndex(
+            MembershipRequest.objects.filter(
+                book_club=self.book_club,
+                status__in=[MembershipRequest.RequestStatus.OPEN, MembershipRequest.RequestStatus.VIEWED],
+            ).order_by('-requested', '-id'),
+            'membership_request_open_idx',
+            ordered=True,
+        )
+
+    def test_membership_request_history(self):
+        self.assertUsesIndex(
+            MembershipRequest.objects.filter(
+                book_club=self.book_club, status=MembershipRequest.RequestStatus.ACCEPTED
+            ).order_by('-requested', '-id'),
+            'membership_request_status_idx',
+            ordered=True,
+        )
+
+    def test_all_membership_requests(self):
+        self.assertUsesIndex(
+            MembershipRequest.objects.filter(book_club=self.book_club).order_by('-requested', '-id'),
+            'membership_request_club_idx',
+            ordered=True,
+        )
+
+    def test_reader_notifications(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(target_reader=self.reader).order_by('-generated'),
+            'notification_target_gen_idx',
+        )
+
+    def test_reader_inbox(self):
+        self.assertUsesIndex(
+            NotificationInbox.objects.filter(reader=self.reader).order_by('-generated', '-notification'),
+            'notif_inbox_reader_keyset_idx',
+        )
+
+
+class AsyncReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = Reader.objects.create(username='reader', email='reader@example.com')
+        cls.book_club = BookClub.objects.create(name='Async Club', slug='async-club', publicity=BookClub.Publicity.PUBLIC)
+        BookClubReaders.objects.create(
+            reader=cls.reader, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN
+        )
+
+    def _request(self, path, user=None, **params):
+        req = AsyncRequestFactory().get(path, params)
+        req.user = user or self.reader
+        ClubMembershipMiddleware.add_resolver(req)
+
+        return req
+
+    async def test_pages_match_sync_views(self):
+        """
+        The async views render the same pages as their sync counterparts
+        """
+
+        pages = [
+            (async_views.home, views.home, '/', {}, {}),
+            (async_views.book_clubs, views.book_clubs, '/book-clubs/', {}, {}),
+            (async_views.book_club_home, views.book_club_home, '/book-clubs/async-club/', {}, {
+                'book_club_slug': 'async-club'
+            }),
+            (async_views.book_club_search, views.book_club_search, '/book-clubs/search', {'search_text': 'async'}, {}),
+        ]
+
+        for async_view, sync_view, path, params, kwargs in pages:
+            with self.subTest(path=path):
+                async_response = await async_view(self._request(path, **params), **kwargs)
+                sync_response = await sync_to_async(sync_view)(self._request(path, **params), **kwargs)
+
+                self.assertEqual(async_response.status_code, 200)
+                self.assertContains(async_response, 'Async Club')
+                self.assertEqual(
+                    self._strip_csrf(async_response.content), self._strip_csrf(sync_response.content)
+                )
+
+    async def test_login_required(self):
+        response = await async_views.home(self._request('/', user=AnonymousUser()))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/login'))
+
+    @staticmethod
+    def _strip_csrf(content):
+        return re.sub(rb'name="csrfmiddlewaretoken" value="[^"]+"', b'', content)
+
+
+class BookClubHomeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Reader.objects.create(username='admin', email='admin@example.com')
+        cls.book_club = BookClub.objects.create(name='Home Club', slug='home-club', publicity=BookClub.Publicity.PUBLIC)
+        BookClubReaders.objects.create(
+            reader=cls.admin, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN
+        )
+        for i in range(3):
+            reader = Reader.objects.create(username=f'requester{i}', email=f'requester{i}@example.com')
+            MembershipRequest.objects.create(reader=reader, book_club=cls.book_club, message='Hi')
+        cls.requester = reader
+
+    def test_club_state_in_one_query(self):
+        """
+        The club, the reader's role, their request flag and the counts all come from a single query
+        """
+
+        book_club = BookClub.objects.active().filter(
+            slug='home-club'
+        ).with_reader_role(
+            self.requester.id
+        ).with_membership_requested(
+            self.requester.id
+        ).with_counts()
+
+        with self.assertNumQueries(1):
+            book_club = book_club.get()
+
+        self.assertIsNone(book_club.reader_role)
+        self.assertTrue(book_club.membership_requested)
+        self.assertEqual(book_club.member_count, 1)
+        self.assertEqual(book_club.open_request_count, 3)
+
+    def test_admin_sees_open_requests(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('book_club:book_club_home', args=['home-club']))
+
+        self.assertEqual(response.context['reader_role'], BookClubReaders.RoleInClub.ADMIN)
+        self.assertFalse(response.context['membership_requested'])
+        self.assertContains(response, '3 membership requests')
+
+    def test_lists_current_members_in_constant_queries(self):
+        """
+        The page costs the club query, the reader list and the navbar's unread count, however many members there
+        are, and the reader list only covers current members
+        """
+
+        self.client.force_login(self.admin)
+        url = reverse('book_club:book_club_home', args=['home-club'])
+
+        readers = Reader.objects.bulk_create([
+            Reader(username=f'homed{i}', email=f'homed{i}@example.com') for i in range(5)
+        ])
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(reader=reader, book_club=self.book_club, left=datetime.now() if i == 0 else None)
+            for i, reader in enumerate(readers)
+        ])
+
+        # The club, the reader's role, their request flag and the counts; the reader list; the unread count
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+
+        members = [member.reader.username for member in response.context['members']]
+        self.assertEqual(members, ['admin', 'homed1', 'homed2', 'homed3', 'homed4'])
+        self.assertContains(response, '(5)')
+        self.assertNotContains(response, 'homed0')
+
+    @override_settings(BOOK_CLUB_HOME_MEMBERS=2)
+    def test_member_list_is_bounded(self):
+        self.client.force_login(self.admin)
+        readers = Reader.objects.bulk_create([
+            Reader(username=f'bounded{i}', email=f'bounded{i}@example.com') for i in range(3)
+        ])
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(reader=reader, book_club=self.book_club) for reader in readers
+        ])
+
+        response = self.client.get(reverse('book_club:book_club_home', args=['home-club']))
+
+        self.assertEqual(len(response.context['members']), 2)
+        self.assertContains(response, '(4)')
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Reader.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        cls.book_club = BookClub.objects.create(name='Sampled Club', slug='sampled-club')
+        BookClubReaders.objects.create(reader=cls.staff, book_club=cls.book_club)
+
+    def setUp(self):
+        sample_buffer.clear()
+        self.client.force_login(self.staff)
+
+    def test_request_is_recorded(self):
+        """
+        Sampled requests record their view, queries and template time
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('book_club:book_club_home', args=['sampled-club']))
+
+        sample, = sample_buffer.samples()
+        self.assertEqual(sample.view, 'book_club:book_club_home')
+        self.assertEqual(sample.status, 200)
+        self.assertEqual(sample.queries, len(queries.captured_queries))
+        self.assertGreater(sample.template_ms, 0)
+        self.assertLessEqual(sample.template_ms, sample.total_ms)
+
+    def test_repeated_queries_are_flagged(self):
+        recorder = Recorder()
+        token = current_recorder.set(recorder)
+        try:
+            for _ in range(3):
+                Reader.objects.filter(id=self.staff.id).exists()
+            Reader.objects.filter(username='someone').exists()
+        finally:
+            current_recorder.reset(token)
+
+        sample = recorder.sample('test', 200)
+        self.assertEqual(sample.queries, 4)
+        self.assertEqual(sample.duplicate_queries, 2)
+        self.assertEqual(sample.similar_queries, 2)
+
+    def test_recorder_counts_queries_from_several_threads(self):
+        recorder = Recorder()
+
+        def record():
+            for _ in range(1000):
+                recorder.add_query('SELECT 1', (), 0.001)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sample = recorder.sample('test', 200)
+        self.assertEqual(sample.queries, 4000)
+        self.assertEqual(sample.duplicate_queries, 3999)
+
+    def test_report_command_warns_about_a_local_cache(self):
+        """
+        The command can only see other processes' samples through a shared cache
+        """
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command('instrumentation_report', stdout=stdout, stderr=stderr)
+        self.assertIn('CACHE_URL', stderr.getvalue())
+
+    def test_report_is_staff_only(self):
+        self.client.get(reverse('home'))
+
+        response = self.client.get(reverse('instrumentation_report'))
+        views = {row['view']: row for row in response.json()['views']}
+        self.assertEqual(views['home']['requests'], 1)
+
+        self.client.force_login(Reader.objects.create(username='reader', email='reader@example.com'))
+        self.assertEqual(self.client.get(reverse('instrumentation_report')).status_code, 302)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_and_benchmark(self):
+        """
+        Datasets can be seeded side by side, and the benchmark suite runs against it and saves its results
+        """
+
+        call_command('seed_data', readers=30, clubs=5, seed=3, stdout=StringIO())
+        self.assertEqual(Reader.objects.filter(username__startswith='seedreader').count(), 30)
+        self.assertEqual(BookClub.objects.count(), 5)
+
+        # A second dataset with a different prefix doesn't collide with the first
+        call_command('seed_data', readers=30, clubs=5, seed=3, prefix='more', stdout=StringIO())
+        self.assertEqual(Reader.objects.count(), 60)
+
+        with NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'benchmark_views', suite=True, username='seedreader0', iterations=2, warmup=0, output=output.name,
+                stdout=StringIO(),
+            )
+            results = json.load(output)
+
+        self.assertTrue(all(page['statuses'] == [200] for page in results['pages']))
+        self.assertTrue(all(page['queries_max'] > 0 for page in results['pages']))
+
+
+class PasswordHashingTests(TestCase):
+    def test_legacy_hash_rehashed_on_login(self):
+        """
+        A reader whose password was hashed by an older hasher can still log in, and gets the current hash
+        """
+
+        reader = Reader.objects.create(
+            username='legacy', email='legacy@example.com', password=make_password('Tr1cky-pass', hasher='pbkdf2_sha1')
+        )
+
+        response = self.client.post(reverse('login'), {'username': 'legacy', 'password': 'Tr1cky-pass'})
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        reader.refresh_from_db()
+        self.assertTrue(reader.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(reader.check_password('Tr1cky-pass'))
+
+    def test_hashing_concurrency_is_capped(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def hash_password():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.pop()
+
+        threads = [threading.Thread(target=run_hashing, args=[hash_password]) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(peak), 6)
+        self.assertLessEqual(max(peak), settings.PASSWORD_HASHING_CONCURRENCY)
+
+    def test_nested_hashing_runs_inline(self):
+        self.assertEqual(run_hashing(lambda: run_hashing(lambda: 'inner')), 'inner')
+
+
+class CachedPrincipalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = Reader.objects.create_user(
+            username='principal', email='principal@example.com', password='Tr1cky-pass', given_name='Prin',
+            surname='Cipal',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def test_reader_row_not_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+
+        self.assertIsInstance(response.wsgi_request.user, CachedReader)
+        self.assertFalse(any('"book_club_reader"' in query['sql'] for query in queries.captured_queries))
+
+        # Any other field loads the rest of the row at once
+        reader = response.wsgi_request.user
+        with self.assertNumQueries(1):
+            self.assertEqual((reader.surname, reader.email), ('Cipal', 'principal@example.com'))
+
+    def test_changes_reach_the_principal(self):
+        """
+        Deactivated readers, and sessions from before a password change, are logged out
+        """
+
+        self.reader.set_password('N3w-pass')
+        self.reader.save()
+        self.assertFalse(self.client.get(reverse('home')).wsgi_request.user.is_authenticated)
+
+        self.client.force_login(self.reader)
+        self.assertTrue(self.client.get(reverse('home')).wsgi_request.user.is_authenticated)
+
+        self.reader.is_active = False
+        self.reader.save()
+        self.assertFalse(self.client.get(reverse('home')).wsgi_request.user.is_authenticated)
+
+    def test_invalidated_again_on_commit(self):
+        """
+        A request re-caching the old row before the change commits doesn't keep it cached
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.is_active = False
+            self.reader.save()
+            # A concurrent request, still seeing the committed (active) row
+            cache.set(principal_key(self.reader.pk), {**get_principal(self.reader.pk), 'is_active': True})
+
+        self.assertFalse(self.client.get(reverse('home')).wsgi_request.user.is_authenticated)
+
+    def test_queryset_update_reaches_the_principal(self):
+        self.assertTrue(self.client.get(reverse('home')).wsgi_request.user.is_authenticated)
+
+        Reader.objects.filter(pk=self.reader.pk).update(is_active=False)
+
+        self.assertFalse(self.client.get(reverse('home')).wsgi_request.user.is_authenticated)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        BookClub.objects.bulk_create([
+            BookClub(name='Mystery Readers', slug='mystery-readers'),
+            BookClub(name='Mystery', slug='mystery', publicity=BookClub.Publicity.OBSERVABLE),
+            BookClub(name='History Buffs', slug='history-buffs', description='Some mystery, mostly history'),
+            BookClub(name='Mystery Secrets', slug='mystery-secrets', publicity=BookClub.Publicity.PRIVATE),
+            BookClub(name='Mystery Disbanded', slug='mystery-disbanded', disbanded=datetime.now()),
+            BookClub(name='Gardening', slug='gardening'),
+        ])
+
+    def setUp(self):
+        # The index outlives each test's rolled back transaction
+        in_memory_backend.invalidate()
+
+    def test_ranked_order(self):
+        """
+        Name matches rank above description matches, closer names first; private and disbanded clubs never show
+        """
+
+        results, has_next = search_book_clubs('mystery')
+
+        self.assertEqual([book_club.name for book_club in results], ['Mystery', 'Mystery Readers', 'History Buffs'])
+        self.assertFalse(has_next)
+
+    def test_page_boundaries(self):
+        BookClub.objects.bulk_create([BookClub(name=f'Paged Club {i}', slug=f'paged-club-{i}') for i in range(5)])
+        in_memory_backend.invalidate()
+
+        pages = [search_book_clubs('paged', page, page_size=2) for page in (1, 2, 3)]
+
+        self.assertEqual([len(results) for results, _ in pages], [2, 2, 1])
+        self.assertEqual([has_next for _, has_next in pages], [True, True, False])
+        names = [book_club.name for results, _ in pages for book_club in results]
+        self.assertEqual(sorted(names), [f'Paged Club {i}' for i in range(5)])
+
+    def test_index_invalidated_on_club_save(self):
+        self.assertEqual(search_book_clubs('zebra')[0], [])
+
+        book_club = BookClub.objects.create(name='Zebra Watchers', slug='zebra-watchers')
+        self.assertEqual(search_book_clubs('zebra')[0], [book_club])
+
+        book_club.name = 'Lion Watchers'
+        book_club.save()
+        self.assertEqual(search_book_clubs('zebra')[0], [])
+        self.assertEqual(search_book_clubs('lion')[0], [book_club])
+
+
+class MembershipResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book_club = BookClub.objects.create(name='Resolved Club', slug='resolved-club')
+        cls.admin, cls.member, cls.former_member, cls.outsider = Reader.objects.bulk_create([
+            Reader(username=username, email=f'{username}@example.com')
+            for username in ('resolved-admin', 'resolved-member', 'resolved-former', 'resolved-outsider')
+        ])
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(reader=cls.admin, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN),
+            BookClubReaders(reader=cls.member, book_club=cls.book_club),
+            BookClubReaders(reader=cls.former_member, book_club=cls.book_club, left=datetime.now()),
+        ])
+
+    def _request(self, user):
+        req = RequestFactory().get('/')
+        req.user = user
+        ClubMembershipMiddleware(lambda req: None)(req)
+
+        return req
+
+    def test_roles(self):
+        cases = [
+            (self.admin, BookClubReaders.RoleInClub.ADMIN, True),
+            (self.member, BookClubReaders.RoleInClub.READER, False),
+            (self.former_member, None, False),
+            (self.outsider, None, False),
+            (AnonymousUser(), None, False),
+        ]
+
+        for user, role, is_admin in cases:
+            with self.subTest(user=str(user)):
+                membership = self._request(user).club_membership('resolved-club')
+
+                self.assertEqual(membership.book_club, self.book_club)
+                self.assertEqual(membership.role, role)
+                self.assertEqual(membership.is_member, role is not None)
+                self.assertEqual(membership.is_admin, is_admin)
+
+    def test_memoized_per_request(self):
+        req = self._request(self.member)
+        req.club_membership('resolved-club')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(req.club_role('resolved-club'), BookClubReaders.RoleInClub.READER)
+
+    async def test_async_matches_sync(self):
+        req = self._request(self.admin)
+
+        self.assertEqual(await req.aclub_role('resolved-club'), BookClubReaders.RoleInClub.ADMIN)
+        self.assertEqual((await req.aclub_membership('no-such-club')), (None, None))
+
+    def test_former_member_cannot_request_again(self):
+        self.client.force_login(self.former_member)
+
+        response = self.client.post(
+            reverse('book_club:book_club_membership_request', args=['resolved-club']), {'message': 'Let me back'}
+        )
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertFalse(MembershipRequest.objects.filter(reader=self.former_member).exists())
+
+
+class ReaderClubsCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = Reader.objects.create(username='joiner', email='joiner@example.com')
+        cls.book_club = BookClub.objects.create(name='Joined Club', slug='joined-club')
+        cls.other_club = BookClub.objects.create(name='Other Club', slug='other-club')
+        cls.membership = BookClubReaders.objects.create(reader=cls.reader, book_club=cls.book_club)
+
+    def setUp(self):
+        # Reader IDs are reused once other tests roll back, so don't start from their cached club lists
+        cache.clear()
+
+    def test_cache_hit_skips_query(self):
+        self.assertEqual(get_reader_clubs(self.reader.id), [self.book_club])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_reader_clubs(self.reader.id), [self.book_club])
+
+    def test_join_leave_and_disband_invalidate(self):
+        get_reader_clubs(self.reader.id)
+        BookClubReaders.objects.create(reader=self.reader, book_club=self.other_club)
+        self.assertEqual(get_reader_clubs(self.reader.id), [self.book_club, self.other_club])
+
+        self.membership.left = datetime.now()
+        self.membership.save()
+        self.assertEqual(get_reader_clubs(self.reader.id), [self.other_club])
+
+        self.other_club.disbanded = datetime.now()
+        self.other_club.save()
+        self.assertEqual(get_reader_clubs(self.reader.id), [])
+
+    def test_readers_add_invalidates(self):
+        get_reader_clubs(self.reader.id)
+
+        self.other_club.readers.add(self.reader)
+
+        self.assertEqual(get_reader_clubs(self.reader.id), [self.book_club, self.other_club])
+
+    def test_invalidated_again_on_commit(self):
+        """
+        A request caching the memberships from before the change commits doesn't keep them cached
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookClubReaders.objects.create(reader=self.reader, book_club=self.other_club)
+            # A concurrent request, still seeing the committed memberships
+            cache.set(reader_clubs_key(self.reader.id), [self.book_club])
+
+        self.assertEqual(get_reader_clubs(self.reader.id), [self.book_club, self.other_club])
+
+
+class ClubSlugCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Reader.objects.create(username='slugger', email='slugger@example.com')
+        cls.book_club = BookClub.objects.create(name='Slug Club', slug='slug-club')
+        BookClubReaders.objects.create(
+            reader=cls.admin, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN
+        )
+
+    def _membership(self, book_club_slug='slug-club'):
+        # A fresh resolver, as for a new request
+        req = RequestFactory().get('/')
+        req.user = self.admin
+        ClubMembershipMiddleware.add_resolver(req)
+
+        return req.club_membership(book_club_slug)
+
+    def test_cache_hit_skips_club_query(self):
+        self._membership()
+
+        with CaptureQueriesContext(connection) as queries:
+            membership = self._membership()
+
+        self.assertEqual(membership.book_club, self.book_club)
+        self.assertTrue(membership.is_admin)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertNotIn('"book_club_bookclub"', queries.captured_queries[0]['sql'])
+
+    def test_rename_and_disband_bump_version(self):
+        self._membership()
+
+        version = club_slug_version()
+        self.book_club.slug = 'renamed-club'
+        self.book_club.save()
+        self.assertGreater(club_slug_version(), version)
+        self.assertIsNone(self._membership().book_club)
+        self.assertEqual(self._membership('renamed-club').book_club, self.book_club)
+
+        version = club_slug_version()
+        self.client.force_login(self.admin)
+        self.client.get(reverse('book_club:book_club_admin:book_club_admin_disband', args=['renamed-club']))
+        self.assertGreater(club_slug_version(), version)
+        self.assertIsNone(self._membership('renamed-club').book_club)
+
+    def test_unrelated_saves_keep_cached_lookups(self):
+        """
+        Only changes to what the slug lookups depend on throw away every club's cached lookup
+        """
+
+        self._membership()
+        version = club_slug_version()
+
+        book_club = BookClub.objects.get(pk=self.book_club.pk)
+        book_club.image_renditions = {'webp': {'320': 'images/club.webp'}}
+        book_club.save(update_fields=['image_renditions', 'updated'])
+        book_club.description = 'Still the same club'
+        book_club.save()
+        BookClub.objects.create(name='Another Club', slug='another-club')
+        self.assertEqual(club_slug_version(), version)
+
+        with CaptureQueriesContext(connection) as queries:
+            self._membership()
+        self.assertNotIn('"book_club_bookclub"', queries.captured_queries[0]['sql'])
+
+        book_club.publicity = BookClub.Publicity.PRIVATE
+        book_club.save()
+        self.assertGreater(club_slug_version(), version)
+
+    def test_club_read_before_invalidation_stays_stale(self):
+        """
+        A club read before an invalidation is cached under the old version, so it's never served
+        """
+
+        version = club_slug_version()
+        invalidate_club_slugs()
+        cache_club(self.book_club, version)
+
+        self.assertIsNone(get_cached_club('slug-club', club_slug_version()))
+
+    def test_disband_keeps_concurrent_changes(self):
+        """
+        Disbanding from a cached copy of the club doesn't write back its stale columns
+        """
+
+        self._membership()
+        BookClub.objects.filter(pk=self.book_club.pk).update(image_renditions={'webp': {'320': 'images/club.webp'}})
+
+        self.client.force_login(self.admin)
+        self.client.get(reverse('book_club:book_club_admin:book_club_admin_disband', args=['slug-club']))
+
+        self.book_club.refresh_from_db()
+        self.assertIsNotNone(self.book_club.disbanded)
+        self.assertEqual(self.book_club.image_renditions, {'webp': {'320': 'images/club.webp'}})
+
+
+class ClubCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = Reader.objects.create(username='carded', email='carded@example.com')
+        cls.book_clubs = BookClub.objects.bulk_create([
+            BookClub(name=f'Card Club {i}', slug=f'card-club-{i}') for i in range(3)
+        ])
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(reader=cls.reader, book_club=book_club) for book_club in cls.book_clubs
+        ])
+
+    def setUp(self):
+        # Cards cached by another test would be served for these same clubs
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_cards_rendered_once_until_club_changes(self):
+        response = self.client.get(reverse('book_club:book_clubs'))
+        self.assertTemplateUsed(response, 'book_club/fragments/book_club_card.html', count=3)
+
+        response = self.client.get(reverse('home'))
+        self.assertTemplateNotUsed(response, 'book_club/fragments/book_club_card.html')
+        self.assertContains(response, 'Card Club 1')
+
+        book_club = self.book_clubs[1]
+        book_club.name = 'Renamed Club'
+        book_club.save()
+
+        response = self.client.get(reverse('home'))
+        self.assertTemplateUsed(response, 'book_club/fragments/book_club_card.html', count=1)
+        self.assertContains(response, 'Renamed Club')
+        self.assertNotContains(response, 'Card Club 1')
+
+    def test_cards_rendered_again_after_deploy(self):
+        """
+        New static files (whose hashed URLs the cards embed) or templates mean new cards
+        """
+
+        self.client.get(reverse('book_club:book_clubs'))
+
+        self.addCleanup(club_card_version.cache_clear)
+        club_card_version.cache_clear()
+        with mock.patch.object(staticfiles_storage, 'manifest_hash', 'next-deploy', create=True):
+            response = self.client.get(reverse('book_club:book_clubs'))
+
+        self.assertTemplateUsed(response, 'book_club/fragments/book_club_card.html', count=3)
+
+
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+        # Narrower than every rendition but the smallest
+        image = BytesIO()
+        Image.new('RGB', (500, 300), 'teal').save(image, 'PNG')
+        self.book_club = BookClub.objects.create(
+            name='Pictured Club', slug='pictured-club', image=SimpleUploadedFile('club.png', image.getvalue())
+        )
+
+    def test_renditions_have_distinct_widths(self):
+        renditions = generate_renditions(self.book_club.id)
+
+        self.assertEqual([rendition['width'] for rendition in renditions['jpeg']], [320, 500])
+        self.book_club.refresh_from_db()
+        self.assertEqual(self.book_club.image_renditions, renditions)
+        self.assertTrue(all(
+            default_storage.exists(rendition['name'])
+            for format_renditions in renditions.values() for rendition in format_renditions
+        ))
+
+    def test_club_image_tag(self):
+        # The original until the renditions are made
+        self.assertEqual(club_image(self.book_club)['src'], self.book_club.image.url)
+
+        generate_renditions(self.book_club.id)
+        self.book_club.refresh_from_db()
+
+        context = club_image(self.book_club, sizes='50vw')
+        widths = re.findall(r' (\d+)w', context['fallback_srcset'])
+        self.assertEqual(widths, ['320', '500'])
+        self.assertEqual(context['src'], default_storage.url(self.book_club.image_renditions['jpeg'][0]['name']))
+        self.assertEqual([source['type'] for source in context['sources']][-1], 'image/webp')
+
+    def test_renditions_made_on_the_pool(self):
+        done = threading.Event()
+        threads = []
+
+        def generate(book_club_id):
+            threads.append(threading.current_thread().name)
+            done.set()
+
+        with mock.patch('book_club.images.generate_renditions', generate):
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_renditions(self.book_club.id)
+                self.assertFalse(done.is_set())
+
+            self.assertTrue(done.wait(5))
+
+        self.assertTrue(threads[0].startswith('book-club-images'))
+
+
+class StaticFilesTests(TestCase):
+    def test_precompressed_hashed_files(self):
+        """
+        Collected files get content-hashed names and gzip copies, served with far-future immutable caching
+        """
+
+        with TemporaryDirectory() as static_root, override_settings(
+            STATIC_ROOT=static_root,
+            STORAGES={
+                **settings.STORAGES,
+                'staticfiles': {'BACKEND': 'book_club.staticfiles.PrecompressedManifestStaticFilesStorage'},
+            },
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.assertFalse(staticfiles_storage.exists('book_club/bootstrap/js/bootstrap.esm.js'))
+            self.assertFalse(staticfiles_storage.exists('book_club/scss/base.scss'))
+
+            css_url = staticfiles_storage.url('book_club/css/base.css')
+            self.assertRegex(css_url, r'base\.[0-9a-f]{12}\.css$')
+
+            middleware = PrecompressedStaticMiddleware(lambda req: None)
+            response = middleware(RequestFactory().get(css_url, HTTP_ACCEPT_ENCODING='br;q=0, gzip'))
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+            response.close()
+
+            response = middleware(RequestFactory().get(css_url))
+            self.assertFalse(response.has_header('Content-Encoding'))
+            response.close()
+
+
+class FontTests(TestCase):
+    def test_icons_found_in_templates(self):
+        icons = find_icons()
+
+        # Including icons chosen between by template tags
+        self.assertTrue({'notifications', 'how_to_reg', 'drafts', 'mail'} <= icons)
+        self.assertFalse({'if', 'else', 'endif', 'notification'} & icons)
+
+    def render_fonts(self, found):
+        vendored.cache_clear()
+        self.addCleanup(vendored.cache_clear)
+        with mock.patch('book_club.fonts.finders.find', return_value=found):
+            return Template('{% load book_club_tags %}{% fonts %}').render(Context())
+
+    def test_google_fonts_until_vendored(self):
+        html = self.render_fonts(None)
+        self.assertIn('https://fonts.googleapis.com/css2?family=Roboto+Slab', html)
+        self.assertNotIn('book_club/css/fonts.css', html)
+
+    def test_vendored_fonts_served_locally(self):
+        html = self.render_fonts('/static/book_club/css/fonts.css')
+        self.assertIn('book_club/css/fonts.css', html)
+        self.assertIn('book_club/fonts/roboto-slab-latin.woff2', html)
+        self.assertNotIn('fonts.googleapis.com', html)
+
+    def test_font_url(self):
+        self.assertEqual(
+            vendor_fonts.Command.font_url("src: url('https://fonts.gstatic.com/a.woff2') format('woff2');"),
+            'https://fonts.gstatic.com/a.woff2',
+        )
+        self.assertEqual(
+            vendor_fonts.Command.font_url('src: url(https://fonts.gstatic.com/b.ttf) format("truetype");'),
+            'https://fonts.gstatic.com/b.ttf',
+        )
+
+    def test_vendor_fonts_keeps_the_latin_block(self):
+        """
+        Only the Latin block of Roboto Slab is downloaded, and the stylesheet written with its unicode range
+        """
+
+        responses = {
+            vendor_fonts.TEXT_FONT_CSS: (
+                b"/* cyrillic */\n@font-face {\n  src: url(https://fonts.gstatic.com/cyrillic.woff2);\n"
+                b"  unicode-range: U+0400-045F;\n}\n"
+                b"/* latin-ext */\n@font-face {\n  src: url(https://fonts.gstatic.com/latin-ext.woff2);\n"
+                b"  unicode-range: U+0100-02AF;\n}\n"
+                b"/* latin */\n@font-face {\n  src: url(https://fonts.gstatic.com/latin.woff2);\n"
+                b"  unicode-range: U+0000-00FF, U+2000-206F;\n}\n"
+            ),
+            vendor_fonts.ICON_FONT_CSS: b"@font-face {\n  src: url(https://fonts.gstatic.com/icons.woff2);\n}\n",
+            'https://fonts.gstatic.com/latin.woff2': b'latin font',
+            'https://fonts.gstatic.com/icons.woff2': b'icon font',
+        }
+        static_dir = TemporaryDirectory()
+        self.addCleanup(static_dir.cleanup)
+
+        with (
+            mock.patch.object(vendor_fonts, 'STATIC_DIR', Path(static_dir.name)),
+            mock.patch.object(vendor_fonts, 'can_subset', return_value=False),
+            mock.patch.object(vendor_fonts.Command, 'fetch', side_effect=lambda url, _: responses[url]),
+        ):
+            call_command('vendor_fonts', stdout=StringIO(), stderr=StringIO())
+
+        static = Path(static_dir.name)
+        self.assertEqual((static / 'book_club/fonts/roboto-slab-latin.woff2').read_bytes(), b'latin font')
+        self.assertEqual((static / 'book_club/fonts/material-icons.woff2').read_bytes(), b'icon font')
+        css = (static / 'book_club/css/fonts.css').read_text()
+        self.assertIn('unicode-range: U+0000-00FF, U+2000-206F;', css)
+        self.assertIn('notifications', css)
+
+    @staticmethod
+    def icon_font(icons):
+        """
+        A TrueType font spelling each icon with a ligature of its letters, like Material Icons
+        """
+
+        from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+        from fontTools.fontBuilder import FontBuilder
+        from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+        letters = sorted(set(''.join(icons)))
+        glyphs = ['.notdef', *letters, *(f'icon_{icon}' for icon in icons)]
+        pen = TTGlyphPen(None)
+        pen.moveTo((0, 0))
+        pen.lineTo((0, 500))
+        pen.lineTo((500, 500))
+        pen.closePath()
+        outline = pen.glyph()
+
+        builder = FontBuilder(1000, isTTF=True)
+        builder.setupGlyphOrder(glyphs)
+        builder.setupCharacterMap({ord(letter): letter for letter in letters})
+        builder.setupGlyf({glyph: outline for glyph in glyphs})
+        builder.setupHorizontalMetrics({glyph: (500, 0) for glyph in glyphs})
+        builder.setupHorizontalHeader(ascent=800, descent=-200)
+        builder.setupNameTable({'familyName': 'Icons', 'styleName': 'Regular'})
+        builder.setupOS2()
+        builder.setupPost()
+        addOpenTypeFeaturesFromString(builder.font, 'feature liga {%s} liga;' % ''.join(
+            f'sub {" ".join(icon)} by icon_{icon};' for icon in icons
+        ))
+
+        font = BytesIO()
+        builder.save(font)
+        return font.getvalue()
+
+    @skipUnless(can_subset(), 'Subsetting needs fontTools and brotli')
+    def test_icons_subset(self):
+        from fontTools.ttLib import TTFont
+
+        font_data, missing = subset_icons(self.icon_font(['mail', 'home', 'star']), {'mail', 'home', 'gone'})
+
+        self.assertEqual(missing, {'gone'})
+        font = TTFont(BytesIO(font_data))
+        self.assertEqual(font.flavor, 'woff2')
+
+        # Glyph names don't survive subsetting, so read the icon names back from the ligatures
+        glyph_chars = {glyph: chr(code) for code, glyph in font.getBestCmap().items()}
+        ligatures = font['GSUB'].table.LookupList.Lookup[0].SubTable[0].ligatures
+        self.assertEqual({
+            ''.join(glyph_chars[glyph] for glyph in [first, *ligature.Component])
+            for first, first_ligatures in ligatures.items() for ligature in first_ligatures
+        }, {'mail', 'home'})
+        # .notdef, the letters of mail and home, and their two icons
+        self.assertEqual(len(font.getGlyphOrder()), 10)
@@ -1,14 +1,18 @@
+from django.conf import settings
 from django.urls import path, include
 
-from . import views
+from . import async_views, views
+
+# Serve the read-heavy pages from their async versions when running under ASGI
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 app_name = 'book_club'
 
 urlpatterns = [
-    path('', views.book_clubs, name='book_clubs'),
+    path('', read_views.book_clubs, name='book_clubs'),
     path('create', views.create_book_club, name='create_book_club'),
-    path('<slug:book_club_slug>/', views.book_club_home, name='book_club_home'),
-    path('search', views.book_club_search, name='book_club_search'),
+    path('<slug:book_club_slug>/', read_views.book_club_home, name='book_club_home'),
+    path('search', read_views.book_club_search, name='book_club_search'),
     path(
         '<slug:book_club_slug>/request-membership',
         views.book_club_membership_request,
@@ -1,17 +1,24 @@
 from datetime import datetime
 from typing import Optional
 
-from django.db import IntegrityError
-from django.db.models import Q
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.shortcuts import redirect, render
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.utils.text import slugify
 
+from notifications import outbox
 from notifications.models import Notification
-from .models import BookClub, Reader, MembershipRequest, BookClubReaders
+from .cache import get_reader_clubs
+from .models import BookClub, BookClubReaders, Reader, MembershipRequest
+from .images import schedule_renditions
+from .instrumentation import collected_samples, summarize
 from .forms import BookClubForm, ReaderCreationForm, BookClubSearchForm, MembershipRequestForm
+from .search import search_book_clubs
 
 
 def register_reader(req):
@@ -26,24 +33,20 @@ def register_reader(req):
     if req.method == 'POST':
         if req.POST['password1'] == req.POST['password2']:
             try:
-                # Create and persist the Reader (User) and log in
-                reader = Reader.objects.create_user(
-                    username=req.POST['username'],
-                    email=req.POST['email'],
-                    password=req.POST['password1'],
-                    given_name=req.POST['given_name'],
-                    surname=req.POST['surname'],
-                )
-                reader.save()
-                login(req, reader)
+                with transaction.atomic():
+                    # Create and persist the Reader (User)
+                    reader = Reader.objects.create_user(
+                        username=req.POST['username'],
+                        email=req.POST['email'],
+                        password=req.POST['password1'],
+                        given_name=req.POST['given_name'],
+                        surname=req.POST['surname'],
+                    )
+
+                    # Queue a welcome notification alongside the new reader
+                    outbox.enqueue(Notification.NotificationType.REGISTERED, source_reader=reader, target_reader=reader)
 
-                # Generate a welcome notification
-                notification = Notification(
-                    source_reader=req.user,
-                    target_reader=req.user,
-                    type=Notification.NotificationType.REGISTERED,
-                )
-                notification.save()
+                login(req, reader)
 
                 return redirect('home')
             except IntegrityError:
@@ -102,7 +105,7 @@ def logout_reader(req):
 def home(req):
 
     # Pull the groups the reader is a member of
-    reader_clubs = BookClub.objects.filter(readers__id=req.user.id, disbanded__isnull=True).all()
+    reader_clubs = get_reader_clubs(req.user.id)
     return_dict = {'book_clubs': reader_clubs, 'in_clubs': len(reader_clubs) > 0}
 
     return render(req, 'book_club/home.html', return_dict)
@@ -115,7 +118,7 @@ def book_clubs(req):
     """
 
     # Pull the groups the reader is a member of
-    reader_clubs = BookClub.objects.filter(readers__id=req.user.id, disbanded__isnull=True).all()
+    reader_clubs = get_reader_clubs(req.user.id)
     # TODO - Is there a different way to do in_clubs' logic in the template?
     return_dict = {'book_clubs': reader_clubs, 'in_clubs': len(reader_clubs) > 0}
 
@@ -136,12 +139,16 @@ def create_book_club(req):
             form = BookClubForm(req.POST, req.FILES)
             # NOTE - Have to persist to get a PK before adding many-to-many related fields
             #        even if you manually create a PK on instantiation... Not cool...
-            new_book_club = form.save()
+            new_book_club = form.save(commit=False)
             # TODO - Add slug to the form in the template
             #        ... this means figuring out how to track one field's input value and use it in another
             new_book_club.slug = slugify(new_book_club.name)
-            new_book_club.readers.add(req.user, through_defaults={'club_role': 'AD', 'is_creator': True})
             new_book_club.save()
+            new_book_club.readers.add(req.user, through_defaults={'club_role': 'AD', 'is_creator': True})
+
+            # Resize the uploaded image in the background
+            if new_book_club.image:
+                schedule_renditions(new_book_club.id)
 
             return redirect('book_club:book_clubs')
         except IntegrityError:
@@ -160,44 +167,37 @@ def book_club_home(req, book_club_slug):
     Home page for a given book club
     """
 
-    return_dict = {}
-
-    # Get the book club and reader role
-    # TODO - See if we can query for the book club and check publicity OR user having role in one query
-    try:
-        book_club = BookClub.objects.get(
-            slug=book_club_slug,
-            disbanded__isnull=True,
-        )
-
-        # Ensure that the reader has a role in the club or the club is public
-        try:
-            return_dict['reader_role'] = book_club.bookclubreaders_set.get(
-                reader__id=req.user.id, left__isnull=True
-            ).club_role
-        except BookClubReaders.DoesNotExist:
-            if book_club.publicity != 'PB':
-                return redirect('home')
-            else:
-                return_dict['reader_role'] = None
-
-        return_dict['book_club'] = book_club
+    # Get the book club, the reader's role in it, whether they've asked to join and the counts in one query
+    membership = req.club_membership(
+        book_club_slug, lambda book_clubs: book_clubs.with_membership_requested(req.user.id).with_counts()
+    )
+    book_club = membership.book_club
 
     # If the book club doesn't exist, redirect
-    except BookClub.DoesNotExist:
+    if book_club is None:
         return redirect('home')
 
-    # Get any open membership requests from the DB
-    try:
-        membership_requested = MembershipRequest.objects.filter(
-            reader_id=req.user.id,
-            book_club__slug=book_club_slug,
-            status__in=[MembershipRequest.RequestStatus.OPEN, MembershipRequest.RequestStatus.VIEWED]
-        ).count() > 0
+    # Ensure that the reader has a role in the club or the club is public
+    if not membership.is_member and book_club.publicity != BookClub.Publicity.PUBLIC:
+        return redirect('home')
 
-        return_dict['membership_requested'] = membership_requested
-    except MembershipRequest.DoesNotExist:
-        return_dict['membership_requested'] = False
+    # Get the first of the club's current members, with only the reader fields the page shows
+    members = BookClubReaders.objects.filter(
+        book_club=book_club, left__isnull=True
+    ).select_related(
+        'reader'
+    ).only(
+        'reader__username', 'reader__given_name', 'reader__surname'
+    ).order_by('reader__username')[:getattr(settings, 'BOOK_CLUB_HOME_MEMBERS', 100)]
+
+    return_dict = {
+        'book_club': book_club,
+        'reader_role': membership.role,
+        'membership_requested': book_club.membership_requested,
+        'open_request_count': book_club.open_request_count,
+        'member_count': book_club.member_count,
+        'members': members,
+    }
 
     # TODO - Strip reader IDs from response
     return render(req, 'book_club/book_club_home.html', return_dict)
@@ -206,25 +206,30 @@ def book_club_home(req, book_club_slug):
 @login_required
 def book_club_search(req):
     """
-    Search page and POST for finding book clubs
+    Search page for finding book clubs, with ranked and paginated results
     """
 
     return_dict = {'form': BookClubSearchForm, 'search_submitted': False, 'results': []}
 
-    # Search for book clubs on POST
-    if req.method == 'POST':
-        return_dict['form'] = BookClubSearchForm(req.POST)
-        search_text = req.POST.get('search_text')
-        if len(search_text) > 0:
-            found_book_clubs = BookClub.objects.filter(
-                disbanded__isnull=True,
-                name__icontains=search_text,
-            ).exclude(publicity='PR')
+    # Search for book clubs when search text is submitted (GET for paging through results, POST for older forms)
+    params = req.POST if req.method == 'POST' else req.GET
+    search_text = params.get('search_text', '').strip()
+    if len(search_text) > 0:
+        return_dict['form'] = BookClubSearchForm(params)
 
-            return_dict['search_submitted'] = True
-            return_dict['results'] = found_book_clubs.all()
+        try:
+            page = max(int(params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        results, has_next = search_book_clubs(search_text, page)
+
+        return_dict['search_submitted'] = True
+        return_dict['results'] = results
+        return_dict['search_text'] = search_text
+        return_dict['page'] = page
+        return_dict['has_next'] = has_next
 
-    # Default to assuming GET functionality
     return render(req, 'book_club/book_club_search.html', return_dict)
 
 
@@ -234,34 +239,32 @@ def book_club_membership_request(req, book_club_slug):
     Book Club membership request page and POST
     """
 
-    # Get the book club from the DB
-    try:
-        book_club = BookClub.objects.get(
-            ~Q(publicity='PR'),
-            slug=book_club_slug,
-            disbanded__isnull=True
-        )
+    # Get the book club and the reader's role in it
+    membership = req.club_membership(book_club_slug)
+    book_club = membership.book_club
 
-        # Check to see if the reader is already a member
-        try:
-            membership = book_club.bookclubreaders_set.get(reader_id=req.user.id)
-            if membership:
-                return redirect('home')
-        except BookClubReaders.DoesNotExist:
-            pass
+    # If the group doesn't exist or is private, redirect
+    if book_club is None or book_club.publicity == BookClub.Publicity.PRIVATE:
+        return redirect('book_club:book_club_home', book_club_slug=book_club_slug)
 
-        # Check for an existing request
-        existing_request: Optional[MembershipRequest] = None
-        try:
-            existing_request = MembershipRequest.objects.get(reader_id=req.user.id, book_club__slug=book_club_slug)
-        except MembershipRequest.DoesNotExist:
-            pass
+    # If the reader is or was a member of the group, redirect
+    # NOTE - Readers who left (or were removed) can't ask to be let back in
+    if membership.is_member or BookClubReaders.objects.filter(book_club=book_club, reader_id=req.user.id).exists():
+        return redirect('home')
+
+    # Check for an existing request
+    existing_request: Optional[MembershipRequest] = None
+    try:
+        existing_request = MembershipRequest.objects.get(reader_id=req.user.id, book_club=book_club)
+    except MembershipRequest.DoesNotExist:
+        pass
 
-        # On POST, persist a request
-        if req.method == 'POST':
-            form = MembershipRequestForm(req.POST)
-            membership_request: MembershipRequest = form.save(commit=False)
+    # On POST, persist a request
+    if req.method == 'POST':
+        form = MembershipRequestForm(req.POST)
+        membership_request: MembershipRequest = form.save(commit=False)
 
+        with transaction.atomic():
             # If there's already an existing request, update it
             if existing_request is not None:
                 existing_request.message = membership_request.message
@@ -274,27 +277,35 @@ def book_club_membership_request(req, book_club_slug):
                 membership_request.book_club = book_club
                 membership_request.save()
 
-            # Generate a notification about the request
-            notification = Notification(
-                source_reader=req.user,
-                book_club=book_club,
-                type=Notification.NotificationType.MEMBERSHIP_REQUESTED
+            # Queue a notification about the request for the club's admins
+            outbox.enqueue(
+                Notification.NotificationType.MEMBERSHIP_REQUESTED, source_reader=req.user, book_club=book_club
             )
-            notification.save()
-
-            return redirect('book_club:book_club_home', book_club_slug=book_club_slug)
-
-        # Default to assuming GET functionality
-        return render(
-            req,
-            'book_club/book_club_membership_request_form.html',
-            {
-                'form': MembershipRequestForm,
-                'book_club_name': book_club.name,
-                'membership_requested': existing_request is not None
-            }
-        )
 
-    # If the reader is a member of the group already or the group is private, redirect
-    except BookClub.DoesNotExist:
         return redirect('book_club:book_club_home', book_club_slug=book_club_slug)
+
+    # Default to assuming GET functionality
+    return render(
+        req,
+        'book_club/book_club_membership_request_form.html',
+        {
+            'form': MembershipRequestForm,
+            'book_club_name': book_club.name,
+            'membership_requested': existing_request is not None
+        }
+    )
+
+
+@staff_member_required
+def instrumentation_report(req):
+    """
+    Staff-only report of what each view costs, from the requests sampled by InstrumentationMiddleware
+    """
+
+    samples = collected_samples()
+
+    return JsonResponse({
+        'sample_rate': settings.INSTRUMENTATION_SAMPLE_RATE,
+        'samples': len(samples),
+        'views': summarize(samples),
+    })
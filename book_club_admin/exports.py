@@ -0,0 +1,150 @@
+import csv
+import itertools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from book_club.models import BookClubReaders, MembershipRequest
+from notifications.models import Notification
+
+# Format -> content type
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+# Spreadsheets run cells starting with these as formulas, so readers' text mustn't start with one
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def members(book_club):
+    """
+    Everyone who has been in the club, including readers who have since left
+    """
+
+    return BookClubReaders.objects.filter(book_club=book_club).order_by('joined', 'id')
+
+
+def membership_requests(book_club):
+    return MembershipRequest.objects.filter(book_club=book_club).order_by('requested', 'id')
+
+
+def notifications(book_club):
+    """
+    Notifications about the club, both club-wide ones and ones sent to a single reader
+    """
+
+    return Notification.objects.filter(book_club=book_club).order_by('generated', 'id')
+
+
+# Export name -> (the club's rows, oldest first, and the column header -> field of each)
+EXPORTS = {
+    'members': (members, {
+        'username': 'reader__username',
+        'given_name': 'reader__given_name',
+        'surname': 'reader__surname',
+        'role': 'club_role',
+        'is_creator': 'is_creator',
+        'joined': 'joined',
+        'left': 'left',
+    }),
+    'membership-requests': (membership_requests, {
+        'username': 'reader__username',
+        'message': 'message',
+        'status': 'status',
+        'requested': 'requested',
+        'evaluator': 'evaluator__username',
+        'evaluated': 'evaluated',
+    }),
+    'notifications': (notifications, {
+        'type': 'type',
+        'source_reader': 'source_reader__username',
+        'target_reader': 'target_reader__username',
+        'action_link': 'action_link',
+        'generated': 'generated',
+    }),
+}
+
+# Fields exported as their choice labels rather than their codes
+LABELS = {
+    'club_role': dict(BookClubReaders.RoleInClub.choices),
+    'status': dict(MembershipRequest.RequestStatus.choices),
+    'type': dict(Notification.NotificationType.choices),
+}
+
+
+class Echo:
+    """
+    File-like object handing back whatever is written to it, so csv.writer can format rows one at a time
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_response(book_club, export, export_format, asynchronous=False):
+    """
+    Stream one of the club's exports as an attachment. The rows come from a server-side cursor a chunk at a time
+    and are written out as they arrive, so memory stays flat however many there are.
+    Pass asynchronous=True under ASGI: Django reads a synchronous iterator into a list before sending it there.
+    """
+
+    chunks = __chunks(book_club, export, export_format)
+
+    return StreamingHttpResponse(
+        __aiterate(chunks) if asynchronous else chunks,
+        content_type=FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{book_club.slug}-{export}.{export_format}"'},
+    )
+
+
+def __chunks(book_club, export, export_format):
+    """
+    Format the export's rows, in blocks of BOOK_CLUB_EXPORT_CHUNK_SIZE rows, as CSV or as a JSON array of objects
+    """
+
+    queryset, columns = EXPORTS[export]
+    chunk_size = getattr(settings, 'BOOK_CLUB_EXPORT_CHUNK_SIZE', 2000)
+
+    # Only fetch the exported values, not whole model instances
+    rows = queryset(book_club).values_list(*columns.values()).iterator(chunk_size=chunk_size)
+    labels = [LABELS.get(field) for field in columns.values()]
+    rows = (
+        [value if label is None else label.get(value, value) for value, label in zip(row, labels)] for row in rows
+    )
+
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(list(columns))
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            yield ''.join(writer.writerow([__csv_safe(value) for value in row]) for row in chunk)
+    else:
+        encoder = DjangoJSONEncoder()
+        separator = '[\n'
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            yield separator + ',\n'.join(encoder.encode(dict(zip(columns, row))) for row in chunk)
+            separator = ',\n'
+        yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+async def __aiterate(chunks):
+    """
+    Iterate the chunks from async code, a thread call per chunk. Thread-sensitive calls all run in the request's
+    one sync thread, which is the thread holding the database connection and the cursor.
+    """
+
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Close the cursor straight away if the client goes before the end
+        await sync_to_async(chunks.close)()
+
+
+def __csv_safe(value):
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return f"'{value}"
+
+    return value
@@ -1,18 +1,103 @@
+from django.core.exceptions import ValidationError
 from django.forms import Form, UUIDField, HiddenInput, ChoiceField
 
+from book_club.models import BookClub, BookClubReaders
+from notifications.forms import UUIDListField
+
+ROLE_CHOICES = (
+    ('AD', 'Admin'), ('PT', 'Participant'), ('RD', 'Reader'), ('OB', 'Observer')
+)
+
+
+def club_role_choices(book_club):
+    """
+    The roles readers can be given in the club: private clubs have no observers
+    """
+
+    if book_club.publicity == BookClub.Publicity.PRIVATE:
+        return tuple(choice for choice in ROLE_CHOICES if choice[0] != BookClubReaders.RoleInClub.OBSERVER)
+
+    return ROLE_CHOICES
+
 
 class ApproveMembershipForm(Form):
     reader_id = UUIDField(
         widget=HiddenInput
     )
     club_role = ChoiceField(
-        choices=(
-            ('AD', 'Admin'), ('PT', 'Participant'), ('RD', 'Reader'), ('OB', 'Observer')
-        )
+        choices=ROLE_CHOICES
     )
 
+    def __init__(self, *args, book_club, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['club_role'].choices = club_role_choices(book_club)
+
 
 class DenyMembershipForm(Form):
     reader_id = UUIDField(
         widget=HiddenInput
     )
+
+
+class BulkEvaluateMembershipForm(Form):
+    APPROVE = 'approve'
+    DENY = 'deny'
+
+    reader_ids = UUIDListField()
+    action = ChoiceField(
+        choices=((APPROVE, 'Approve'), (DENY, 'Deny'))
+    )
+    club_role = ChoiceField(
+        choices=ROLE_CHOICES,
+        required=False
+    )
+
+    def __init__(self, *args, book_club, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['club_role'].choices = club_role_choices(book_club)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == self.APPROVE and not cleaned_data.get('club_role'):
+            raise ValidationError('Choose a role for the approved readers')
+
+        return cleaned_data
+
+
+class MemberFilterForm(Form):
+    SORTS = {
+        'name': ('reader__given_name', 'reader__surname', 'reader__username'),
+        'username': ('reader__username',),
+        'role': ('club_role', 'reader__username'),
+        'joined': ('joined', 'id'),
+        '-joined': ('-joined', '-id'),
+    }
+
+    sort = ChoiceField(
+        choices=(
+            ('name', 'Name'), ('username', 'Username'), ('role', 'Role'),
+            ('joined', 'Longest members'), ('-joined', 'Newest members'),
+        ),
+        required=False
+    )
+    role = ChoiceField(
+        choices=(('', 'All roles'),) + ROLE_CHOICES,
+        required=False
+    )
+
+
+class RequestFilterForm(Form):
+    PENDING = 'pending'
+    ALL = 'all'
+
+    STATUSES = {
+        PENDING: ['OP', 'VW'],
+        'AC': ['AC'],
+        'RJ': ['RJ'],
+        ALL: None,
+    }
+
+    status = ChoiceField(
+        choices=((PENDING, 'Pending'), ('AC', 'Approved'), ('RJ', 'Rejected'), (ALL, 'All')),
+        required=False
+    )
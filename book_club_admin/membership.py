@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from django.db import transaction
+
+from book_club.cache import invalidate_reader_clubs
+from book_club.models import BookClubReaders, MembershipRequest
+from notifications import outbox
+from notifications.models import Notification, NotificationEvent
+
+PENDING_STATUSES = [MembershipRequest.RequestStatus.OPEN, MembershipRequest.RequestStatus.VIEWED]
+
+
+def __lock_pending_requests(book_club, reader_ids):
+    """
+    Lock the club's pending requests from the given readers, so two admins can't evaluate the same ones at once,
+    and get the IDs of the readers who made them
+    """
+
+    return list(
+        MembershipRequest.objects.select_for_update().filter(
+            book_club=book_club, reader_id__in=reader_ids, status__in=PENDING_STATUSES
+        ).values_list('reader_id', flat=True)
+    )
+
+
+def approve_membership_requests(book_club, evaluator, reader_ids, club_role):
+    """
+    Add the readers with pending requests to the club in the given role, mark their requests as accepted and
+    queue their notifications, all in one transaction with a fixed number of queries.
+    Returns the number of requests approved.
+    """
+
+    with transaction.atomic():
+        reader_ids = __lock_pending_requests(book_club, reader_ids)
+        if not reader_ids:
+            return 0
+
+        now = datetime.now()
+
+        # Readers who left the club before rejoin with their old membership row; everyone else gets a new one
+        existing = set(
+            BookClubReaders.objects.filter(book_club=book_club, reader_id__in=reader_ids).values_list('reader_id', flat=True)
+        )
+        BookClubReaders.objects.filter(
+            book_club=book_club, reader_id__in=existing, left__isnull=False
+        ).update(club_role=club_role, joined=now, left=None)
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(reader_id=reader_id, book_club=book_club, club_role=club_role, joined=now)
+            for reader_id in reader_ids if reader_id not in existing
+        ])
+
+        MembershipRequest.objects.filter(
+            book_club=book_club, reader_id__in=reader_ids
+        ).update(status=MembershipRequest.RequestStatus.ACCEPTED, evaluator=evaluator, evaluated=now)
+
+        # Queue notifications for the new readers and the club's admins
+        outbox.enqueue_many([
+            event
+            for reader_id in reader_ids
+            for event in (
+                NotificationEvent(
+                    source_reader=evaluator,
+                    target_reader_id=reader_id,
+                    book_club=book_club,
+                    type=Notification.NotificationType.MEMBERSHIP_ACCEPTED
+                ),
+                NotificationEvent(
+                    source_reader_id=reader_id,
+                    book_club=book_club,
+                    type=Notification.NotificationType.NEW_READER
+                ),
+            )
+        ])
+
+        # Bulk queries skip the model signals, so drop the new readers' cached club lists by hand
+        invalidate_reader_clubs(reader_ids)
+
+    return len(reader_ids)
+
+
+def reject_membership_requests(book_club, evaluator, reader_ids):
+    """
+    Mark the readers' pending requests as rejected and queue their notifications in one transaction.
+    Returns the number of requests rejected.
+    """
+
+    with transaction.atomic():
+        reader_ids = __lock_pending_requests(book_club, reader_ids)
+        if not reader_ids:
+            return 0
+
+        MembershipRequest.objects.filter(
+            book_club=book_club, reader_id__in=reader_ids
+        ).update(status=MembershipRequest.RequestStatus.REJECTED, evaluator=evaluator, evaluated=datetime.now())
+
+        outbox.enqueue_many([
+            NotificationEvent(
+                source_reader=evaluator,
+                target_reader_id=reader_id,
+                book_club=book_club,
+                type=Notification.NotificationType.MEMBERSHIP_DECLINED,
+            )
+            for reader_id in reader_ids
+        ])
+
+    return len(reader_ids)
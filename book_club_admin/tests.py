@@ -1,3 +1,302 @@
-from django.test import TestCase
+import csv
+import io
+import json
 
-# Create your tests here.
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from book_club.cache import get_reader_clubs
+from book_club.models import BookClub, BookClubReaders, MembershipRequest, Reader
+from notifications.models import Notification, NotificationEvent
+
+
+class BookClubAdminTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Reader.objects.create(username='admin', email='admin@example.com')
+        cls.book_club = BookClub.objects.create(
+            name='Admin Club', slug='admin-club', publicity=BookClub.Publicity.PUBLIC
+        )
+        BookClubReaders.objects.create(
+            reader=cls.admin, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN
+        )
+
+    def setUp(self):
+        # Every class has its own club under the same slug, so don't resolve another class's from the cache
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _request_membership(self, count):
+        start = Reader.objects.count()
+        readers = Reader.objects.bulk_create([
+            Reader(username=f'reader{i}', email=f'reader{i}@example.com') for i in range(start, start + count)
+        ])
+        MembershipRequest.objects.bulk_create([
+            MembershipRequest(reader=reader, book_club=self.book_club, message='Hi') for reader in readers
+        ])
+
+        return readers
+
+
+class EvaluateRequestsTests(BookClubAdminTestCase):
+    def _evaluate(self, readers, action, club_role=BookClubReaders.RoleInClub.READER):
+        return self.client.post(
+            reverse('book_club:book_club_admin:book_club_admin_evaluate_requests', args=[self.book_club.slug]),
+            {'reader_ids': [reader.id for reader in readers], 'action': action, 'club_role': club_role},
+        )
+
+    def test_bulk_approve_query_count_is_constant(self):
+        """
+        Approving many requests costs the same queries as approving a few
+        """
+
+        few = self._request_membership(2)
+        many = self._request_membership(30)
+
+        with self.assertNumQueries(len(self._capture_queries(few))):
+            self._evaluate(many, 'approve')
+
+        self.assertEqual(
+            BookClubReaders.objects.filter(book_club=self.book_club, left__isnull=True).count(), 33
+        )
+        self.assertFalse(MembershipRequest.objects.filter(status=MembershipRequest.RequestStatus.OPEN).exists())
+        self.assertEqual(
+            NotificationEvent.objects.filter(type=Notification.NotificationType.MEMBERSHIP_ACCEPTED).count(), 32
+        )
+
+    def test_bulk_deny(self):
+        readers = self._request_membership(3)
+
+        self._evaluate(readers[:2], 'deny')
+
+        statuses = dict(MembershipRequest.objects.values_list('reader_id', 'status'))
+        self.assertEqual(statuses[readers[0].id], MembershipRequest.RequestStatus.REJECTED)
+        self.assertEqual(statuses[readers[2].id], MembershipRequest.RequestStatus.OPEN)
+        self.assertEqual(BookClubReaders.objects.filter(book_club=self.book_club).count(), 1)
+
+    def test_former_member_rejoins(self):
+        """
+        A reader who left and requested to come back gets their membership back, and an up to date club list
+        """
+
+        reader, = self._request_membership(1)
+        BookClubReaders.objects.create(reader=reader, book_club=self.book_club, left=datetime.now())
+        self.assertEqual(get_reader_clubs(reader.id), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._evaluate([reader], 'approve', BookClubReaders.RoleInClub.PARTICIPANT)
+
+        membership = BookClubReaders.objects.get(reader=reader, book_club=self.book_club)
+        self.assertIsNone(membership.left)
+        self.assertEqual(membership.club_role, BookClubReaders.RoleInClub.PARTICIPANT)
+        self.assertEqual(get_reader_clubs(reader.id), [self.book_club])
+
+    def test_private_club_has_no_observers(self):
+        """
+        Hand-made POSTs can't make observers of a private club, one request or many at a time
+        """
+
+        self.book_club.publicity = BookClub.Publicity.PRIVATE
+        self.book_club.save()
+        readers = self._request_membership(2)
+
+        self._evaluate(readers, 'approve', BookClubReaders.RoleInClub.OBSERVER)
+        self.client.post(
+            reverse('book_club:book_club_admin:book_club_admin_approve_new_reader', args=[self.book_club.slug]),
+            {'reader_id': readers[0].id, 'club_role': BookClubReaders.RoleInClub.OBSERVER},
+        )
+
+        self.assertEqual(BookClubReaders.objects.filter(book_club=self.book_club).count(), 1)
+        self.assertEqual(
+            MembershipRequest.objects.filter(status=MembershipRequest.RequestStatus.OPEN).count(), 2
+        )
+
+        # Other roles are still fine
+        self._evaluate(readers, 'approve', BookClubReaders.RoleInClub.READER)
+        self.assertEqual(BookClubReaders.objects.filter(book_club=self.book_club).count(), 3)
+
+    def _capture_queries(self, readers):
+        with CaptureQueriesContext(connection) as context:
+            self._evaluate(readers, 'approve')
+
+        return context.captured_queries
+
+
+@override_settings(BOOK_CLUB_MEMBERS_PAGE_SIZE=10)
+class MembersTests(BookClubAdminTestCase):
+    def _add_members(self, count, **fields):
+        readers = self._request_membership(count)
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(reader=reader, book_club=self.book_club, **fields) for reader in readers
+        ])
+
+        return readers
+
+    def _get(self, **params):
+        return self.client.get(
+            reverse('book_club:book_club_admin:book_club_admin_members', args=[self.book_club.slug]), params
+        )
+
+    def test_query_count_is_constant(self):
+        self._add_members(2)
+        with CaptureQueriesContext(connection) as small_club:
+            self._get()
+
+        self._add_members(40)
+        with self.assertNumQueries(len(small_club.captured_queries)):
+            response = self._get(page=2)
+
+        self.assertEqual(len(response.context['members']), 10)
+        self.assertEqual(response.context['members'].paginator.count, 43)
+
+    def test_filter_and_sort(self):
+        """
+        Readers who left are never listed, and the role filter and sort apply server-side
+        """
+
+        self._add_members(3, club_role=BookClubReaders.RoleInClub.PARTICIPANT)
+        self._add_members(2, club_role=BookClubReaders.RoleInClub.PARTICIPANT, left=datetime.now())
+
+        response = self._get(role=BookClubReaders.RoleInClub.PARTICIPANT, sort='-joined')
+
+        members = list(response.context['members'])
+        self.assertEqual(len(members), 3)
+        self.assertEqual(members, sorted(members, key=lambda member: member.joined, reverse=True))
+        self.assertTrue(all(member.club_role == BookClubReaders.RoleInClub.PARTICIPANT for member in members))
+
+
+@override_settings(BOOK_CLUB_REQUESTS_PAGE_SIZE=10)
+class MembershipRequestsTests(BookClubAdminTestCase):
+    def _get(self, **params):
+        return self.client.get(
+            reverse('book_club:book_club_admin:book_club_admin_membership_requests', args=[self.book_club.slug]),
+            params,
+        )
+
+    def test_query_count_is_constant(self):
+        approved = self._request_membership(2)
+        MembershipRequest.objects.filter(reader__in=approved).update(
+            status=MembershipRequest.RequestStatus.ACCEPTED, evaluator=self.admin, evaluated=datetime.now()
+        )
+        with CaptureQueriesContext(connection) as small_club:
+            self._get(status='all')
+
+        self._request_membership(30)
+        with self.assertNumQueries(len(small_club.captured_queries)):
+            response = self._get(status='all', page=2)
+
+        self.assertEqual(len(response.context['requests']), 10)
+
+    def test_pending_by_default(self):
+        """
+        Only requests still waiting on an admin are listed unless another status is asked for
+        """
+
+        pending = self._request_membership(3)
+        MembershipRequest.objects.filter(reader=pending[0]).update(status=MembershipRequest.RequestStatus.REJECTED)
+
+        response = self._get()
+        self.assertEqual(response.context['requests'].paginator.count, 2)
+
+        response = self._get(status=MembershipRequest.RequestStatus.REJECTED)
+        self.assertEqual([request.reader for request in response.context['requests']], [pending[0]])
+
+    def test_observers_only_offered_outside_private_clubs(self):
+        self._request_membership(1)
+        # The bulk form and the request's own form
+        self.assertContains(self._get(), 'value="OB"', count=2)
+
+        self.book_club.publicity = BookClub.Publicity.PRIVATE
+        self.book_club.save()
+        self.assertNotContains(self._get(), 'value="OB"')
+
+
+@override_settings(BOOK_CLUB_EXPORT_CHUNK_SIZE=2)
+class ExportTests(BookClubAdminTestCase):
+    def _url(self, export):
+        return reverse(
+            'book_club:book_club_admin:book_club_admin_export',
+            kwargs={'book_club_slug': self.book_club.slug, 'export': export},
+        )
+
+    def test_members_csv(self):
+        """
+        Every member past and present is streamed, a header row and all
+        """
+
+        readers = self._request_membership(4)
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(reader=reader, book_club=self.book_club, left=datetime.now() if i else None)
+            for i, reader in enumerate(readers)
+        ])
+
+        response = self.client.get(self._url('members'))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="admin-club-members.csv"')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['username'] for row in rows], ['admin', *(reader.username for reader in readers)])
+        self.assertEqual(rows[0]['role'], 'Admin')
+        self.assertEqual(sum(1 for row in rows if row['left']), 3)
+
+    def test_membership_requests_json(self):
+        readers = self._request_membership(5)
+        MembershipRequest.objects.filter(reader=readers[0]).update(
+            status=MembershipRequest.RequestStatus.ACCEPTED, evaluator=self.admin, evaluated=datetime.now()
+        )
+
+        response = self.client.get(self._url('membership-requests'), {'format': 'json'})
+
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['status'], 'Accepted')
+        self.assertEqual(rows[0]['evaluator'], 'admin')
+        self.assertIsNone(rows[1]['evaluator'])
+
+    def test_csv_formulas_are_escaped(self):
+        reader = self._request_membership(1)[0]
+        MembershipRequest.objects.filter(reader=reader).update(message='=HYPERLINK("http://example.com")')
+
+        response = self.client.get(self._url('membership-requests'))
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0]['message'], '\'=HYPERLINK("http://example.com")')
+
+    async def test_notifications_stream_under_asgi(self):
+        """
+        Under ASGI the rows are streamed by an async iterator, rather than read into a list first
+        """
+
+        reader = (await sync_to_async(self._request_membership)(1))[0]
+        await Notification.objects.abulk_create([
+            Notification(source_reader=reader, book_club=self.book_club, type=Notification.NotificationType.NEW_READER)
+            for _ in range(3)
+        ])
+        await sync_to_async(self.async_client.force_login)(self.admin)
+
+        response = await self.async_client.get(self._url('notifications'), {'format': 'json'})
+
+        self.assertTrue(response.is_async)
+        rows = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual([row['type'] for row in rows], ['New Reader'] * 3)
+
+    def test_empty_export(self):
+        response = self.client.get(self._url('notifications'), {'format': 'json'})
+
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    def test_non_admin_is_redirected(self):
+        reader = self._request_membership(1)[0]
+        self.client.force_login(reader)
+
+        self.assertRedirects(self.client.get(self._url('members')), reverse('home'), fetch_redirect_response=False)
+
+    def test_unknown_export_or_format(self):
+        self.assertEqual(self.client.get(self._url('readers')).status_code, 404)
+        self.assertEqual(self.client.get(self._url('members'), {'format': 'xml'}).status_code, 400)
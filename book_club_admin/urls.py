@@ -33,6 +33,16 @@ urlpatterns = [
         views.book_club_admin_reject_new_reader,
         name='book_club_admin_reject_new_reader'
     ),
+    path(
+        'membership-requests/evaluate',
+        views.book_club_admin_evaluate_requests,
+        name='book_club_admin_evaluate_requests'
+    ),
+    path(
+        'export/<str:export>',
+        views.book_club_admin_export,
+        name='book_club_admin_export'
+    ),
     path(
         'disband',
         views.book_club_admin_disband,
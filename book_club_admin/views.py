@@ -1,12 +1,19 @@
 from datetime import datetime
 from typing import Optional
 
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseBadRequest
 from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 
-from .forms import DenyMembershipForm, ApproveMembershipForm
-from book_club.models import BookClub, Reader, MembershipRequest
-from notifications.models import Notification
+from .forms import (
+    DenyMembershipForm, ApproveMembershipForm, BulkEvaluateMembershipForm, MemberFilterForm, RequestFilterForm
+)
+from .exports import EXPORTS, FORMATS, export_response
+from .membership import approve_membership_requests, reject_membership_requests
+from book_club.models import BookClub, BookClubReaders, MembershipRequest
 
 
 @login_required
@@ -16,7 +23,7 @@ def book_club_admin(req, book_club_slug):
     """
 
     # Get the book club from the DB
-    book_club = __get_admin_club_or_none(book_club_slug, req.user.id)
+    book_club = __get_admin_club_or_none(req, book_club_slug)
 
     # If not an admin, redirect to home
     # TODO - Redirect to current page
@@ -37,21 +44,48 @@ def book_club_admin_members(req, book_club_slug):
     """
 
     # Get the book club from the DB
-    book_club = __get_admin_club_or_none(book_club_slug, req.user.id)
+    book_club = __get_admin_club_or_none(req, book_club_slug)
 
     # If not an admin, redirect to home
     # TODO - Redirect to current page
     if book_club is None:
         return redirect('home')
 
+    # Get the sort order and role filter, ignoring anything invalid
+    form = MemberFilterForm(req.GET)
+    sort, role = 'name', ''
+    if form.is_valid():
+        sort = form.cleaned_data['sort'] or sort
+        role = form.cleaned_data['role']
+
+    # Get a page of the club's current members, with only the reader fields the page shows
+    members = BookClubReaders.objects.filter(
+        book_club=book_club, left__isnull=True
+    ).select_related(
+        'reader'
+    ).only(
+        'id', 'club_role', 'is_creator', 'joined', 'reader',
+        'reader__id', 'reader__username', 'reader__given_name', 'reader__surname',
+    ).order_by(*MemberFilterForm.SORTS[sort])
+    if role:
+        members = members.filter(club_role=role)
+
+    page = Paginator(members, settings.BOOK_CLUB_MEMBERS_PAGE_SIZE).get_page(req.GET.get('page'))
+
+    # Keep the sort and filter when moving between pages
+    params = req.GET.copy()
+    params.pop('page', None)
+
     return render(
         req,
         'book_club/book_club_admin.html',
         {
-            # TODO - filter readers to only those who haven't left
             'book_club': book_club,
             'title_suffix': 'Members',
             'section': 'members',
+            'member_filter': form,
+            'members': page,
+            'query_string': params.urlencode(),
         },
     )
 
@@ -63,14 +97,35 @@ def book_club_admin_membership_requests(req, book_club_slug):
     """
 
     # Get the book club from the DB
-    book_club = __get_admin_club_or_none(book_club_slug, req.user.id)
+    book_club = __get_admin_club_or_none(req, book_club_slug)
 
     # If not an admin, redirect to home
     if book_club is None:
         return redirect('home')
 
-    # Get membership requests for the book club
-    requests = MembershipRequest.objects.filter(book_club__id=book_club.id)
+    # Get the status filter, defaulting to the requests still waiting on an admin
+    form = RequestFilterForm(req.GET)
+    status = RequestFilterForm.PENDING
+    if form.is_valid():
+        status = form.cleaned_data['status'] or status
+
+    # Get a page of the club's membership requests, newest first, along with the readers who made and evaluated them
+    requests = MembershipRequest.objects.filter(
+        book_club=book_club
+    ).select_related(
+        'reader', 'evaluator'
+    ).only(
+        'id', 'message', 'status', 'requested', 'evaluated', 'reader', 'evaluator',
+        'reader__id', 'reader__username', 'evaluator__id', 'evaluator__username',
+    ).order_by('-requested', '-id')
+    if RequestFilterForm.STATUSES[status] is not None:
+        requests = requests.filter(status__in=RequestFilterForm.STATUSES[status])
+
+    page = Paginator(requests, settings.BOOK_CLUB_REQUESTS_PAGE_SIZE).get_page(req.GET.get('page'))
+
+    # Keep the filter when moving between pages
+    params = req.GET.copy()
+    params.pop('page', None)
 
     return render(
         req,
@@ -79,7 +134,10 @@ def book_club_admin_membership_requests(req, book_club_slug):
             'book_club': book_club,
             'title_suffix': 'Membership Requests',
             'section': 'membership_requests',
-            'requests': requests
+            'request_filter': form,
+            'status': status,
+            'requests': page,
+            'query_string': params.urlencode(),
         }
     )
 
@@ -91,7 +149,7 @@ def book_club_admin_prefs(req, book_club_slug):
     """
 
     # Get the book club from the DB
-    book_club = __get_admin_club_or_none(book_club_slug, req.user.id)
+    book_club = __get_admin_club_or_none(req, book_club_slug)
 
     # If not an admin, redirect to home
     # TODO - Redirect to current page
@@ -127,7 +185,7 @@ def book_club_admin_approve_new_reader(req, book_club_slug):
 
     if req.method == 'POST':
         # Get the book club from the DB, which the authenticated user must be an admin of
-        book_club = __get_admin_club_or_none(book_club_slug, req.user.id)
+        book_club = __get_admin_club_or_none(req, book_club_slug)
 
         # If not an admin, redirect to home
         # TODO - Redirect to current page
@@ -135,38 +193,16 @@ def book_club_admin_approve_new_reader(req, book_club_slug):
             return redirect('home')
 
         # Get the new reader's ID and their new role from the form
-        form = ApproveMembershipForm(req.POST)
+        form = ApproveMembershipForm(req.POST, book_club=book_club)
         if form.is_valid():
-            # Get the new reader from the DB and add them to the book club
-            new_reader = Reader.objects.get(id=form.cleaned_data['reader_id'])
-            book_club.readers.add(new_reader, through_defaults={'club_role': form.cleaned_data['club_role']})
-            book_club.save()
-
-            # Get the membership request and mark it as approved
-            __evaluate_membership_request(
-                reader_id=form.cleaned_data['reader_id'],
+            # Add the reader to the book club and mark their request as approved
+            approve_membership_requests(
                 book_club=book_club,
                 evaluator=req.user,
-                status=MembershipRequest.RequestStatus.ACCEPTED
+                reader_ids=[form.cleaned_data['reader_id']],
+                club_role=form.cleaned_data['club_role'],
             )
 
-            # Generate notifications
-            notifications = [
-                Notification(
-                    source_reader=req.user,
-                    target_reader=new_reader,
-                    book_club=book_club,
-                    type=Notification.NotificationType.MEMBERSHIP_ACCEPTED
-                ),
-                Notification(
-                    source_reader=new_reader,
-                    book_club=book_club,
-                    type=Notification.NotificationType.NEW_READER
-                ),
-            ]
-
-            Notification.objects.bulk_create(notifications)
-
             return redirect('book_club:book_club_admin:book_club_admin_membership_requests', book_club_slug=book_club_slug)
         else:
             return redirect('home')
@@ -180,39 +216,62 @@ def book_club_admin_reject_new_reader(req, book_club_slug):
 
     if req.method == 'POST':
         # Get the book club from the DB, which the authenticated user must be an admin of
-        book_club = __get_admin_club_or_none(book_club_slug, req.user.id)
+        book_club = __get_admin_club_or_none(req, book_club_slug)
 
         # If not an admin, redirect to home
         # TODO - Redirect to current page
         if book_club is None:
             return redirect('home')
 
-        # Get the new reader's ID and their new role from the form
+        # Get the reader's ID from the form
         form = DenyMembershipForm(req.POST)
         if form.is_valid():
-            # Get the membership request and mark it as rejected
-            __evaluate_membership_request(
-                reader_id=form.cleaned_data['reader_id'],
+            # Mark the reader's request as rejected
+            reject_membership_requests(
                 book_club=book_club,
                 evaluator=req.user,
-                status=MembershipRequest.RequestStatus.REJECTED
+                reader_ids=[form.cleaned_data['reader_id']],
             )
 
-            # Generate notification
-            rejected_reader = Reader.objects.get(id=form.cleaned_data['reader_id'])
-            notification = Notification(
-                source_reader=req.user,
-                target_reader=rejected_reader,
-                book_club=book_club,
-                type=Notification.NotificationType.MEMBERSHIP_DECLINED,
-            )
-            notification.save()
-
             return redirect('book_club:book_club_admin:book_club_admin_membership_requests', book_club_slug=book_club_slug)
         else:
             return redirect('home')
 
 
+@login_required
+def book_club_admin_evaluate_requests(req, book_club_slug):
+    """
+    Approve or deny several membership requests at once
+    """
+
+    if req.method == 'POST':
+        # Get the book club from the DB, which the authenticated user must be an admin of
+        book_club = __get_admin_club_or_none(req, book_club_slug)
+
+        # If not an admin, redirect to home
+        if book_club is None:
+            return redirect('home')
+
+        # Get the selected readers and what to do with their requests from the form
+        form = BulkEvaluateMembershipForm(req.POST, book_club=book_club)
+        if form.is_valid():
+            if form.cleaned_data['action'] == BulkEvaluateMembershipForm.APPROVE:
+                approve_membership_requests(
+                    book_club=book_club,
+                    evaluator=req.user,
+                    reader_ids=form.cleaned_data['reader_ids'],
+                    club_role=form.cleaned_data['club_role'],
+                )
+            else:
+                reject_membership_requests(
+                    book_club=book_club,
+                    evaluator=req.user,
+                    reader_ids=form.cleaned_data['reader_ids'],
+                )
+
+    return redirect('book_club:book_club_admin:book_club_admin_membership_requests', book_club_slug=book_club_slug)
+
+
 @login_required
 def book_club_admin_disband(req, book_club_slug):
     """
@@ -221,7 +280,7 @@ def book_club_admin_disband(req, book_club_slug):
 
     # Get the book club from the DB
     # TODO - Only creators should be able to disband groups
-    book_club = __get_admin_club_or_none(book_club_slug, req.user.id)
+    book_club = __get_admin_club_or_none(req, book_club_slug)
 
     # If not an admin, redirect to home
     # TODO - Redirect to current page
@@ -229,33 +288,37 @@ def book_club_admin_disband(req, book_club_slug):
         return redirect('home')
 
     # Set the book club to disbanded and redirect to home
+    # NOTE - book_club is a cached copy, so only write the columns changed here rather than the whole stale row
     book_club.disbanded = datetime.now()
-    book_club.save()
+    book_club.save(update_fields=['disbanded', 'updated'])
 
     return redirect('home')
 
 
-def __get_admin_club_or_none(book_club_slug, user_id):
-    book_club: Optional[BookClub]
-    try:
-        book_club = BookClub.objects.get(
-            slug=book_club_slug,
-            disbanded__isnull=True,
-            readers__id=user_id,
-            bookclubreaders__club_role='AD',
-            bookclubreaders__left__isnull=True,
-        )
-    except BookClub.DoesNotExist:
-        book_club = None
+@login_required
+def book_club_admin_export(req, book_club_slug, export):
+    """
+    Download the club's members, membership requests or notifications, past and present, as CSV or JSON
+    """
 
-    return book_club
+    # Get the book club from the DB
+    book_club = __get_admin_club_or_none(req, book_club_slug)
 
+    # If not an admin, redirect to home
+    if book_club is None:
+        return redirect('home')
 
-def __evaluate_membership_request(reader_id, book_club, evaluator, status):
-    membership_request = MembershipRequest.objects.get(
-        reader_id=reader_id, book_club=book_club
-    )
-    membership_request.status = status
-    membership_request.evaluator = evaluator
-    membership_request.evaluated = datetime.now()
-    membership_request.save()
+    if export not in EXPORTS:
+        raise Http404('No such export')
+
+    export_format = req.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest(f'Unknown format, expected one of: {", ".join(FORMATS)}')
+
+    return export_response(book_club, export, export_format, asynchronous=isinstance(req, ASGIRequest))
+
+
+def __get_admin_club_or_none(req, book_club_slug) -> Optional[BookClub]:
+    membership = req.club_membership(book_club_slug)
+
+    return membership.book_club if membership.is_admin else None
@@ -0,0 +1,23 @@
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+
+from book_club.decorators import async_login_required
+from .pagination import anotification_page
+
+# Async versions of the read-heavy views, used in place of the ones in views.py when ASYNC_READ_VIEWS is on
+
+
+@async_login_required
+async def notifications_home(req):
+    """
+    Page to view notifications
+    """
+
+    # Get the first page of notifications from the reader's inbox
+    notifications, next_cursor = await anotification_page(req.user.id, page_size=req.GET.get('page_size'))
+
+    return await sync_to_async(render)(
+        req,
+        'notifications/notifications_home.html',
+        {'notifications': notifications, 'next_cursor': next_cursor},
+    )
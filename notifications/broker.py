@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import threading
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.utils.module_loading import import_string
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """
+    In-process fan-out of new notifications to the streams subscribed in this process. Only enough for tests:
+    notifications are delivered by the dispatch_notifications worker, which is a process of its own.
+    """
+
+    queue_size = 100
+    # Whether messages published in one process reach the streams in the others
+    cross_process = False
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, reader_id):
+        """
+        Get a queue receiving the reader's new notifications; must be called from the event loop that reads it
+        """
+
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers[str(reader_id)].add((loop, queue))
+
+        return queue
+
+    def unsubscribe(self, reader_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(str(reader_id), set())
+            subscribers.difference_update({subscriber for subscriber in subscribers if subscriber[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(str(reader_id), None)
+
+    def publish(self, messages):
+        """
+        Send {'reader': ..., 'notification': ...} messages to the readers' streams
+        """
+
+        for message in messages:
+            self.dispatch(message)
+
+    def dispatch(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(message['reader']), ()))
+
+        # Queues belong to their event loops, so hand the message over on the loop's own thread
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_put, queue, message)
+
+
+def _put(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # The stream isn't keeping up; the reader still gets the notification on their next page load
+        logger.warning('Dropping notification %s for a slow stream', message['notification'])
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Fan-out across processes using PostgreSQL LISTEN/NOTIFY. Every process LISTENs on one channel (with its own
+    connection, opened on the first subscription) and passes the messages on to its local streams.
+    """
+
+    channel = 'notifications'
+    cross_process = True
+    reconnect_delay = 5
+
+    def __init__(self):
+        # Fail when the broker is set up rather than in a listener retrying forever
+        if psycopg2 is None:
+            raise ImproperlyConfigured('PostgresBroker needs the psycopg2 package')
+
+        super().__init__()
+        self._listeners = {}
+
+    def subscribe(self, reader_id):
+        queue = super().subscribe(reader_id)
+
+        # One listener per event loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._listeners or self._listeners[loop].done():
+                self._listeners[loop] = loop.create_task(self._listen())
+
+        return queue
+
+    def publish(self, messages):
+        params = [(self.channel, json.dumps(message)) for message in messages]
+        if params:
+            with connection.cursor() as cursor:
+                cursor.executemany('SELECT pg_notify(%s, %s)', params)
+
+    def _connect(self):
+        database = settings.DATABASES['default']
+        listener = psycopg2.connect(
+            dbname=database['NAME'],
+            user=database.get('USER') or None,
+            password=database.get('PASSWORD') or None,
+            host=database.get('HOST') or None,
+            port=database.get('PORT') or None,
+        )
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+
+        return listener
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            listener = None
+            try:
+                # Connecting blocks, so do it in a thread; after that the event loop waits on the socket
+                listener = await loop.run_in_executor(None, self._connect)
+                readable = asyncio.Event()
+                fileno = listener.fileno()
+                loop.add_reader(fileno, readable.set)
+                try:
+                    while True:
+                        await readable.wait()
+                        readable.clear()
+                        listener.poll()
+                        while listener.notifies:
+                            self.dispatch(json.loads(listener.notifies.pop(0).payload))
+                finally:
+                    loop.remove_reader(fileno)
+            except (psycopg2.Error, OSError):
+                logger.exception('Notification listener lost its connection, reconnecting')
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                if listener is not None:
+                    listener.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    The process-wide broker configured by NOTIFICATIONS_BROKER
+    """
+
+    global _broker
+
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(
+                getattr(settings, 'NOTIFICATIONS_BROKER', 'notifications.broker.LocalBroker')
+            )()
+
+    return _broker
+
+
+def publish_entries(entries):
+    """
+    Announce new inbox entries to their readers' streams, if streaming is on
+    """
+
+    if not getattr(settings, 'NOTIFICATIONS_STREAM', False):
+        return
+
+    try:
+        get_broker().publish(
+            [{'reader': str(entry.reader_id), 'notification': str(entry.notification_id)} for entry in entries]
+        )
+    except Exception:
+        # Streams are best effort; the notifications themselves are already committed
+        logger.exception('Failed to publish new notifications')
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core import checks
+from django.utils.module_loading import import_string
+
+
+@checks.register(checks.Tags.compatibility)
+def check_stream_broker(app_configs, **kwargs):
+    """
+    Notifications are delivered by the dispatch_notifications worker, a separate process from the web workers
+    holding the streams, so streaming needs a broker that reaches across processes
+    """
+
+    if not getattr(settings, 'NOTIFICATIONS_STREAM', False):
+        return []
+
+    broker = getattr(settings, 'NOTIFICATIONS_BROKER', 'notifications.broker.LocalBroker')
+    try:
+        broker_class = import_string(broker)
+    except ImportError as e:
+        return [checks.Error(f'NOTIFICATIONS_BROKER {broker} can\'t be imported: {e}', id='notifications.E001')]
+
+    if not getattr(broker_class, 'cross_process', False):
+        return [checks.Error(
+            f'NOTIFICATIONS_BROKER {broker} only reaches streams in its own process, so notifications from the '
+            'dispatch_notifications worker would never be streamed',
+            hint='Use notifications.broker.PostgresBroker, or turn NOTIFICATIONS_STREAM off',
+            id='notifications.E002',
+        )]
+
+    return []
@@ -0,0 +1,22 @@
+from django.conf import settings
+
+from .models import UnreadNotifications
+
+
+def unread_notifications(req):
+    """
+    Add the authenticated reader's unread notification count for the navbar badge, and whether pages should open
+    the live notification stream
+    """
+
+    if not req.user.is_authenticated:
+        return {}
+
+    unread = UnreadNotifications.objects.filter(
+        reader_id=req.user.id
+    ).values_list('count', flat=True).first()
+
+    return {
+        'unread_notifications': unread or 0,
+        'notifications_stream': getattr(settings, 'NOTIFICATIONS_STREAM', False),
+    }
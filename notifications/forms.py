@@ -1,4 +1,7 @@
-from django.forms import CharField, Form, HiddenInput, UUIDField
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.forms import CharField, DateTimeField, Field, Form, HiddenInput, MultipleHiddenInput, UUIDField
 
 
 class NotificationLinkForm(Form):
@@ -9,4 +12,33 @@ class NotificationLinkForm(Form):
     redirect_url = CharField(
         widget=HiddenInput(),
         required=True
-    )
\ No newline at end of file
+    )
+
+
+class UUIDListField(Field):
+    widget = MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [uuid.UUID(str(item)) for item in value]
+        except ValueError:
+            raise ValidationError('Enter valid UUIDs.', code='invalid')
+
+
+class MarkViewedForm(Form):
+    notification_ids = UUIDListField(
+        required=False
+    )
+    before = DateTimeField(
+        widget=HiddenInput(),
+        required=False
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('notification_ids') and cleaned_data.get('before') is None:
+            raise ValidationError('Choose notifications or a time to mark as viewed')
+
+        return cleaned_data
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications.outbox import dead_events, dispatch_batch, purge_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate notifications from the outbox of pending notification events, periodically deleting old events '
+        'and reporting the ones that have been given up on'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=getattr(settings, 'NOTIFICATIONS_OUTBOX_BATCH_SIZE', 500),
+            help='Maximum number of events to dispatch per transaction'
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=getattr(settings, 'NOTIFICATIONS_OUTBOX_MAX_ATTEMPTS', 5),
+            help='Give up on events that have failed this many times'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'NOTIFICATIONS_OUTBOX_POLL_INTERVAL', 1.0),
+            help='Seconds to sleep when the outbox is empty'
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=getattr(settings, 'NOTIFICATIONS_OUTBOX_RETENTION_DAYS', 7),
+            help='Delete processed and dead events older than this many days'
+        )
+        parser.add_argument(
+            '--purge-interval', type=float, default=getattr(settings, 'NOTIFICATIONS_OUTBOX_PURGE_INTERVAL', 3600),
+            help='Seconds between purges of old events'
+        )
+        parser.add_argument('--once', action='store_true', help='Purge and drain the outbox once, then exit')
+
+    def handle(self, *args, **options):
+        purged = None
+        while True:
+            if purged is None or time.monotonic() - purged >= options['purge_interval']:
+                self.purge(options)
+                purged = time.monotonic()
+
+            dispatched = dispatch_batch(options['batch_size'], options['max_attempts'])
+            if dispatched:
+                self.stdout.write(f'Dispatched {dispatched} notification events')
+                continue
+
+            if options['once']:
+                return
+
+            # Nothing to do; drop the connection while idle so long-running workers don't hold it forever
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def purge(self, options):
+        dead = dead_events(options['max_attempts']).count()
+        if dead:
+            self.stderr.write(self.style.WARNING(
+                f'{dead} notification events failed {options["max_attempts"]} times and won\'t be retried; see '
+                f'their last_error'
+            ))
+
+        deleted = purge_events(options['retention_days'], options['max_attempts'], options['batch_size'])
+        if deleted:
+            self.stdout.write(f'Deleted {deleted} old notification events')
@@ -0,0 +1,137 @@
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import F
+
+from book_club.models import BookClubReaders
+from .broker import publish_entries
+
+
+class NotificationManager(models.Manager):
+    """
+    Manager that fans every newly created notification out to the inboxes of the readers it is meant for
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        notifications = super().bulk_create(objs, *args, **kwargs)
+        self.deliver(notifications)
+
+        return notifications
+
+    def deliver(self, notifications):
+        """
+        Create inbox entries for the given (already persisted) notifications and bump the unread counters.
+        Notifications with a target reader go to that reader; club-wide notifications go to every current admin.
+        """
+
+        inbox_model = apps.get_model('notifications', 'NotificationInbox')
+
+        # Look up the current admins for every club-wide notification in one query
+        club_ids = {
+            notification.book_club_id for notification in notifications
+            if notification.target_reader_id is None and notification.book_club_id is not None
+        }
+        club_admins = defaultdict(list)
+        if club_ids:
+            admin_roles = BookClubReaders.objects.filter(
+                book_club_id__in=club_ids,
+                club_role=BookClubReaders.RoleInClub.ADMIN,
+                left__isnull=True,
+            ).values_list('book_club_id', 'reader_id')
+            for book_club_id, reader_id in admin_roles:
+                club_admins[book_club_id].append(reader_id)
+
+        entries = []
+        for notification in notifications:
+            if notification.target_reader_id is not None:
+                reader_ids = [notification.target_reader_id]
+            else:
+                reader_ids = club_admins.get(notification.book_club_id, [])
+
+            entries.extend(
+                inbox_model(reader_id=reader_id, notification=notification, generated=notification.generated)
+                for reader_id in reader_ids
+            )
+
+        if entries:
+            with transaction.atomic():
+                inbox_model.objects.bulk_create(entries)
+                inbox_model.objects.adjust_unread(Counter(entry.reader_id for entry in entries))
+
+            # Push the new notifications to any open streams once they're visible to other connections
+            transaction.on_commit(lambda: publish_entries(entries))
+
+        return entries
+
+
+class NotificationInboxManager(models.Manager):
+    """
+    Manager for per-reader inbox entries, keeping the unread counters in sync with the read state
+    """
+
+    def mark_viewed(self, reader_id, notification_ids=None, before=None):
+        """
+        Mark the reader's unviewed notifications as viewed, either the given ones or everything generated
+        up to `before`. Records the views in bulk and returns how many notifications were marked.
+        """
+
+        views_model = apps.get_model('notifications', 'NotificationViews')
+
+        entries = self.filter(reader_id=reader_id, viewed=False)
+        if notification_ids is not None:
+            entries = entries.filter(notification_id__in=notification_ids)
+        if before is not None:
+            entries = entries.filter(generated__lte=before)
+
+        with transaction.atomic():
+            viewed_ids = list(entries.select_for_update().values_list('notification_id', flat=True))
+            if not viewed_ids:
+                return 0
+
+            views_model.objects.bulk_create(
+                [views_model(notification_id=notification_id, reader_id=reader_id) for notification_id in viewed_ids],
+                ignore_conflicts=True,
+            )
+            self.filter(reader_id=reader_id, notification_id__in=viewed_ids).update(viewed=True)
+            self.adjust_unread({reader_id: -len(viewed_ids)})
+
+        return len(viewed_ids)
+
+    def mark_unviewed(self, reader_id, notification_ids):
+        """
+        Mark the reader's viewed notifications among the given ones as not viewed, removing their view records
+        """
+
+        views_model = apps.get_model('notifications', 'NotificationViews')
+
+        with transaction.atomic():
+            unviewed_ids = list(self.filter(
+                reader_id=reader_id, notification_id__in=notification_ids, viewed=True
+            ).select_for_update().values_list('notification_id', flat=True))
+            if not unviewed_ids:
+                return 0
+
+            views_model.objects.filter(reader_id=reader_id, notification_id__in=unviewed_ids).delete()
+            self.filter(reader_id=reader_id, notification_id__in=unviewed_ids).update(viewed=False)
+            self.adjust_unread({reader_id: len(unviewed_ids)})
+
+        return len(unviewed_ids)
+
+    def adjust_unread(self, deltas):
+        """
+        Apply a {reader_id: delta} mapping to the readers' unread counters
+        """
+
+        counter_model = apps.get_model('notifications', 'UnreadNotifications')
+
+        # Make sure every reader has a counter row, then apply one UPDATE per distinct delta
+        counter_model.objects.bulk_create(
+            [counter_model(reader_id=reader_id) for reader_id in deltas],
+            ignore_conflicts=True,
+        )
+        readers_by_delta = defaultdict(list)
+        for reader_id, delta in deltas.items():
+            readers_by_delta[delta].append(reader_id)
+        for delta, reader_ids in readers_by_delta.items():
+            counter_model.objects.filter(reader_id__in=reader_ids).update(count=F('count') + delta)
@@ -0,0 +1,83 @@
+# Generated by Django 4.2 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_inboxes(apps, schema_editor):
+    """
+    Fan existing notifications out to the readers who currently see them
+    """
+
+    BookClubReaders = apps.get_model('book_club', 'BookClubReaders')
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationViews = apps.get_model('notifications', 'NotificationViews')
+    NotificationInbox = apps.get_model('notifications', 'NotificationInbox')
+    UnreadNotifications = apps.get_model('notifications', 'UnreadNotifications')
+
+    club_admins = {}
+    for book_club_id, reader_id in BookClubReaders.objects.filter(
+        club_role='AD', left__isnull=True
+    ).values_list('book_club_id', 'reader_id'):
+        club_admins.setdefault(book_club_id, []).append(reader_id)
+
+    views = set(NotificationViews.objects.values_list('notification_id', 'reader_id'))
+
+    entries = []
+    unread = {}
+    for notification in Notification.objects.all().iterator():
+        if notification.target_reader_id is not None:
+            reader_ids = [notification.target_reader_id]
+        else:
+            reader_ids = club_admins.get(notification.book_club_id, [])
+
+        for reader_id in reader_ids:
+            viewed = (notification.id, reader_id) in views
+            entries.append(NotificationInbox(
+                reader_id=reader_id,
+                notification_id=notification.id,
+                generated=notification.generated,
+                viewed=viewed,
+            ))
+            unread[reader_id] = unread.get(reader_id, 0) + (0 if viewed else 1)
+
+    NotificationInbox.objects.bulk_create(entries, batch_size=1000)
+    UnreadNotifications.objects.bulk_create(
+        [UnreadNotifications(reader_id=reader_id, count=count) for reader_id, count in unread.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0002_bookclub_slug'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotifications',
+            fields=[
+                ('reader', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='unread_notifications', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generated', models.DateTimeField()),
+                ('viewed', models.BooleanField(default=False)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='inbox_entries', to='notifications.notification')),
+                ('reader', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='notification_inbox', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['reader', '-generated'], name='notif_inbox_reader_gen_idx')],
+                'unique_together': {('reader', 'notification')},
+            },
+        ),
+        migrations.RunPython(backfill_inboxes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notificationinbox',
+            name='notif_inbox_reader_gen_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notificationinbox',
+            index=models.Index(fields=['reader', '-generated', '-notification'], name='notif_inbox_reader_keyset_idx'),
+        ),
+    ]
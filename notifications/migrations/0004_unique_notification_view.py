@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+def remove_duplicate_views(apps, schema_editor):
+    """
+    Keep only the earliest view of a notification by each reader
+    """
+
+    NotificationViews = apps.get_model('notifications', 'NotificationViews')
+
+    seen = set()
+    duplicate_ids = []
+    for view_id, notification_id, reader_id in NotificationViews.objects.order_by(
+        'viewed_at', 'id'
+    ).values_list('id', 'notification_id', 'reader_id').iterator():
+        if (notification_id, reader_id) in seen:
+            duplicate_ids.append(view_id)
+        else:
+            seen.add((notification_id, reader_id))
+
+    NotificationViews.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_inbox_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_views, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notificationviews',
+            constraint=models.UniqueConstraint(fields=('notification', 'reader'), name='unique_notification_view'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_unique_notification_view'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['target_reader', '-generated'], name='notification_target_gen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('target_reader__isnull', True)), fields=['book_club', '-generated'], name='notification_club_gen_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 14:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_club', '0005_bookclub_image_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('RG', 'Registered'), ('IN', 'Invited'), ('MR', 'Membership Requested'), ('MD', 'Membership Declined'), ('MA', 'Membership Accepted'), ('NR', 'New Reader')], max_length=2)),
+                ('action_link', models.URLField(blank=True, null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('available', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('processed', models.DateTimeField(blank=True, null=True)),
+                ('book_club', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='book_club.bookclub')),
+                ('source_reader', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('target_reader', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed__isnull', True)), fields=['available', 'created'], name='notification_event_pending_idx')],
+            },
+        ),
+    ]
@@ -3,9 +3,11 @@ import uuid
 from datetime import datetime
 
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from book_club.models import Reader, BookClub
+from .managers import NotificationInboxManager, NotificationManager
 
 
 class Notification(models.Model):
@@ -31,8 +33,97 @@ class Notification(models.Model):
     viewed_by = models.ManyToManyField(Reader, through='NotificationViews', related_name='viewed_by')
     generated = models.DateTimeField(default=datetime.now)
 
+    objects = NotificationManager()
+
+    class Meta:
+        indexes = [
+            # Notifications sent to a reader, newest first
+            models.Index(fields=['target_reader', '-generated'], name='notification_target_gen_idx'),
+            # Club-wide notifications for a club, newest first
+            models.Index(
+                fields=['book_club', '-generated'],
+                condition=models.Q(target_reader__isnull=True),
+                name='notification_club_gen_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+
+        # Fan new notifications out to the readers' inboxes
+        if adding:
+            Notification.objects.deliver([self])
+
+
+# Outbox of notifications to generate, written in the same transaction as the change that caused them and
+# turned into notifications by the dispatch_notifications worker
+class NotificationEvent(models.Model):
+    source_reader = models.ForeignKey(Reader, on_delete=models.DO_NOTHING, related_name='+')
+    target_reader = models.ForeignKey(Reader, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    book_club = models.ForeignKey(BookClub, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    type = models.CharField(
+        max_length=2,
+        choices=Notification.NotificationType.choices
+    )
+    action_link = models.URLField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    available = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Pending events, in the order the dispatcher picks them up
+            models.Index(
+                fields=['available', 'created'],
+                condition=models.Q(processed__isnull=True),
+                name='notification_event_pending_idx',
+            ),
+        ]
+
+    def to_notification(self):
+        return Notification(
+            source_reader_id=self.source_reader_id,
+            target_reader_id=self.target_reader_id,
+            book_club_id=self.book_club_id,
+            type=self.type,
+            action_link=self.action_link,
+            generated=self.created,
+        )
+
 
 class NotificationViews(models.Model):
     notification = models.ForeignKey(Notification, on_delete=models.DO_NOTHING)
     reader = models.ForeignKey(Reader, on_delete=models.DO_NOTHING)
     viewed_at = models.DateTimeField(default=datetime.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'reader'], name='unique_notification_view'),
+        ]
+
+
+# Per-reader copy of a notification, fanned out once when the notification is created
+class NotificationInbox(models.Model):
+    reader = models.ForeignKey(Reader, on_delete=models.DO_NOTHING, related_name='notification_inbox')
+    notification = models.ForeignKey(Notification, on_delete=models.DO_NOTHING, related_name='inbox_entries')
+    generated = models.DateTimeField()
+    viewed = models.BooleanField(default=False)
+
+    objects = NotificationInboxManager()
+
+    class Meta:
+        unique_together = ('reader', 'notification')
+        indexes = [
+            models.Index(fields=['reader', '-generated', '-notification'], name='notif_inbox_reader_keyset_idx'),
+        ]
+
+
+# Maintained count of each reader's unviewed inbox entries
+class UnreadNotifications(models.Model):
+    reader = models.OneToOneField(
+        Reader, on_delete=models.DO_NOTHING, primary_key=True, related_name='unread_notifications'
+    )
+    count = models.PositiveIntegerField(default=0)
@@ -0,0 +1,130 @@
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification, NotificationEvent
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(type, source_reader, target_reader=None, book_club=None, action_link=None):
+    """
+    Record a notification to be generated by the dispatcher. Call this inside the transaction making the change
+    the notification is about, so both commit (or roll back) together.
+    """
+
+    return NotificationEvent.objects.create(
+        type=type,
+        source_reader=source_reader,
+        target_reader=target_reader,
+        book_club=book_club,
+        action_link=action_link,
+    )
+
+
+def enqueue_many(events):
+    """
+    Record several unsaved NotificationEvents in one INSERT
+    """
+
+    return NotificationEvent.objects.bulk_create(events)
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff between attempts, capped at an hour
+    """
+
+    return timedelta(seconds=min(2 ** attempts * 5, 3600))
+
+
+def dispatch_batch(batch_size=None, max_attempts=None):
+    """
+    Turn a batch of pending events into notifications (fanned out to inboxes as usual) and mark them processed.
+    Events are locked with SKIP LOCKED so several dispatchers can run side by side.
+    Returns the number of events processed.
+    """
+
+    batch_size = batch_size or getattr(settings, 'NOTIFICATIONS_OUTBOX_BATCH_SIZE', 500)
+    max_attempts = max_attempts or getattr(settings, 'NOTIFICATIONS_OUTBOX_MAX_ATTEMPTS', 5)
+
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                processed__isnull=True, available__lte=timezone.now(), attempts__lt=max_attempts
+            ).order_by('available', 'created')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        try:
+            # The whole batch in a handful of INSERTs
+            with transaction.atomic():
+                Notification.objects.bulk_create([event.to_notification() for event in events])
+            processed = events
+        except Exception:
+            # Fall back to one event at a time so a single bad event doesn't hold up the rest
+            logger.exception('Failed to dispatch notification batch, retrying events one by one')
+            processed = [event for event in events if _dispatch_one(event, max_attempts)]
+
+        NotificationEvent.objects.filter(
+            id__in=[event.id for event in processed]
+        ).update(processed=timezone.now())
+
+    return len(processed)
+
+
+def dead_events(max_attempts=None):
+    """
+    Events the dispatcher has given up on after max_attempts failures
+    """
+
+    max_attempts = max_attempts or getattr(settings, 'NOTIFICATIONS_OUTBOX_MAX_ATTEMPTS', 5)
+
+    return NotificationEvent.objects.filter(processed__isnull=True, attempts__gte=max_attempts)
+
+
+def purge_events(retention_days=None, max_attempts=None, batch_size=None):
+    """
+    Delete events processed more than retention_days ago, along with dead events last tried that long ago, a batch
+    at a time so the deletes don't hold locks for long.
+    Returns the number of events deleted.
+    """
+
+    if retention_days is None:
+        retention_days = getattr(settings, 'NOTIFICATIONS_OUTBOX_RETENTION_DAYS', 7)
+    max_attempts = max_attempts or getattr(settings, 'NOTIFICATIONS_OUTBOX_MAX_ATTEMPTS', 5)
+    batch_size = batch_size or getattr(settings, 'NOTIFICATIONS_OUTBOX_BATCH_SIZE', 500)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    expired = NotificationEvent.objects.filter(
+        Q(processed__lt=cutoff) | Q(processed__isnull=True, attempts__gte=max_attempts, available__lt=cutoff)
+    )
+    purged = 0
+    while ids := list(expired.values_list('id', flat=True)[:batch_size]):
+        purged += NotificationEvent.objects.filter(id__in=ids).delete()[0]
+
+    return purged
+
+
+def _dispatch_one(event, max_attempts):
+    try:
+        with transaction.atomic():
+            Notification.objects.bulk_create([event.to_notification()])
+        return True
+    except Exception as e:
+        logger.exception('Failed to dispatch notification event %s', event.id)
+        event.attempts += 1
+        event.last_error = str(e)
+        event.available = timezone.now() + retry_delay(event.attempts)
+        event.save(update_fields=['attempts', 'last_error', 'available'])
+        if event.attempts >= max_attempts:
+            logger.error('Gave up on notification event %s after %s attempts: %s', event.id, event.attempts, e)
+        return False
@@ -0,0 +1,104 @@
+import base64
+import binascii
+import uuid
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Notification, NotificationViews
+
+
+def encode_cursor(notification):
+    """
+    Build an opaque cursor pointing just past the given notification
+    """
+
+    raw = f'{notification.generated.isoformat()}|{notification.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Parse a cursor back into its (generated, id) keyset; raises ValueError for malformed cursors
+    """
+
+    try:
+        generated, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(generated), uuid.UUID(notification_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def get_page_size(requested=None):
+    """
+    Clamp a requested page size to the configured bounds, falling back to the default
+    """
+
+    default_size = getattr(settings, 'NOTIFICATIONS_PAGE_SIZE', 25)
+    max_size = getattr(settings, 'NOTIFICATIONS_MAX_PAGE_SIZE', 100)
+    try:
+        return max(1, min(int(requested), max_size))
+    except (TypeError, ValueError):
+        return default_size
+
+
+def notification_page_query(reader_id, cursor, page_size):
+    """
+    Query for one page of a reader's notifications plus one extra row, using keyset pagination on (generated, id)
+    """
+
+    # NOTE - Keep every inbox condition in a single filter() so they all share the one inbox join
+    conditions = Q(inbox_entries__reader_id=reader_id)
+    if cursor is not None:
+        generated, notification_id = decode_cursor(cursor)
+        conditions &= (
+            Q(inbox_entries__generated__lt=generated)
+            | Q(inbox_entries__generated=generated, id__lt=notification_id)
+        )
+
+    return Notification.objects.filter(
+        conditions
+    ).select_related(
+        'source_reader', 'book_club'
+    ).annotate(
+        is_viewed=Exists(NotificationViews.objects.filter(notification=OuterRef('pk'), reader_id=reader_id))
+    ).order_by('-inbox_entries__generated', '-id')[:page_size + 1]
+
+
+def split_page(notifications, page_size):
+    """
+    Trim the extra row off a page, returning the page and the cursor for the next one (None on the last page)
+    """
+
+    # The extra row only tells us whether there's another page
+    next_cursor = None
+    if len(notifications) > page_size:
+        notifications = notifications[:page_size]
+        next_cursor = encode_cursor(notifications[-1])
+
+    return notifications, next_cursor
+
+
+def notification_page(reader_id, cursor=None, page_size=None):
+    """
+    Get one page of a reader's notifications, newest first.
+    Returns the notifications and the cursor for the next page (None on the last page).
+    """
+
+    page_size = get_page_size(page_size)
+    notifications = list(notification_page_query(reader_id, cursor, page_size))
+
+    return split_page(notifications, page_size)
+
+
+async def anotification_page(reader_id, cursor=None, page_size=None):
+    """
+    Async version of notification_page()
+    """
+
+    page_size = get_page_size(page_size)
+    notifications = [notification async for notification in notification_page_query(reader_id, cursor, page_size)]
+
+    return split_page(notifications, page_size)
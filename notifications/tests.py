@@ -1,3 +1,415 @@
-from django.test import TestCase
+import asyncio
+import json
+import socket
 
-# Create your tests here.
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+
+from book_club.models import BookClub, BookClubReaders, Reader
+from . import outbox
+from .models import Notification, NotificationEvent, NotificationInbox, NotificationViews, UnreadNotifications
+from .broker import PostgresBroker
+from .checks import check_stream_broker
+from .outbox import dispatch_batch
+from .views import notifications_stream
+
+
+class NotificationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Reader.objects.create_user(username='admin', email='admin@example.com', password='password')
+        cls.book_club = BookClub.objects.create(name='Test Club', slug='test-club')
+        BookClubReaders.objects.create(
+            reader=cls.admin, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _generate_notifications(self, count):
+        start = Reader.objects.count()
+        for i in range(start, start + count):
+            new_reader = Reader.objects.create(username=f'reader{i}', email=f'reader{i}@example.com')
+            Notification.objects.create(
+                source_reader=new_reader,
+                book_club=self.book_club,
+                type=Notification.NotificationType.MEMBERSHIP_REQUESTED,
+            )
+            Notification.objects.create(
+                source_reader=self.admin,
+                target_reader=self.admin,
+                book_club=self.book_club,
+                type=Notification.NotificationType.MEMBERSHIP_ACCEPTED,
+            )
+
+
+class InboxFanOutTests(NotificationTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.second_admin, cls.former_admin, cls.member = Reader.objects.bulk_create([
+            Reader(username=username, email=f'{username}@example.com')
+            for username in ('second-admin', 'former-admin', 'member')
+        ])
+        BookClubReaders.objects.bulk_create([
+            BookClubReaders(
+                reader=cls.second_admin, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN
+            ),
+            BookClubReaders(
+                reader=cls.former_admin, book_club=cls.book_club, club_role=BookClubReaders.RoleInClub.ADMIN,
+                left=timezone.now(),
+            ),
+            BookClubReaders(reader=cls.member, book_club=cls.book_club),
+        ])
+
+    def _unread(self):
+        return dict(UnreadNotifications.objects.values_list('reader__username', 'count'))
+
+    def test_club_wide_notification_reaches_current_admins(self):
+        notification = Notification.objects.create(
+            source_reader=self.member,
+            book_club=self.book_club,
+            type=Notification.NotificationType.MEMBERSHIP_REQUESTED,
+        )
+
+        self.assertEqual(
+            set(NotificationInbox.objects.filter(notification=notification).values_list('reader', flat=True)),
+            {self.admin.id, self.second_admin.id},
+        )
+        self.assertEqual(self._unread(), {'admin': 1, 'second-admin': 1})
+
+    def test_targeted_notification_reaches_only_its_reader(self):
+        notification = Notification.objects.create(
+            source_reader=self.admin,
+            target_reader=self.member,
+            book_club=self.book_club,
+            type=Notification.NotificationType.MEMBERSHIP_ACCEPTED,
+        )
+
+        self.assertEqual(
+            list(NotificationInbox.objects.filter(notification=notification).values_list('reader', flat=True)),
+            [self.member.id],
+        )
+        self.assertEqual(self._unread(), {'member': 1})
+
+    def test_bulk_create_counts_per_reader(self):
+        Notification.objects.bulk_create([
+            Notification(source_reader=self.member, book_club=self.book_club, type=type)
+            for type in (Notification.NotificationType.MEMBERSHIP_REQUESTED, Notification.NotificationType.NEW_READER)
+        ] + [
+            Notification(
+                source_reader=self.admin, target_reader=self.member, type=Notification.NotificationType.INVITED_TO_CLUB
+            )
+        ])
+
+        self.assertEqual(NotificationInbox.objects.count(), 5)
+        self.assertEqual(self._unread(), {'admin': 2, 'second-admin': 2, 'member': 1})
+
+        NotificationInbox.objects.mark_viewed(self.admin.id)
+        self.assertEqual(self._unread(), {'admin': 0, 'second-admin': 2, 'member': 1})
+
+
+class NotificationsHomeTests(NotificationTestCase):
+    def test_query_count_is_constant(self):
+        """
+        Rendering the notifications page shouldn't cost extra queries per notification
+        """
+
+        self._generate_notifications(1)
+        with self.assertNumQueries(2) as small_page:
+            self.client.get(reverse('notifications:notifications'))
+
+        self._generate_notifications(25)
+        with self.assertNumQueries(len(small_page.captured_queries)):
+            response = self.client.get(reverse('notifications:notifications'))
+
+        self.assertEqual(len(response.context['notifications']), 25)
+
+    def test_viewed_flag(self):
+        """
+        Only notifications the reader viewed are flagged as viewed
+        """
+
+        self._generate_notifications(2)
+        viewed = Notification.objects.filter(type=Notification.NotificationType.MEMBERSHIP_REQUESTED).first()
+        NotificationViews.objects.create(notification=viewed, reader=self.admin)
+
+        response = self.client.get(reverse('notifications:notifications'))
+
+        flags = {notification.id: notification.is_viewed for notification in response.context['notifications']}
+        self.assertTrue(flags.pop(viewed.id))
+        self.assertFalse(any(flags.values()))
+
+
+@override_settings(NOTIFICATIONS_PAGE_SIZE=5)
+class NotificationsPageTests(NotificationTestCase):
+    def test_pages_cover_every_notification_once(self):
+        """
+        Following the cursors walks through every notification exactly once, newest first
+        """
+
+        self._generate_notifications(6)
+        response = self.client.get(reverse('notifications:notifications'))
+        seen = [str(notification.id) for notification in response.context['notifications']]
+        next_cursor = response.context['next_cursor']
+
+        while next_cursor:
+            response = self.client.get(
+                reverse('notifications:notifications_page'), {'cursor': next_cursor, 'format': 'json'}
+            )
+            seen.extend(notification['id'] for notification in response.json()['notifications'])
+            next_cursor = response.json()['next_cursor']
+
+        expected = Notification.objects.filter(
+            inbox_entries__reader=self.admin
+        ).order_by('-generated', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, [str(notification_id) for notification_id in expected])
+        self.assertEqual(len(seen), 12)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('notifications:notifications_page'), {'cursor': 'nope'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class MarkViewedTests(NotificationTestCase):
+    def test_mark_all_before(self):
+        """
+        Marking everything as viewed records every view and clears the unread counter
+        """
+
+        self._generate_notifications(10)
+        newest = Notification.objects.order_by('-generated').first()
+
+        response = self.client.post(
+            reverse('notifications:mark_viewed'), {'before': newest.generated.isoformat(), 'format': 'json'}
+        )
+
+        self.assertEqual(response.json()['marked'], 20)
+        self.assertEqual(NotificationViews.objects.filter(reader=self.admin).count(), 20)
+        self.assertEqual(self.admin.unread_notifications.count, 0)
+
+    def test_mark_ids_and_toggle(self):
+        """
+        Marking specific notifications only touches those, and toggling flips them back
+        """
+
+        self._generate_notifications(3)
+        notification_ids = list(Notification.objects.values_list('id', flat=True)[:2])
+
+        self.client.post(reverse('notifications:mark_viewed'), {'notification_ids': notification_ids})
+        self.client.post(reverse('notifications:mark_viewed'), {'notification_ids': notification_ids})
+        self.assertEqual(NotificationViews.objects.filter(reader=self.admin).count(), 2)
+        self.assertEqual(UnreadNotifications.objects.get(reader=self.admin).count, 4)
+
+        self.client.post(reverse('notifications:toggle_viewed', args=[notification_ids[0]]))
+        self.assertEqual(NotificationViews.objects.filter(reader=self.admin).count(), 1)
+        self.assertEqual(UnreadNotifications.objects.get(reader=self.admin).count, 5)
+
+
+class OutboxTests(NotificationTestCase):
+    def test_membership_request_is_dispatched(self):
+        """
+        Requesting membership queues an event, and dispatching it delivers the notification to the club's admins
+        """
+
+        reader = Reader.objects.create(username='requester', email='requester@example.com')
+        self.book_club.publicity = BookClub.Publicity.PUBLIC
+        self.book_club.save()
+        self.client.force_login(reader)
+
+        self.client.post(
+            reverse('book_club:book_club_membership_request', args=[self.book_club.slug]), {'message': 'Hi'}
+        )
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationEvent.objects.filter(processed__isnull=True).count(), 1)
+
+        self.assertEqual(dispatch_batch(), 1)
+        self.assertEqual(dispatch_batch(), 0)
+        self.assertEqual(UnreadNotifications.objects.get(reader=self.admin).count, 1)
+        self.assertFalse(NotificationEvent.objects.filter(processed__isnull=True).exists())
+
+    def test_failed_event_is_retried_later(self):
+        """
+        An event that can't be dispatched is backed off without blocking the rest of the batch
+        """
+
+        outbox.enqueue(
+            Notification.NotificationType.MEMBERSHIP_ACCEPTED, source_reader=self.admin, target_reader=self.admin
+        )
+        broken = outbox.enqueue(
+            Notification.NotificationType.MEMBERSHIP_DECLINED, source_reader=self.admin, target_reader=self.admin
+        )
+        to_notification = NotificationEvent.to_notification
+
+        def fail_broken(event):
+            if event.id == broken.id:
+                raise ValueError('Broken event')
+            return to_notification(event)
+
+        with mock.patch.object(NotificationEvent, 'to_notification', fail_broken):
+            self.assertEqual(dispatch_batch(), 1)
+
+        broken.refresh_from_db()
+        self.assertIsNone(broken.processed)
+        self.assertEqual(broken.attempts, 1)
+        self.assertGreater(broken.available, timezone.now())
+        self.assertEqual(UnreadNotifications.objects.get(reader=self.admin).count, 1)
+
+    def test_old_events_are_purged_and_dead_ones_reported(self):
+        """
+        The dispatcher deletes events processed (or given up on) before the retention period, and reports the
+        events it has given up on
+        """
+
+        now = timezone.now()
+        event_type = Notification.NotificationType.MEMBERSHIP_ACCEPTED
+        old, recent, pending, dead, old_dead = NotificationEvent.objects.bulk_create([
+            NotificationEvent(type=event_type, source_reader=self.admin, processed=now - timedelta(days=8)),
+            NotificationEvent(type=event_type, source_reader=self.admin, processed=now - timedelta(days=1)),
+            NotificationEvent(type=event_type, source_reader=self.admin, available=now + timedelta(days=1)),
+            NotificationEvent(type=event_type, source_reader=self.admin, attempts=5),
+            NotificationEvent(
+                type=event_type, source_reader=self.admin, attempts=5, available=now - timedelta(days=8)
+            ),
+        ])
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'dispatch_notifications', once=True, retention_days=7, max_attempts=5, stdout=stdout, stderr=stderr
+        )
+
+        self.assertIn('2 notification events failed 5 times', stderr.getvalue())
+        self.assertIn('Deleted 2 old notification events', stdout.getvalue())
+        self.assertEqual(
+            set(NotificationEvent.objects.values_list('id', flat=True)), {recent.id, pending.id, dead.id}
+        )
+
+
+class NotificationStreamTests(NotificationTestCase):
+    def _enqueue_and_dispatch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox.enqueue(
+                Notification.NotificationType.MEMBERSHIP_ACCEPTED,
+                source_reader=self.admin,
+                target_reader=self.admin,
+                book_club=self.book_club,
+            )
+            self.assertEqual(dispatch_batch(), 1)
+
+        return Notification.objects.get(target_reader=self.admin)
+
+    @override_settings(NOTIFICATIONS_STREAM=True)
+    async def test_dispatched_notification_is_streamed(self):
+        """
+        A notification queued and then dispatched from the outbox while a stream is open is pushed to it as an event
+        """
+
+        req = RequestFactory().get('/notifications/stream')
+        req.user = self.admin
+        response = await notifications_stream(req)
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'retry:'))
+
+        notification = await sync_to_async(self._enqueue_and_dispatch)()
+
+        event = (await asyncio.wait_for(anext(events), 5)).decode()
+        self.assertTrue(event.startswith(f'event: notification\nid: {notification.id}\n'))
+        data = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual(data['unread'], 1)
+        self.assertIn('toggle-viewed', data['html'])
+        await events.aclose()
+
+    @override_settings(NOTIFICATIONS_STREAM=True)
+    def test_needs_cross_process_broker(self):
+        """
+        The dispatcher is a process of its own, so an in-process broker would never reach the streams
+        """
+
+        with override_settings(NOTIFICATIONS_BROKER='notifications.broker.LocalBroker'):
+            self.assertEqual([error.id for error in check_stream_broker(None)], ['notifications.E002'])
+        with override_settings(NOTIFICATIONS_BROKER='notifications.broker.PostgresBroker'):
+            self.assertEqual(check_stream_broker(None), [])
+        with override_settings(NOTIFICATIONS_STREAM=False):
+            self.assertEqual(check_stream_broker(None), [])
+
+    def test_requires_login(self):
+        req = RequestFactory().get('/notifications/stream')
+        req.user = AnonymousUser()
+
+        response = async_to_sync(notifications_stream)(req)
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(NOTIFICATIONS_STREAM=False)
+    def test_off_by_default(self):
+        """
+        Without NOTIFICATIONS_STREAM (i.e. under WSGI) pages don't open a stream, and there's no stream to open
+        """
+
+        response = self.client.get(reverse('notifications:notifications'))
+
+        self.assertNotContains(response, 'EventSource')
+        with self.assertRaises(NoReverseMatch):
+            reverse('notifications:notifications_stream')
+
+
+class FakeListener:
+    """
+    Stands in for a psycopg2 connection LISTENing, with NOTIFY payloads sent as lines down a socket
+    """
+
+    def __init__(self):
+        self.socket, self.server = socket.socketpair()
+        self.socket.setblocking(False)
+        self.notifies = []
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def poll(self):
+        # Like psycopg2's, never blocks
+        try:
+            data = self.socket.recv(4096)
+        except BlockingIOError:
+            return
+
+        for payload in data.decode().splitlines():
+            self.notifies.append(mock.Mock(payload=payload))
+
+    def notify(self, message):
+        self.server.send(f'{json.dumps(message)}\n'.encode())
+
+    def close(self):
+        self.socket.close()
+        self.server.close()
+
+
+class PostgresBrokerTests(TestCase):
+    async def test_listener_dispatches_notifies(self):
+        broker = PostgresBroker()
+        listener = FakeListener()
+        message = {'reader': 'reader-id', 'notification': 'notification-id'}
+
+        with mock.patch.object(broker, '_connect', return_value=listener):
+            queue = broker.subscribe('reader-id')
+            listener.notify(message)
+            self.assertEqual(await asyncio.wait_for(queue.get(), 5), message)
+
+            broker.unsubscribe('reader-id', queue)
+            for task in broker._listeners.values():
+                task.cancel()
+
+    def test_needs_psycopg2(self):
+        with mock.patch('notifications.broker.psycopg2', None):
+            with self.assertRaises(ImproperlyConfigured):
+                PostgresBroker()
@@ -1,11 +1,20 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 app_name = 'notifications'
 
 urlpatterns = [
-    path('', views.notifications_home, name='notifications'),
+    path('', read_views.notifications_home, name='notifications'),
+    path('page', views.notifications_page, name='notifications_page'),
     path('<str:notification_id>/toggle-viewed', views.toggle_viewed, name='toggle_viewed'),
+    path('mark-viewed', views.mark_viewed, name='mark_viewed'),
     path('link', views.link, name='link'),
-]
\ No newline at end of file
+]
+
+# The live stream needs the ASGI application, so it's only served when turned on
+if settings.NOTIFICATIONS_STREAM:
+    urlpatterns.append(path('stream', views.notifications_stream, name='notifications_stream'))
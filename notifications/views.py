@@ -1,10 +1,35 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+
+from .broker import get_broker
+from .forms import MarkViewedForm, NotificationLinkForm
+from .models import Notification, NotificationInbox, NotificationViews, UnreadNotifications
+from .pagination import notification_page
+
+
+def notification_json(notification):
+    """
+    JSON representation of a notification as listed in a reader's inbox
+    """
 
-from book_club.models import BookClub, BookClubReaders
-from .forms import NotificationLinkForm
-from .models import Notification, NotificationViews
+    return {
+        'id': notification.id,
+        'type': notification.type,
+        'source_reader': notification.source_reader.username,
+        'book_club': notification.book_club.name if notification.book_club else None,
+        'book_club_slug': notification.book_club.slug if notification.book_club else None,
+        'generated': notification.generated,
+        'is_viewed': notification.is_viewed,
+    }
 
 
 @login_required
@@ -13,18 +38,117 @@ def notifications_home(req):
     Page to view notifications\
     """
 
-    # Get all book clubs the reader is an admin for
-    admin_book_clubs = BookClub.objects.filter(
-        readers__id=req.user.id,
-        bookclubreaders__club_role=BookClubReaders.RoleInClub.ADMIN,
+    # Get the first page of notifications from the reader's inbox
+    notifications, next_cursor = notification_page(req.user.id, page_size=req.GET.get('page_size'))
+
+    return render(
+        req,
+        'notifications/notifications_home.html',
+        {'notifications': notifications, 'next_cursor': next_cursor},
+    )
+
+
+@login_required
+def notifications_page(req):
+    """
+    Further pages of notifications for infinite scrolling, as table rows or JSON
+    """
+
+    try:
+        notifications, next_cursor = notification_page(
+            req.user.id, cursor=req.GET.get('cursor'), page_size=req.GET.get('page_size')
+        )
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+
+    if req.GET.get('format') == 'json':
+        return JsonResponse({
+            'notifications': [notification_json(notification) for notification in notifications],
+            'next_cursor': next_cursor,
+        })
+
+    # Otherwise return the rendered rows, with the next cursor in a header
+    response = render(
+        req,
+        'notifications/fragments/notification_rows.html',
+        {'notifications': notifications},
     )
+    response['X-Next-Cursor'] = next_cursor or ''
+
+    return response
+
+
+async def notifications_stream(req):
+    """
+    Server-sent event stream pushing the reader's new notifications as they arrive. Needs the ASGI application so
+    that idle streams only cost a queue and a coroutine rather than a worker thread.
+    """
+
+    # NOTE - login_required doesn't support async views (and loading the user hits the DB), so check it in a thread
+    reader = await sync_to_async(lambda: req.user if req.user.is_authenticated else None)()
+    if reader is None:
+        return HttpResponseForbidden()
+
+    # Subscribe before responding so nothing created from here on is missed
+    broker = get_broker()
+    queue = broker.subscribe(reader.id)
 
-    # Get notifications for the reader
-    notifications = Notification.objects.filter(
-        (Q(book_club__in=admin_book_clubs.all()) & Q(target_reader__isnull=True)) | Q(target_reader__id=req.user.id),
-    ).order_by('-generated')
+    return StreamingHttpResponse(
+        __stream_events(req, reader.id, broker, queue),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
-    return render(req, 'notifications/notifications_home.html', {'notifications': notifications})
+
+async def __stream_events(req, reader_id, broker, queue):
+    """
+    Format queued notifications as server-sent events, with comments as keep-alives while idle. Streams close
+    after NOTIFICATIONS_STREAM_TIMEOUT seconds and the browser reconnects, so abandoned ones don't pile up.
+    """
+
+    loop = asyncio.get_running_loop()
+    closes = loop.time() + getattr(settings, 'NOTIFICATIONS_STREAM_TIMEOUT', 300)
+    heartbeat = getattr(settings, 'NOTIFICATIONS_STREAM_HEARTBEAT', 15)
+
+    try:
+        yield f'retry: {getattr(settings, "NOTIFICATIONS_STREAM_RETRY", 5) * 1000}\n\n'
+
+        while (remaining := closes - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+
+            event = await sync_to_async(__stream_event)(req, reader_id, message['notification'])
+            if event is not None:
+                yield f'event: notification\nid: {event["id"]}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n'
+    finally:
+        broker.unsubscribe(reader_id, queue)
+
+
+def __stream_event(req, reader_id, notification_id):
+    """
+    Build the event for one of the reader's notifications: its JSON, its rendered inbox row and the unread count
+    """
+
+    notification = Notification.objects.filter(
+        id=notification_id, inbox_entries__reader_id=reader_id
+    ).select_related(
+        'source_reader', 'book_club'
+    ).annotate(
+        is_viewed=Exists(NotificationViews.objects.filter(notification=OuterRef('pk'), reader_id=reader_id))
+    ).first()
+    if notification is None:
+        return None
+
+    event = notification_json(notification)
+    event['unread'] = UnreadNotifications.objects.filter(reader_id=reader_id).values_list('count', flat=True).first()
+    event['html'] = render_to_string(
+        'notifications/fragments/notification_rows.html', {'notifications': [notification]}, request=req
+    )
+
+    return event
 
 
 @login_required
@@ -35,14 +159,32 @@ def toggle_viewed(req, notification_id):
 
     # TODO - Keep record of old views even if toggled to unviewed?
     if req.method == 'POST':
-        # Get the notification
-        notification = Notification.objects.get(id=notification_id)
-        if notification.viewed_by.all().contains(req.user):
-            notification.viewed_by.remove(req.user)
-        else:
-            notification.viewed_by.add(req.user, through_defaults={})
+        # Mark the notification viewed, or unviewed if it already was
+        if not NotificationInbox.objects.mark_viewed(req.user.id, [notification_id]):
+            NotificationInbox.objects.mark_unviewed(req.user.id, [notification_id])
 
-        notification.save()
+    return redirect('notifications:notifications')
+
+
+@login_required
+def mark_viewed(req):
+    """
+    POST URL for marking many notifications as viewed at once, by ID or everything up to a timestamp
+    """
+
+    if req.method == 'POST':
+        form = MarkViewedForm(req.POST)
+        if form.is_valid():
+            marked = NotificationInbox.objects.mark_viewed(
+                req.user.id,
+                notification_ids=form.cleaned_data['notification_ids'] or None,
+                before=form.cleaned_data['before'],
+            )
+
+            if req.POST.get('format') == 'json':
+                return JsonResponse({'marked': marked})
+        elif req.POST.get('format') == 'json':
+            return JsonResponse({'errors': form.errors}, status=400)
 
     return redirect('notifications:notifications')
 
@@ -57,12 +199,8 @@ def link(req):
         # Get the notification ID and the redirect URL from the form
         form = NotificationLinkForm(req.POST)
         if form.is_valid():
-
-            # Get the notification and record that the user viewed it
-            notification = Notification.objects.get(id=form.cleaned_data['notification_id'])
-            if not notification.viewed_by.contains(req.user):
-                notification.viewed_by.add(req.user, through_defaults={})
-                notification.save()
+            # Record that the user viewed the notification
+            NotificationInbox.objects.mark_viewed(req.user.id, [form.cleaned_data['notification_id']])
 
             return redirect(form.cleaned_data['redirect_url'])
 